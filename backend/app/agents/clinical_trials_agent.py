@@ -1,12 +1,12 @@
-import requests
 import json
-import urllib.parse
 from typing import List, Dict, Any, Optional
 from pydantic import BaseModel
 from openai import OpenAI
-from datetime import datetime
-from app.utils.prompts import CLINICAL_TRIAL_SYSTEM_PROMPT
-from app.tools.fetch_clinical_trial_data import execute_fetch_clinical_trials
+from app.utils.prompts import CLINICAL_TRIAL_SYSTEM_PROMPT, CLINICAL_TRIAL_NARRATIVE_PROMPT
+from app.tools.fetch_clinical_trial_data import fetch_clinical_trials
+from app.tools.trial_store import query_key
+from app.tools.clinical_trials_analytics import build_trials_report
+from app.tools.tool_runtime import execute_tool_calls, assistant_tool_call_message, tool_result_messages
 from app.config.settings import settings
 from .base_agent import BaseAgent 
 
@@ -74,6 +74,7 @@ class ClinicalTrialsReport(BaseModel):
     active_trials: ActiveTrialsTable
     sponsor_profiles: SponsorProfilesTable
     phase_distribution: PhaseDistributionTable
+    narrative: Optional[str] = None
 
 
 tools = [
@@ -110,28 +111,84 @@ tools = [
     }
 ]
 
-def execute_tool(tool_call: Any) -> str:
+def execute_tool(tool_call: Any) -> Dict[str, Any]:
     """Execute the tool based on the tool call."""
     if tool_call.function.name == "fetch_clinical_trials":
         try:
             args = json.loads(tool_call.function.arguments)
-            return execute_fetch_clinical_trials(args)
+            return fetch_clinical_trials(args)
         except json.JSONDecodeError as e:
-            return json.dumps({"error": f"Failed to parse tool arguments: {str(e)}"})
+            return {"error": f"Failed to parse tool arguments: {str(e)}"}
     else:
-        return json.dumps({"error": "Unknown tool"})
+        return {"error": "Unknown tool"}
+
+
+def _collect_fetch_result(tool_call, payload: Dict[str, Any], fetched: Dict[str, Any]) -> None:
+    """
+    Accumulate studies (deduplicated by NCT ID) and totals from one fetch_clinical_trials
+    result. Totals are kept per query, so repeating a search does not count it twice.
+    """
+    if "studies" not in payload:
+        return
+    if fetched["condition"] is None:
+        fetched["condition"] = payload.get("search_condition")
+    args = json.loads(tool_call.function.arguments)
+    fetched["totals"][query_key(args)] = payload.get("total_studies") or 0
+    for study in payload["studies"]:
+        fetched["studies"].setdefault(study.get("nct_id"), study)
+
+
+def total_found(fetched: Dict[str, Any]) -> int:
+    """
+    Distinct trials behind the fetched queries. Status and phase queries overlap, so their
+    totals are not added up: the count is the number of distinct NCT IDs fetched, or the
+    largest single query's total when that query has more trials than were fetched.
+    """
+    return max([len(fetched["studies"])] + list(fetched["totals"].values()))
+
+
+def summarize_trials_report(user_query: str, report: Dict[str, Any]) -> Optional[str]:
+    """Short LLM narrative over the locally computed aggregates (never the raw study list)."""
+    digest = {
+        "condition": report["active_trials"]["condition_searched"],
+        "total_found": report["active_trials"]["total_found"],
+        "analyzed_trials": sum(d["number_of_trials"] for d in report["phase_distribution"]["distributions"]),
+        "top_sponsors": [
+            {k: s[k] for k in ("sponsor_name", "number_of_trials", "sponsor_class")}
+            for s in report["sponsor_profiles"]["sponsors"][:5]
+        ],
+        "phases": [
+            {k: d[k] for k in ("phase", "number_of_trials", "percentage", "avg_enrollment")}
+            for d in report["phase_distribution"]["distributions"]
+        ],
+    }
+    try:
+        response = client.chat.completions.create(
+            model="gemini-2.5-flash",
+            messages=[
+                {"role": "system", "content": CLINICAL_TRIAL_NARRATIVE_PROMPT},
+                {"role": "user", "content": f"Query: {user_query}\nAggregates: {json.dumps(digest)}"}
+            ],
+            temperature=0.1
+        )
+        return response.choices[0].message.content
+    except Exception as e:
+        print(f"Error generating trials narrative: {str(e)}")
+        return None
 
 
 def run_clinical_trials_agent(user_query: str) -> ClinicalTrialsReport:
     """
-    Run the agent conversation loop with enhanced structured output.
-    Returns a detailed ClinicalTrialsReport object with links and metadata.
+    Run the agent conversation loop, then compute the report tables locally.
+    The LLM only chooses the fetch parameters and writes a short narrative;
+    every count, percentage, average and URL is computed from the fetched studies.
     """
     
     messages = [
         {"role": "system", "content": CLINICAL_TRIAL_SYSTEM_PROMPT},
         {"role": "user", "content": user_query}
     ]
+    fetched = {"condition": None, "totals": {}, "studies": {}}
 
     max_iterations = 5
     iteration = 0
@@ -152,62 +209,25 @@ def run_clinical_trials_agent(user_query: str) -> ClinicalTrialsReport:
         message = choice.message
 
         if message.tool_calls:
-            messages.append({
-                "role": "assistant",
-                "content": message.content,
-                "tool_calls": [
-                    {
-                        "id": tc.id,
-                        "type": "function",
-                        "function": {
-                            "name": tc.function.name,
-                            "arguments": tc.function.arguments
-                        }
-                    } for tc in message.tool_calls
-                ]
-            })
-            
-            # Execute tools
-            for tool_call in message.tool_calls:
-                tool_result = execute_tool(tool_call)
-                messages.append({
-                    "role": "tool",
-                    "tool_call_id": tool_call.id,
-                    "content": tool_result,
-                    "name": tool_call.function.name
-                })
+            messages.append(assistant_tool_call_message(message))
+
+            # Execute all tool calls of this turn concurrently, results kept in call order
+            results = execute_tool_calls(message.tool_calls, execute_tool)
+            for tool_call, tool_result in zip(message.tool_calls, results):
+                _collect_fetch_result(tool_call, tool_result, fetched)
+            messages.extend(tool_result_messages(message.tool_calls, results))
             iteration += 1
         else:
             break
 
-    messages.append({
-        "role": "user",
-        "content": f"""Based on the clinical trials data you fetched, provide a comprehensive structured report.
-            Include:
-            - All trial details (enrollment, dates, locations, outcomes)
-            - Direct links for each trial (trial_url, sponsor_url)
-            - Sponsor analytics (phases involved, average enrollment)
-            - Phase distribution with percentages and top sponsors
-            - Properly formatted and URL-encoded links
-
-            Current timestamp: {datetime.now().isoformat()}
-            Original query: {user_query}
-
-            Generate the complete ClinicalTrialsReport now."""
-        })
-
-    try:
-        structured_response = client.beta.chat.completions.parse(
-            model="gemini-2.5-flash",
-            messages=messages,
-            response_format=ClinicalTrialsReport,
-            temperature=0.1
-        )
-        
-        return structured_response.choices[0].message.parsed
-    except Exception as e:
-        print(f"Error getting structured output: {str(e)}")
-        raise
+    report = build_trials_report(
+        studies=list(fetched["studies"].values()),
+        condition=fetched["condition"] or user_query,
+        search_query=user_query,
+        total_found=total_found(fetched)
+    )
+    report["narrative"] = summarize_trials_report(user_query, report)
+    return ClinicalTrialsReport.model_validate(report)
 
 def display_report(report: ClinicalTrialsReport):
     """Display the enhanced structured report with clickable links"""
@@ -218,6 +238,8 @@ def display_report(report: ClinicalTrialsReport):
     print(f"Generated: {report.report_generated_at}")
     print(f"Search Query: {report.search_query}")
     print(f"View All Results: {report.active_trials.view_all_url}")
+    if report.narrative:
+        print(f"\n{report.narrative}")
     
     # Active Trials Table
     print(f"\n\nACTIVE TRIALS (Total Found: {report.active_trials.total_found}, Condition: {report.active_trials.condition_searched})")
@@ -4,8 +4,16 @@ from app.utils.prompts import EXIM_SYSTEM_PROMPT  # define this similar to IQVIA
 import json
 import os
 import logging
-from typing import Dict, Any, List, Optional
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeout, as_completed
+from itertools import product
+from typing import Dict, Any, List, Optional, Sequence, Tuple, Union
+from urllib.parse import urlsplit
 from .base_agent import BaseAgent
+from app.tools.tool_runtime import DEFAULT_TOOL_TIMEOUT, execute_tool_calls
+from app.tools.comtrade_cache import get_comtrade_cache
+from app.tools.trade_analytics import batch_trade_metrics, risk_records
+from app.tools.trade_codes import TradeCodeError, get_trade_codes
 import requests
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
@@ -20,6 +28,13 @@ logger = logging.getLogger("exim_agent")
 
 COMTRADE_ROOT = os.getenv("COMTRADE_BASE_URL", "https://comtradeapi.un.org/public/v1").rstrip("/")
 COMTRADE_TOKEN = os.getenv("COMTRADE_API_TOKEN")
+# Concurrent requests allowed per API host (the public endpoint rate-limits bursts)
+COMTRADE_MAX_CONCURRENCY = int(os.getenv("COMTRADE_MAX_CONCURRENCY", "4"))
+# Upper bound on reporter x partner x commodity x flow requests behind one tool call
+MAX_TRADE_REQUESTS = 48
+MAX_SCAN_REQUESTS = 240
+# A scan returns what it has by then, leaving room in the tool-call timeout for the metrics
+SCAN_TIME_BUDGET = DEFAULT_TOOL_TIMEOUT - 15
 
 PHARMA_CODES = {
     "pharmaceuticals": "3004",
@@ -30,30 +45,23 @@ PHARMA_CODES = {
     "alkaloids": "2939",
 }
 
-COUNTRIES = {
-    "usa": "842",
-    "united states": "842",
-    "us": "842",
-    "india": "699",
-    "ind": "699",
-    "china": "156",
-    "chn": "156",
-    "germany": "276",
-    "uk": "826",
-    "united kingdom": "826",
-    "gb": "826",
-    "japan": "392",
-    "jpn": "392",
-    "france": "250",
-    "fra": "250",
-}
-
 session = requests.Session()
 retry = Retry(total=5, backoff_factor=0.8, status_forcelist=[429, 500, 502, 503, 504])
-adapter = HTTPAdapter(max_retries=retry)
+adapter = HTTPAdapter(max_retries=retry, pool_maxsize=max(COMTRADE_MAX_CONCURRENCY, 10))
 session.mount("https://", adapter)
 session.mount("http://", adapter)
 
+_host_limits: Dict[str, threading.BoundedSemaphore] = {}
+_host_limits_lock = threading.Lock()
+
+
+def host_limit(url: str) -> threading.BoundedSemaphore:
+    host = urlsplit(url).netloc
+    with _host_limits_lock:
+        if host not in _host_limits:
+            _host_limits[host] = threading.BoundedSemaphore(max(1, COMTRADE_MAX_CONCURRENCY))
+        return _host_limits[host]
+
 
 def auth_headers() -> Dict[str, str]:
     h: Dict[str, str] = {}
@@ -64,27 +72,42 @@ def auth_headers() -> Dict[str, str]:
 
 def call_endpoint(path: str, params: Dict[str, Any]) -> Dict[str, Any]:
     url = f"{COMTRADE_ROOT}{path}"
-    r = session.get(url, params=params, headers=auth_headers(), timeout=60)
+    with host_limit(url):
+        r = session.get(url, params=params, headers=auth_headers(), timeout=60)
     r.raise_for_status()
     return r.json()
 
 
 def resolve_country(x: str) -> str:
-    k = x.strip().lower()
-    if k in COUNTRIES:
-        return COUNTRIES[k]
-    if k.isdigit():
-        return k
-    return k
+    """Comtrade country code for a name, alias, ISO code or M49 code; raises TradeCodeError."""
+    return get_trade_codes().country_code(x)
 
 
 def resolve_commodity(x: str) -> str:
+    """HS code for a commodity name or code; raises TradeCodeError before any API call."""
     k = x.strip().lower()
-    return PHARMA_CODES.get(k, x)
+    if k in PHARMA_CODES:
+        return PHARMA_CODES[k]
+    return get_trade_codes().commodity_code(x)
+
 
+def as_list(value: Union[str, Sequence[str], None], default: str = "") -> List[str]:
+    """Values from a list or a comma-separated string ("India, China"), duplicates dropped."""
+    if value is None or value == "":
+        value = default
+    items = value.split(",") if isinstance(value, str) else [str(v) for v in value]
+    return list(dict.fromkeys(i.strip() for i in items if i.strip()))
 
-def year_param(start: int, end: int) -> str:
-    return ",".join(str(y) for y in range(start, end + 1))
+
+def resolve_flows(flow: str) -> List[str]:
+    flow_lower = flow.lower()
+    if flow_lower == "both":
+        return ["X", "M"]
+    if flow_lower in ("x", "export", "exports"):
+        return ["X"]
+    if flow_lower in ("m", "import", "imports"):
+        return ["M"]
+    return [flow]
 
 
 def get_tariffline_data(
@@ -113,6 +136,7 @@ def clean_dataframe(raw: Dict[str, Any]) -> pd.DataFrame:
         "Value": "trade_value",
         "TradeQuantity": "quantity",
         "Quantity": "quantity",
+        "partnerDesc": "partner",
     }
     df = df.rename(columns={k: v for k, v in rename.items() if k in df.columns})
     cols = [c for c in ("year", "trade_value", "quantity", "flow", "reporter", "partner") if c in df.columns]
@@ -127,81 +151,120 @@ def clean_dataframe(raw: Dict[str, Any]) -> pd.DataFrame:
     return df
 
 
-def fetch_exim_trends(
-    commodity: str,
-    reporter: str,
-    partner: str,
-    start_year: int,
-    end_year: int,
-    flow: str,
-) -> Dict[str, Any]:
-    hs = resolve_commodity(commodity)
-    reporter_code = resolve_country(reporter)
-    partner_code = partner
-    flow_lower = flow.lower()
-    if flow_lower == "both":
-        flows = ["X", "M"]
-    elif flow_lower in ("x", "export", "exports"):
-        flows = ["X"]
-    elif flow_lower in ("m", "import", "imports"):
-        flows = ["M"]
-    else:
-        flows = [flow]
+def fetch_trade_frames(
+    requests_: Sequence[Tuple[str, str, str, str]],
+    years: List[int],
+    time_budget: Optional[float] = None,
+) -> Tuple[pd.DataFrame, List[Dict[str, Any]]]:
+    """
+    Issue one Comtrade request per (reporter, partner, hs, flow) concurrently, bounded
+    by the per-host limit, and concatenate the frames as they arrive. Returns the
+    combined frame (tagged with the codes it was requested for) and the failed requests.
+
+    With `time_budget` (seconds), requests already in the Parquet cache go first and
+    whatever has not finished by then is returned as failed with "pending": True;
+    requests already running keep going in the background and land in the cache.
+    """
+    cache = get_comtrade_cache()
+    if time_budget is not None and cache is not None:
+        requests_ = sorted(requests_, key=lambda r: bool(cache.missing_years(r[2], r[0], r[1], r[3], years)))
+
+    def fetch_one(reporter_code: str, partner_code: str, hs: str, f: str) -> pd.DataFrame:
+        def load(period_years: Sequence[int]) -> pd.DataFrame:
+            params = {
+                "fmt": "json",
+                "reporterCode": reporter_code,
+                "partnerCode": partner_code,
+                "period": ",".join(str(y) for y in period_years),
+                "cmdCode": hs,
+                "flowCode": f,
+            }
+            if partner_code == "all":
+                # No partner filter: one row per partner country
+                del params["partnerCode"]
+            return clean_dataframe(get_tariffline_data("C", "A", "HS", params))
+
+        if cache is None:
+            df = load(years)
+        else:
+            # Only missing or stale year partitions are requested
+            df = cache.fetch(hs, reporter_code, partner_code, f, years, load)
+        if not df.empty:
+            df["flow"] = "Export" if f == "X" else "Import"
+            df["reporter_code"] = reporter_code
+            df["partner_code"] = partner_code
+            df["commodity_code"] = hs
+        return df
 
     frames: List[pd.DataFrame] = []
-    for f in flows:
-        params = {
-            "fmt": "json",
-            "reporterCode": reporter_code,
-            "partnerCode": partner_code,
-            "period": year_param(start_year, end_year),
-            "cmdCode": hs,
-            "flowCode": f,
-        }
-        try:
-            raw = get_tariffline_data("C", "A", "HS", params)
-            df = clean_dataframe(raw)
+    failed: List[Dict[str, Any]] = []
+    if not requests_:
+        return pd.DataFrame(), failed
+    pool = ThreadPoolExecutor(max_workers=min(len(requests_), max(1, COMTRADE_MAX_CONCURRENCY)))
+    futures = {pool.submit(fetch_one, *req): req for req in requests_}
+    try:
+        for future in as_completed(futures, timeout=time_budget):
+            reporter_code, partner_code, hs, f = futures[future]
+            try:
+                df = future.result()
+            except Exception as e:
+                logger.error("Error fetching EXIM data for %s: %s", futures[future], e)
+                failed.append({"reporter": reporter_code, "partner": partner_code,
+                               "commodity_code": hs, "flow": f, "error": str(e)})
+                continue
             if not df.empty:
-                df["flow"] = "Export" if f == "X" else "Import"
                 frames.append(df)
-        except Exception as e:
-            logger.error("Error fetching EXIM data: %s", e)
-
+    except FuturesTimeout:
+        for future, (reporter_code, partner_code, hs, f) in futures.items():
+            if not future.done():
+                failed.append({"reporter": reporter_code, "partner": partner_code, "commodity_code": hs,
+                               "flow": f, "error": f"not finished within {time_budget:.0f}s", "pending": True})
+    finally:
+        # Queued requests are dropped; running ones finish into the cache
+        pool.shutdown(wait=False, cancel_futures=True)
     if not frames:
-        return {"status": "no_data", "message": "No trade data found for given parameters"}
-
-    combined = pd.concat(frames, ignore_index=True)
-    if "year" not in combined.columns or "trade_value" not in combined.columns:
-        return {"status": "no_data", "message": "Missing required columns in response"}
-
-    grouped = combined.groupby(["year", "flow"], as_index=False).agg({"trade_value": "sum"})
+        return pd.DataFrame(), failed
+    return pd.concat(frames, ignore_index=True), failed
+
+
+def calc_cagr(rows: List[Dict[str, Any]]) -> Optional[float]:
+    if len(rows) < 2:
+        return None
+    rows = sorted(rows, key=lambda r: int(r["year"]))
+    start_val = rows[0]["trade_value"]
+    end_val = rows[-1]["trade_value"]
+    n = len(rows) - 1
+    if start_val <= 0 or n <= 0:
+        return None
+    try:
+        return round(((end_val / start_val) ** (1 / n) - 1) * 100, 2)
+    except Exception:
+        return None
+
+
+def summarize_trade(
+    df: pd.DataFrame,
+    hs: str,
+    reporter_code: str,
+    partner_code: str,
+    start_year: int,
+    end_year: int,
+) -> Dict[str, Any]:
+    """Trend payload for one reporter/partner/commodity slice of the fetched data."""
+    grouped = df.groupby(["year", "flow"], as_index=False).agg({"trade_value": "sum"})
     yearly_trends = grouped.sort_values(["year", "flow"]).to_dict(orient="records")
 
     top_partners: List[Dict[str, Any]] = []
     if partner_code == "0":
-        if "partner" in combined.columns:
-            p = combined.groupby("partner", as_index=False)["trade_value"].sum()
+        if "partner" in df.columns:
+            p = df.groupby("partner", as_index=False)["trade_value"].sum()
             p = p.sort_values("trade_value", ascending=False).head(10)
             top_partners = p.to_dict(orient="records")
-        elif "partnerCode" in combined.columns:
-            p = combined.groupby("partnerCode", as_index=False)["trade_value"].sum()
+        elif "partnerCode" in df.columns:
+            p = df.groupby("partnerCode", as_index=False)["trade_value"].sum()
             p = p.sort_values("trade_value", ascending=False).head(10)
             top_partners = p.to_dict(orient="records")
 
-    def calc_cagr(rows: List[Dict[str, Any]]) -> Optional[float]:
-        if len(rows) < 2:
-            return None
-        rows = sorted(rows, key=lambda r: int(r["year"]))
-        start_val = rows[0]["trade_value"]
-        end_val = rows[-1]["trade_value"]
-        n = len(rows) - 1
-        if start_val <= 0 or n <= 0:
-            return None
-        try:
-            return round(((end_val / start_val) ** (1 / n) - 1) * 100, 2)
-        except Exception:
-            return None
-
     exports = [r for r in yearly_trends if r["flow"] == "Export"]
     imports = [r for r in yearly_trends if r["flow"] == "Import"]
     total_export = sum(r["trade_value"] for r in exports)
@@ -229,6 +292,123 @@ def fetch_exim_trends(
     }
 
 
+def fetch_exim_trends(
+    commodity: Union[str, Sequence[str]],
+    reporter: Union[str, Sequence[str]],
+    partner: Union[str, Sequence[str]],
+    start_year: int,
+    end_year: int,
+    flow: str,
+) -> Dict[str, Any]:
+    """
+    Trade trends for one or more commodities, reporters and partners (lists or
+    comma-separated strings). All Comtrade requests are issued concurrently. A single
+    reporter/partner/commodity returns one trend payload; several return
+    {"status": "success", "comparisons": [payload, ...]} in request order.
+    """
+    try:
+        hs_codes = [resolve_commodity(c) for c in as_list(commodity)]
+        reporter_codes = [resolve_country(r) for r in as_list(reporter)]
+        partner_codes = [resolve_country(p) for p in as_list(partner, default="0")]
+    except TradeCodeError as e:
+        return e.to_dict()
+    flows = resolve_flows(flow)
+
+    requests_ = list(product(reporter_codes, partner_codes, hs_codes, flows))
+    if len(requests_) > MAX_TRADE_REQUESTS:
+        return {
+            "status": "error",
+            "message": f"{len(requests_)} reporter/partner/commodity/flow combinations requested; "
+                       f"the limit is {MAX_TRADE_REQUESTS}. Narrow the comparison.",
+        }
+
+    combined, failed = fetch_trade_frames(requests_, list(range(start_year, end_year + 1)))
+    if combined.empty:
+        return {"status": "no_data", "message": "No trade data found for given parameters", "failed": failed}
+    if "year" not in combined.columns or "trade_value" not in combined.columns:
+        return {"status": "no_data", "message": "Missing required columns in response"}
+
+    comparisons = []
+    slices = combined.groupby(["reporter_code", "partner_code", "commodity_code"], sort=False)
+    by_key = {key: df for key, df in slices}
+    for key in product(reporter_codes, partner_codes, hs_codes):
+        df = by_key.get(key)
+        if df is None:
+            continue
+        reporter_code, partner_code, hs = key
+        comparisons.append(summarize_trade(df, hs, reporter_code, partner_code, start_year, end_year))
+
+    if len(reporter_codes) == len(partner_codes) == len(hs_codes) == 1:
+        result = comparisons[0]
+    else:
+        result = {
+            "status": "success",
+            "period": f"{start_year}-{end_year}",
+            "comparisons": comparisons,
+        }
+    if failed:
+        result["failed"] = failed
+    return result
+
+
+def scan_sourcing_risk(
+    reporter: Union[str, Sequence[str]],
+    start_year: int,
+    end_year: int,
+    commodity: Union[str, Sequence[str], None] = None,
+    top_k: int = 5,
+    expand_hs: bool = False,
+) -> Dict[str, Any]:
+    """
+    Sourcing-risk scan over many commodities (default: every HS code in PHARMA_CODES)
+    and reporters: imports and exports by partner are fetched concurrently and
+    batch_trade_metrics computes dependency, growth and supplier concentration for
+    every commodity x reporter pair at once. With `expand_hs`, each code is replaced by
+    its listed child codes (chapter -> headings, heading -> subheadings).
+    """
+    try:
+        hs_codes = [resolve_commodity(c) for c in as_list(commodity)] or list(dict.fromkeys(PHARMA_CODES.values()))
+        reporter_codes = [resolve_country(r) for r in as_list(reporter)]
+    except TradeCodeError as e:
+        return e.to_dict()
+    if expand_hs:
+        # Break chapters into headings and headings into subheadings where the nomenclature lists them
+        hs_codes = list(dict.fromkeys(
+            child["code"] for hs in hs_codes for child in (get_trade_codes().expand(hs) or [{"code": hs}])
+        ))
+    requests_ = list(product(reporter_codes, ["all"], hs_codes, ["M", "X"]))
+    if len(requests_) > MAX_SCAN_REQUESTS:
+        return {
+            "status": "error",
+            "message": f"{len(requests_)} requests needed; the scan limit is {MAX_SCAN_REQUESTS}. "
+                       "Use fewer reporters or commodities.",
+        }
+
+    combined, failed = fetch_trade_frames(requests_, list(range(start_year, end_year + 1)), SCAN_TIME_BUDGET)
+    pending = [f for f in failed if f.get("pending")]
+    failed = [f for f in failed if not f.get("pending")]
+    note = None
+    if pending:
+        note = (f"{len(pending)} of {len(requests_)} requests did not finish within {SCAN_TIME_BUDGET}s; "
+                "results are partial. Requests already running finish into the cache; re-running the same scan "
+                "completes it.")
+    if combined.empty:
+        result = {"status": "no_data", "message": note or "No trade data found for given parameters", "failed": failed}
+    else:
+        metrics, suppliers = batch_trade_metrics(combined, top_k=max(1, min(int(top_k or 5), 20)))
+        result = {
+            "status": "success",
+            "period": f"{start_year}-{end_year}",
+            "pairs": len(metrics),
+            "risks": risk_records(metrics, suppliers),
+        }
+        if failed:
+            result["failed"] = failed
+    if pending:
+        result.update(partial=True, message=note, pending=len(pending))
+    return result
+
+
 def compute_insights(trade_data: Dict[str, Any]) -> Dict[str, Any]:
     if trade_data.get("status") != "success":
         return {"status": "error", "message": "Invalid trade data"}
@@ -276,13 +456,25 @@ tools = [
         "type": "function",
         "function": {
             "name": "fetch_exim_trends",
-            "description": "Fetch EXIM trade trends for a given HS code and reporter/partner over a time range.",
+            "description": (
+                "Fetch EXIM trade trends for one or more HS codes, reporters and partners over a time range. "
+                "Pass every country/commodity of a comparison in one call; they are fetched concurrently."
+            ),
             "parameters": {
                 "type": "object",
                 "properties": {
-                    "commodity": {"type": "string"},
-                    "reporter": {"type": "string"},
-                    "partner": {"type": "string", "description": "Partner country code, '0' for World"},
+                    "commodity": {
+                        "type": "string",
+                        "description": "Commodity name or HS code; comma-separate several (e.g. '2941, 3004')",
+                    },
+                    "reporter": {
+                        "type": "string",
+                        "description": "Reporter country name or code; comma-separate several (e.g. 'India, China')",
+                    },
+                    "partner": {
+                        "type": "string",
+                        "description": "Partner country code, '0' for World; comma-separate several",
+                    },
                     "start_year": {"type": "integer"},
                     "end_year": {"type": "integer"},
                     "flow": {
@@ -293,10 +485,89 @@ tools = [
                 "required": ["commodity", "reporter", "start_year", "end_year", "flow"],
             },
         },
-    }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "scan_sourcing_risk",
+            "description": (
+                "Portfolio-wide sourcing-risk scan: import dependency, trade balance, CAGR/YoY and supplier "
+                "concentration (HHI, top suppliers) for every commodity x reporter pair, ranked by risk."
+            ),
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "reporter": {
+                        "type": "string",
+                        "description": "Reporter countries, comma-separated (e.g. 'India, USA, Germany')",
+                    },
+                    "commodity": {
+                        "type": "string",
+                        "description": "Commodities or HS codes, comma-separated; omit to scan all pharma HS codes",
+                    },
+                    "start_year": {"type": "integer"},
+                    "end_year": {"type": "integer"},
+                    "top_k": {"type": "integer", "description": "Top suppliers to list per pair (default 5)"},
+                    "expand_hs": {
+                        "type": "boolean",
+                        "description": "Break each HS chapter/heading into its sub-codes (e.g. 2941 into penicillins, "
+                                       "tetracyclines, ...)",
+                    },
+                },
+                "required": ["reporter", "start_year", "end_year"],
+            },
+        },
+    },
 ]
 
 
+def execute_exim_tool(tool_call: Any) -> Dict[str, Any]:
+    fn_name = tool_call.function.name
+    args = json.loads(tool_call.function.arguments)
+
+    if fn_name == "fetch_exim_trends":
+        trade = fetch_exim_trends(
+            commodity=args["commodity"],
+            reporter=args["reporter"],
+            partner=args.get("partner", "0"),
+            start_year=int(args["start_year"]),
+            end_year=int(args["end_year"]),
+            flow=args["flow"],
+        )
+        if trade.get("status") != "success":
+            return {
+                "tool": fn_name,
+                "args": args,
+                "trade_data": trade,
+            }
+        if "comparisons" in trade:
+            ins = [compute_insights(c) for c in trade["comparisons"]]
+        else:
+            ins = compute_insights(trade)
+        return {
+            "tool": fn_name,
+            "args": args,
+            "trade_data": trade,
+            "insights": ins,
+        }
+
+    if fn_name == "scan_sourcing_risk":
+        return {
+            "tool": fn_name,
+            "args": args,
+            "trade_data": scan_sourcing_risk(
+                reporter=args["reporter"],
+                start_year=int(args["start_year"]),
+                end_year=int(args["end_year"]),
+                commodity=args.get("commodity"),
+                top_k=args.get("top_k") or 5,
+                expand_hs=bool(args.get("expand_hs")),
+            ),
+        }
+
+    return {"error": f"Unknown tool called: {fn_name}", "raw_args": args}
+
+
 def handle_user_query(user_query: str):
     response = client.chat.completions.create(
         model="gemini-2.5-flash",
@@ -311,34 +582,11 @@ def handle_user_query(user_query: str):
     message = response.choices[0].message
 
     if message.tool_calls:
-        tool_call = message.tool_calls[0]
-        fn_name = tool_call.function.name
-        args = json.loads(tool_call.function.arguments)
-
-        if fn_name == "fetch_exim_trends":
-            trade = fetch_exim_trends(
-                commodity=args["commodity"],
-                reporter=args["reporter"],
-                partner=args.get("partner", "0"),
-                start_year=int(args["start_year"]),
-                end_year=int(args["end_year"]),
-                flow=args["flow"],
-            )
-            if trade.get("status") != "success":
-                return {
-                    "tool": fn_name,
-                    "args": args,
-                    "trade_data": trade,
-                }
-            ins = compute_insights(trade)
-            return {
-                "tool": fn_name,
-                "args": args,
-                "trade_data": trade,
-                "insights": ins,
-            }
-
-        return {"error": f"Unknown tool called: {fn_name}", "raw_args": args}
+        # Every requested fetch (e.g. one per country) runs concurrently
+        results = execute_tool_calls(message.tool_calls, execute_exim_tool)
+        if len(results) == 1:
+            return results[0]
+        return {"results": results}
 
     return {"response": message.content}
 
@@ -1,10 +1,14 @@
 import json
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from openai import OpenAI
-import google.generativeai as genai
-import pathlib
 from app.config.settings import settings
 from app.utils.prompts import INTERNAL_KNOWLEDGE_SYSTEM_PROMPT
-from app.tools.internal_doc_tool import list_documents,load_document_file,generate_briefing_pdf
+from app.tools.internal_doc_tool import generate_briefing_pdf
+from app.tools.analysis_cache import get_analysis_cache
+from app.tools.doc_catalog import get_document_catalog, refresh_documents
+from app.tools.doc_index import format_chunks
+from app.tools.vector_index import search_documents
 from .base_agent import BaseAgent
 
 client = OpenAI(
@@ -12,126 +16,187 @@ client = OpenAI(
     base_url="https://generativelanguage.googleapis.com/v1beta/openai/"
 )
 
+MODEL = "gemini-2.5-flash"
+# Best retrieved chunks a secondary document can qualify through (see select_documents)
+TOP_CHUNKS = 10
+
+BRIEFING_TOOL = {
+    "type": "function",
+    "function": {
+        "name": "generate_briefing_pdf",
+        "description": "Create PDF report",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "summary": {"type": "string"},
+                "takeaways": {"type": "string"},
+                "table": {"type": "string"}
+            },
+            "required": ["summary", "takeaways", "table"]
+        }
+    }
+}
+
+
+def retrieve_context(user_query: str):
+    """Top-ranked chunks (semantic + BM25) across all internal documents, within DOC_CONTEXT_TOKENS."""
+    # The background scanner keeps the catalog current; scan here only if it is not running or behind
+    refresh_documents(max_age_seconds=settings.DOC_SCAN_INTERVAL_SECONDS or None)
+    return search_documents(user_query, token_budget=settings.DOC_CONTEXT_TOKENS)
+
+
+def select_documents(chunks, limit: int, min_ratio: float = None, min_top_chunks: int = None):
+    """
+    Documents worth analyzing, best first, at most `limit`: the one with the highest summed
+    chunk score, plus any other scoring at least `min_ratio` of it or holding `min_top_chunks`
+    of the TOP_CHUNKS best chunks. A stray weak match (which the hashing embedder produces
+    for almost every document) does not pull its document into a map-reduce.
+    """
+    min_ratio = settings.DOC_RELEVANCE_RATIO if min_ratio is None else min_ratio
+    min_top_chunks = settings.DOC_MIN_TOP_CHUNKS if min_top_chunks is None else min_top_chunks
+    scores = defaultdict(float)
+    top_hits = defaultdict(int)
+    for chunk in chunks:
+        scores[chunk["file_name"]] += chunk["score"]
+    for chunk in sorted(chunks, key=lambda c: c["score"], reverse=True)[:TOP_CHUNKS]:
+        top_hits[chunk["file_name"]] += 1
+    ranked = sorted(scores, key=scores.get, reverse=True)
+    if not ranked:
+        return []
+    best = scores[ranked[0]]
+    selected = [ranked[0]] + [
+        f for f in ranked[1:] if scores[f] >= min_ratio * best or top_hits[f] >= min_top_chunks
+    ]
+    return selected[:limit]
+
+
+def analyze_excerpts(user_query: str, chunks):
+    """Single-pass analysis of retrieved excerpts (one document, or the fallback)."""
+    response = client.chat.completions.create(
+        model=MODEL,
+        messages=[
+            {"role": "system", "content": INTERNAL_KNOWLEDGE_SYSTEM_PROMPT},
+            {"role": "user", "content": (
+                f"User query: {user_query}\n\n"
+                f"Document excerpts:\n{format_chunks(chunks)}\n\n"
+                "Use the user's query as the focus of your analysis. From these excerpts produce: a summary, "
+                "key takeaways, and a structured table relevant to that query. Cite sources as [file p.N]."
+            )}
+        ]
+    )
+    print(f"Analyzed {len(chunks)} chunks from {len({c['file_name'] for c in chunks})} documents")
+    return response.choices[0].message.content or ""
 
 
-def internal_agent(user_query: str):
-    """Runs internal knowledge agent with tool calling."""
-
-    available_docs = list_documents()
-
-    tools=[
-            {
-                "type": "function",
-                "function": {
-                    "name": "load_document_file",
-                    "description": "Load a document file for analysis",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "file_name": {"type": "string"}
-                        },
-                        "required": ["file_name"]
-                    }
-                }
-            },
-            {
-                "type": "function",
-                "function": {
-                    "name": "generate_briefing_pdf",
-                    "description": "Generate final combined PDF",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "summary": {"type": "string"},
-                            "takeaways": {"type": "string"},
-                            "table": {"type": "string"}
-                        },
-                        "required": ["summary", "takeaways", "table"]
-                    }
-                }
-            }
+def extract_findings(user_query: str, file_name: str):
+    """Map step: findings relevant to the query from one document's best excerpts ("" if none)."""
+    chunks = search_documents(user_query, token_budget=settings.DOC_DOCUMENT_TOKENS, files=[file_name])
+    if not chunks:
+        return ""
+    response = client.chat.completions.create(
+        model=MODEL,
+        messages=[
+            {"role": "system", "content": INTERNAL_KNOWLEDGE_SYSTEM_PROMPT},
+            {"role": "user", "content": (
+                f"User query: {user_query}\n\n"
+                f"Excerpts from {file_name}:\n{format_chunks(chunks)}\n\n"
+                "Extract only the findings relevant to the query as short bullet points, each ending with its "
+                "[file p.N] citation. Reply NONE if these excerpts say nothing relevant."
+            )}
         ]
+    )
+    findings = (response.choices[0].message.content or "").strip()
+    return "" if findings.upper() == "NONE" else findings
+
+
+def map_reduce_analysis(user_query: str, files):
+    """
+    Multi-document analysis: per-document extraction runs concurrently (DOC_MAP_WORKERS),
+    then one reduce call combines the findings. Returns "" if no document yielded findings.
+    """
+    findings = {}
+    with ThreadPoolExecutor(max_workers=max(1, min(settings.DOC_MAP_WORKERS, len(files)))) as pool:
+        futures = {pool.submit(extract_findings, user_query, f): f for f in files}
+        for future in as_completed(futures):
+            file_name = futures[future]
+            try:
+                findings[file_name] = future.result()
+            except Exception as e:
+                print(f"Extraction failed for {file_name}: {e}")
+    # Keep the relevance order of `files`, not completion order
+    usable = [(f, findings[f]) for f in files if findings.get(f)]
+    print(f"Extracted findings from {len(usable)} of {len(files)} documents")
+    if not usable:
+        return ""
 
-    # First LLM call — choose document & analyze
     response = client.chat.completions.create(
-        model="gemini-2.5-flash",
+        model=MODEL,
         messages=[
             {"role": "system", "content": INTERNAL_KNOWLEDGE_SYSTEM_PROMPT},
-            {"role": "user", "content": f"User query: {user_query}\nAvailable documents: {available_docs}"}
+            {"role": "user", "content": (
+                f"User query: {user_query}\n\n"
+                "Findings extracted from each document:\n\n"
+                + "\n\n".join(f"### {f}\n{text}" for f, text in usable) + "\n\n"
+                "Combine these findings into one answer to the query: a summary, key takeaways, and a structured "
+                "table relevant to that query. Compare documents where they differ, and keep the [file p.N] "
+                "citations."
+            )}
+        ]
+    )
+    return response.choices[0].message.content or ""
+
+
+def internal_agent(user_query: str):
+    """
+    Runs internal knowledge agent: retrieve relevant chunks, analyze them (map-reduce
+    across documents only when more than one passes select_documents), render the briefing.
+    """
+
+    chunks = retrieve_context(user_query)
+    if not chunks:
+        return "No internal document passages match this query."
+    documents = select_documents(chunks, settings.DOC_MAX_DOCUMENTS)
+
+    # Same question over the same document versions: reuse the analysis and the rendered briefing
+    cache = get_analysis_cache()
+    doc_hashes = list(get_document_catalog().hashes(documents).values())
+    key = cache.key(doc_hashes, user_query, MODEL) if cache else None
+    cached = cache.get(key) if cache else None
+    if cached:
+        print("Analysis cache hit")
+        return {"pdf_path": cached["pdf_path"]}
+
+    # First LLM step — analyze only retrieved excerpts, one extraction per document when several match
+    analysis = map_reduce_analysis(user_query, documents) if len(documents) > 1 else ""
+    if not analysis:
+        analysis = analyze_excerpts(user_query, [c for c in chunks if c["file_name"] in documents])
+
+    # Now ask LLM to call the PDF generation tool
+    pdf_response = client.chat.completions.create(
+        model=MODEL,
+        messages=[
+            {"role": "system", "content": INTERNAL_KNOWLEDGE_SYSTEM_PROMPT},
+            {"role": "assistant", "content": analysis},
+            {"role": "user", "content": "Generate the corporate PDF briefing now using the tool."}
         ],
-        tools=tools,
+        tools=[BRIEFING_TOOL],
         tool_choice="auto"
     )
 
-    msg = response.choices[0].message
-
-    # Handle tool calls
-    if msg.tool_calls:
-        tool_call = msg.tool_calls[0]
-        fn_name = tool_call.function.name
-        args = json.loads(tool_call.function.arguments)
-
-        if fn_name == "load_document_file":
-            BASE_DIR = pathlib.Path(__file__).resolve().parent.parent  # backend/app
-            DATA_DIR = BASE_DIR / "data"  # backend/app/data
-            filepath = DATA_DIR / args["file_name"]
-            genai.configure(api_key=settings.GOOGLE_API_KEY)
-            model = genai.GenerativeModel("gemini-2.5-flash")
-            response_g = model.generate_content(
-                [
-                    {
-                        "mime_type": "application/pdf",
-                        "data": filepath.read_bytes(),
-                    },
-                    f"Use the user's query ({user_query}) as the focus of your analysis. Extract information from the document and produce: a summary, key takeaways, and a structured table relevant to that query."
-                ]
-            )
-
-            print("Document Parsed and summarized")
-
-
-            analysis = response_g.text
-            # Now ask LLM to call the PDF generation tool
-            pdf_response = client.chat.completions.create(
-            model="gemini-2.5-flash",
-            messages=[
-                {"role": "system", "content": INTERNAL_KNOWLEDGE_SYSTEM_PROMPT},
-                {"role": "assistant", "content": analysis},
-                {"role": "user", "content": "Generate the corporate PDF briefing now using the tool."}
-            ],
-            tools=[
-                {
-                    "type": "function",
-                    "function": {
-                        "name": "generate_briefing_pdf",
-                        "description": "Create PDF report",
-                        "parameters": {
-                            "type": "object",
-                            "properties": {
-                                "summary": {"type": "string"},
-                                "takeaways": {"type": "string"},
-                                "table": {"type": "string"}
-                            },
-                            "required": ["summary", "takeaways", "table"]
-                        }
-                    }
-                }
-            ],
-            tool_choice="auto"
-        )
-
-        # If tool didn't trigger — fail early with a meaningful message
-        message = pdf_response.choices[0].message
-
-        if message.tool_calls is None:
-            raise ValueError("Model did not call the PDF tool. Last message:\n" + message.content)
-
-        pdf_call = message.tool_calls[0]
-        pdf_args = json.loads(pdf_call.function.arguments)
+    # If tool didn't trigger — fail early with a meaningful message
+    message = pdf_response.choices[0].message
 
-        return generate_briefing_pdf(**pdf_args)
+    if message.tool_calls is None:
+        raise ValueError("Model did not call the PDF tool. Last message:\n" + message.content)
 
-    return msg.content
+    pdf_call = message.tool_calls[0]
+    pdf_args = json.loads(pdf_call.function.arguments)
+
+    if cache is None:
+        return generate_briefing_pdf(**pdf_args)
+    result = generate_briefing_pdf(**pdf_args, output_path=cache.briefing_path(key))
+    cache.put(key, user_query, MODEL, doc_hashes, analysis, pdf_args)
+    return result
 
 class InternalKnowledgeAgent(BaseAgent):
 
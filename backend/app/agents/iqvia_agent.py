@@ -1,7 +1,13 @@
 from openai import OpenAI
 from app.config.settings import settings
 import json
-from app.tools.supabase_tool import run_query
+from app.tools.supabase_tool import run_guarded_query
+from app.tools.iqvia_rollups import ROLLUP_VIEWS, query_market_rollup
+from app.tools.sql_plan_cache import get_plan_cache
+from app.tools.sql_results import is_error, split_result
+from app.tools.tool_runtime import (
+    assistant_tool_call_message, execute_tool_calls, joined_sql, merge_row_results, tool_result_messages
+)
 from app.utils.prompts import IQVIA_SYSTEM_PROMPT
 from .base_agent import BaseAgent
 
@@ -10,6 +16,9 @@ client = OpenAI(
     base_url="https://generativelanguage.googleapis.com/v1beta/openai/"
 )
 
+SQL_TABLES = ["iqvia_sales"]
+MAX_SQL_ATTEMPTS = 3
+
 tools = [
     {
         "type": "function",
@@ -24,43 +33,110 @@ tools = [
                 "required": ["sql"]
             }
         }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "query_market_rollup",
+            "description": (
+                "Precomputed iqvia_sales aggregates (molecule x region x year). Prefer this over SQL for "
+                "top-N molecules by sales_value, region breakdowns, year-over-year trends, CAGR and "
+                "competitor comparisons."
+            ),
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "view": {"type": "string", "enum": ROLLUP_VIEWS},
+                    "molecule": {"type": "string", "description": "Required for every view except top_molecules"},
+                    "region": {"type": "string"},
+                    "year": {"type": "integer"},
+                    "limit": {"type": "integer"}
+                },
+                "required": ["view"]
+            }
+        }
     }
 ]
 
-def handle_user_query(user_query: str):
-
-    response = client.chat.completions.create(
-        model="gemini-2.5-flash",
-        messages=[
-            {"role": "system", "content": IQVIA_SYSTEM_PROMPT},
-            {"role": "user", "content": user_query}
-        ],
-        tools=tools,
-        tool_choice="auto"  
-    )
-
-    message = response.choices[0].message
-
-    if message.tool_calls:
-
-        tool_call = message.tool_calls[0]
-        fn_name = tool_call.function.name
-        args = json.loads(tool_call.function.arguments)
-
-        print("LLM called tool:", fn_name)
-        print("Args:", args)
-
-        # Execute the tool
-        sql = args["sql"]
-        result = run_query(sql)
+def execute_tool(tool_call):
+    args = json.loads(tool_call.function.arguments)
+    if tool_call.function.name == "query_market_rollup":
+        return query_market_rollup(args)
+    return run_guarded_query(args["sql"], SQL_TABLES)
+
+def describe_call(tool_call):
+    """The SQL for query_supabase calls; a readable label for rollup lookups."""
+    args = json.loads(tool_call.function.arguments)
+    if tool_call.function.name == "query_market_rollup":
+        return f"rollup:{args.get('view')} " + json.dumps({k: v for k, v in args.items() if k != "view"})
+    return args["sql"]
+
+def sql_output(sql, result):
+    # The frontend renders `result` as a row list; large results add their aggregates alongside
+    rows, summary = split_result(result)
+    output = {
+        "sql": sql,
+        "result": rows
+    }
+    if summary:
+        output["summary"] = summary
+    return output
 
-        return {
-            "sql": sql,
-            "result": result
-        }
+def handle_user_query(user_query: str):
 
-    # If no tool was called
-    return {"response": message["content"]}
+    # Recurring question shapes reuse a learned SQL template instead of asking the LLM
+    plan_cache = get_plan_cache("iqvia", ["molecule", "region"], "iqvia_sales")
+    cached_sql = plan_cache.lookup(user_query) if plan_cache else None
+    if cached_sql:
+        print("Plan cache hit:", cached_sql)
+        result = run_guarded_query(cached_sql, SQL_TABLES)
+        if not is_error(result):
+            return sql_output(cached_sql, result)
+
+    messages = [
+        {"role": "system", "content": IQVIA_SYSTEM_PROMPT},
+        {"role": "user", "content": user_query}
+    ]
+
+    for attempt in range(MAX_SQL_ATTEMPTS):
+        response = client.chat.completions.create(
+            model="gemini-2.5-flash",
+            messages=messages,
+            tools=tools,
+            tool_choice="auto"
+        )
+
+        message = response.choices[0].message
+
+        # If no tool was called
+        if not message.tool_calls:
+            return {"response": message.content}
+
+        sqls = []
+        for tool_call in message.tool_calls:
+            args = json.loads(tool_call.function.arguments)
+            print("LLM called tool:", tool_call.function.name)
+            print("Args:", args)
+            sqls.append(describe_call(tool_call))
+
+        # Execute every requested query concurrently
+        results = execute_tool_calls(message.tool_calls, execute_tool)
+        if not any(is_error(r) for r in results):
+            break
+        # Hand rejected/failed queries back to the model so it can correct them
+        messages.append(assistant_tool_call_message(message))
+        messages.extend(tool_result_messages(message.tool_calls, results))
+
+    if len(sqls) == 1:
+        if plan_cache and not is_error(results[0]) and message.tool_calls[0].function.name == "query_supabase":
+            plan_cache.learn(user_query, sqls[0])
+        return sql_output(sqls[0], results[0])
+
+    return {
+        "sql": joined_sql(sqls),
+        "result": merge_row_results(results),
+        "results": [{"sql": sql, "result": r} for sql, r in zip(sqls, results)]
+    }
 
 class IQVIAAgent(BaseAgent):
 
@@ -3,6 +3,7 @@ from pydantic import BaseModel
 import json
 from app.utils.schemas import RouterOutput, SynthOutput
 from app.utils.prompts import MASTER_AGENT_ROUTER_PROMPT, SYNTH_PROMPT
+from app.utils.tool_encoding import encode_payload
 from app.agents import (
     iqvia_agent, patents_agent,exim_agent,
     clinical_agent, internal_agent, web_agent,
@@ -88,7 +89,7 @@ async def synth_node(state: MasterState, config):
         model="gemini-2.5-flash",
         messages=[
             {"role": "system", "content": SYNTH_PROMPT},
-            {"role": "user", "content": f"User query:\n{user_query}\n\nAgent outputs:\n{state.results}"}
+            {"role": "user", "content": f"User query:\n{user_query}\n\nAgent outputs:\n{encode_payload(state.results)}"}
         ],
         response_format={
             "type": "json_schema",
@@ -1,7 +1,13 @@
 from openai import OpenAI
 from app.config.settings import settings
 import json
-from app.tools.supabase_tool import run_query
+from app.tools.supabase_tool import run_guarded_query
+from app.tools.patent_index import patent_expiry_timeline, search_patents
+from app.tools.sql_plan_cache import get_plan_cache
+from app.tools.sql_results import is_error, split_result
+from app.tools.tool_runtime import (
+    assistant_tool_call_message, execute_tool_calls, joined_sql, merge_row_results, tool_result_messages
+)
 from app.utils.prompts import PATENT_SYSTEM_PROMPT
 from .base_agent import BaseAgent
 
@@ -10,6 +16,9 @@ client = OpenAI(
     base_url="https://generativelanguage.googleapis.com/v1beta/openai/"
 )
 
+SQL_TABLES = ["patents"]
+MAX_SQL_ATTEMPTS = 3
+
 tools = [
     {
         "type": "function",
@@ -24,41 +33,133 @@ tools = [
                 "required": ["sql"]
             }
         }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "search_patents",
+            "description": (
+                "Ranked full-text search over patent titles and abstracts. Use for topic questions "
+                "(e.g. 'GLP-1 oral delivery patents') instead of ILIKE on title/abstract."
+            ),
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "query": {"type": "string"},
+                    "molecule": {"type": "string"},
+                    "jurisdiction": {"type": "string"},
+                    "in_force_only": {"type": "boolean"},
+                    "limit": {"type": "integer"}
+                },
+                "required": ["query"]
+            }
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "patent_expiry_timeline",
+            "description": (
+                "Precomputed expiry timeline of a molecule's patents per jurisdiction: patents in force, "
+                "next and last expiry, earliest generic entry, patent cliff year and expiries per year."
+            ),
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "molecule": {"type": "string"},
+                    "jurisdiction": {"type": "string"}
+                },
+                "required": ["molecule"]
+            }
+        }
     }
 ]
 
+INDEX_TOOLS = {
+    "search_patents": search_patents,
+    "patent_expiry_timeline": patent_expiry_timeline,
+}
+
+def describe_call(tool_call):
+    """The SQL for query_supabase calls; a readable label for index lookups."""
+    args = json.loads(tool_call.function.arguments)
+    if tool_call.function.name in INDEX_TOOLS:
+        return f"{tool_call.function.name} {json.dumps(args)}"
+    return args.get("sql")
+
+def sql_output(sql, result):
+    # The frontend renders `data` as a row list; large results and timelines add their summaries alongside
+    rows, summary = split_result(result)
+    output = {
+        "sql": sql,
+        "data": rows
+    }
+    if summary:
+        output["summary"] = summary
+    return output
+
 def handle_patent_query(user_query: str):
     print(f"User Query: {user_query}")
 
-    response = client.chat.completions.create(
-        model="gemini-2.5-flash",
-        messages=[
-            {"role": "system", "content": PATENT_SYSTEM_PROMPT},
-            {"role": "user", "content": user_query}
-        ],
-        tools=tools,
-        tool_choice="auto"  
-    )
-
-    message = response.choices[0].message
-
-    if message.tool_calls:
-        tool_call = message.tool_calls[0]
-        fn_name = tool_call.function.name
+    # Recurring question shapes reuse a learned SQL template instead of asking the LLM
+    plan_cache = get_plan_cache("patents", ["molecule", "jurisdiction"], "patents")
+    cached_sql = plan_cache.lookup(user_query) if plan_cache else None
+    if cached_sql:
+        print(f"Plan cache hit: {cached_sql}")
+        data = run_guarded_query(cached_sql, SQL_TABLES)
+        if not is_error(data):
+            return sql_output(cached_sql, data)
+
+    messages = [
+        {"role": "system", "content": PATENT_SYSTEM_PROMPT},
+        {"role": "user", "content": user_query}
+    ]
+
+    def execute(tool_call):
         args = json.loads(tool_call.function.arguments)
+        if tool_call.function.name == "query_supabase":
+            return run_guarded_query(args["sql"], SQL_TABLES)
+        if tool_call.function.name in INDEX_TOOLS:
+            return INDEX_TOOLS[tool_call.function.name](args)
+        return {"error": f"Unknown tool called: {tool_call.function.name}"}
 
-        print(f"Agent decided to call: {fn_name}")
-        print(f"SQL generated: {args.get('sql')}")
+    for attempt in range(MAX_SQL_ATTEMPTS):
+        response = client.chat.completions.create(
+            model="gemini-2.5-flash",
+            messages=messages,
+            tools=tools,
+            tool_choice="auto"
+        )
 
-        if fn_name == "query_supabase":
-            sql = args["sql"]
-            result = run_query(sql)
-            return {
-                "sql": sql,
-                "data": result
-            }
+        message = response.choices[0].message
+
+        if not message.tool_calls:
+            return {"response": message.content}
 
-    return {"response": message.content}
+        sqls = []
+        for tool_call in message.tool_calls:
+            args = json.loads(tool_call.function.arguments)
+            print(f"Agent decided to call: {tool_call.function.name}")
+            print(f"Arguments: {args}")
+            sqls.append(describe_call(tool_call))
+
+        # Execute every requested query concurrently
+        results = execute_tool_calls(message.tool_calls, execute)
+        if not any(is_error(r) for r in results):
+            break
+        # Hand rejected/failed queries back to the model so it can correct them
+        messages.append(assistant_tool_call_message(message))
+        messages.extend(tool_result_messages(message.tool_calls, results))
+
+    if len(sqls) == 1:
+        if plan_cache and not is_error(results[0]) and message.tool_calls[0].function.name == "query_supabase":
+            plan_cache.learn(user_query, sqls[0])
+        return sql_output(sqls[0], results[0])
+    return {
+        "sql": joined_sql(sqls),
+        "data": merge_row_results(results),
+        "results": [{"sql": sql, "data": r} for sql, r in zip(sqls, results)]
+    }
 
 class PatentLandscapeAgent(BaseAgent):
 
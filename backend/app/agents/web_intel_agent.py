@@ -2,7 +2,9 @@ from openai import OpenAI
 from app.config.settings import settings
 import json
 from app.tools.web_tools import search_all
+from app.tools.tool_runtime import execute_tool_calls
 from app.utils.prompts import WEB_INTEL_SYSTEM_PROMPT, WEB_INTEL_SUMMARY_PROMPT, MASTER_PROMPT
+from app.utils.text_ranking import BM25Index, rank_passages, split_sentences
 from .base_agent import BaseAgent
 
 
@@ -36,43 +38,79 @@ tools = [
 
 import re
 
+# Token budget for the ranked passages forwarded to the summarizer / master prompt
+PASSAGE_TOKEN_BUDGET = 1500
+
 def _unwrap_codeblock(text: str) -> str:
     if not text:
         return ""
     m = re.search(r"```(?:json)?\s*(.+?)\s*```", text, flags=re.DOTALL | re.IGNORECASE)
     return m.group(1).strip() if m else text.strip()
 
-def _choose_quotes_from_docs(docs, max_quotes=2, max_words=25):
+def _choose_quotes_from_docs(docs, max_quotes=2, max_words=25, query=None):
+    """
+    Pick quote sentences by BM25 relevance to the query (one per source document).
+    Documents with no matching sentence fall back to their first sentence with >=6 words.
+    """
+    index = BM25Index()
+    candidates = {}
+    for doc_idx, d in enumerate(docs):
+        texts = [p["text"] for p in d.get("passages", [])] or [d.get("full_text") or d.get("snippet") or ""]
+        n = 0
+        for text in texts:
+            for s in split_sentences(text):
+                if len(s.split()) >= 6:
+                    candidates[(doc_idx, n)] = s
+                    index.add((doc_idx, n), s)
+                    n += 1
+
+    ranked = [key for key, _ in index.search(query)] if query else []
+    matched = set(ranked)
+    ranked += [key for key in sorted(candidates) if key not in matched]
+
     quotes = []
-    for d in docs:
-        text_source = (d.get("full_text") or d.get("snippet") or "")
-        if not text_source:
+    used_docs = set()
+    for doc_idx, n in ranked:
+        if doc_idx in used_docs:
             continue
-        # split into sentences & pick the first sentence with >6 words
-        sents = re.split(r'(?<=[.!?])\s+', text_source)
-        for s in sents:
-            words = s.strip().split()
-            if len(words) >= 6:
-                quote = " ".join(words[:max_words])
-                quotes.append({"text": quote, "source_url": d.get("url"), "context": d.get("title")})
-                break
+        used_docs.add(doc_idx)
+        d = docs[doc_idx]
+        quote = " ".join(candidates[(doc_idx, n)].split()[:max_words])
+        quotes.append({"text": quote, "source_url": d.get("url"), "context": d.get("title")})
         if len(quotes) >= max_quotes:
             break
-    return quotes[:max_quotes]
+    return quotes
 
-def synthesize_summary(query: str, documents: list):
-    # Build docs_payload including full_text when available
-    docs_payload = []
-    for d in documents:
-        docs_payload.append({
+def build_ranked_payload(query: str, documents: list, token_budget: int = PASSAGE_TOKEN_BUDGET):
+    """
+    Compact per-document payload for the LLM: metadata plus only the top BM25 passages
+    (within the token budget). A document with no passage sharing a query term keeps
+    its first snippet (or full-text) passage while the budget allows. The raw Europe PMC
+    record is never forwarded.
+    """
+    passages = rank_passages(query, documents, token_budget=token_budget, fallback_fields=("snippet", "full_text"))
+    by_doc = {}
+    for p in passages:
+        by_doc.setdefault(p["doc_index"], []).append({"text": p["text"], "score": p["score"]})
+
+    payload = []
+    for i, d in enumerate(documents):
+        payload.append({
             "title": d.get("title"),
             "url": d.get("url"),
-            "snippet": d.get("snippet"),
-            "full_text": d.get("full_text", ""),
             "source": d.get("source"),
             "type": d.get("type"),
-            "date": d.get("date")
+            "date": d.get("date"),
+            "passages": by_doc.get(i, [])
         })
+    # Most relevant documents first
+    payload.sort(key=lambda d: max((p["score"] for p in d["passages"]), default=0.0), reverse=True)
+    return payload
+
+def synthesize_summary(query: str, documents: list, docs_payload: list = None):
+    # Only the top-ranked passages per document are sent, not whole records
+    if docs_payload is None:
+        docs_payload = build_ranked_payload(query, documents)
 
     messages = [
         {"role": "system", "content": WEB_INTEL_SUMMARY_PROMPT},
@@ -98,7 +136,7 @@ def synthesize_summary(query: str, documents: list):
         notes = parsed.get("notes", "")
     except Exception:
         summary = [f"{d.get('title')} — {d.get('url')}" for d in docs_payload[:3]]
-        quotes = _choose_quotes_from_docs(docs_payload, max_quotes=2)
+        quotes = _choose_quotes_from_docs(docs_payload, max_quotes=2, query=query)
         top_sources = [{"title": d.get("title"), "url": d.get("url"), "type": d.get("type"), "credibility": "High"} for d in docs_payload[:3]]
         notes = "Auto-generated summary (fallback parsing)."
 
@@ -140,21 +178,35 @@ def handle_user_query(user_query: str):
     message = response.choices[0].message
 
     if message.tool_calls:
-        tool_call = message.tool_calls[0]
-        args = json.loads(tool_call.function.arguments)
-        query = args.get("query")
-        limit = args.get("limit", 6)
-        types = args.get("types", None)
-
-        print("LLM called tool: search_web")
-        print("Args:", args)
-
-        docs = search_all(query, limit=limit, types=types)
+        queries = []
+        for tool_call in message.tool_calls:
+            args = json.loads(tool_call.function.arguments)
+            print("LLM called tool: search_web")
+            print("Args:", args)
+            queries.append(args.get("query"))
+        query = " | ".join(q for q in queries if q)
+
+        def run_search(tc):
+            args = json.loads(tc.function.arguments)
+            return search_all(args.get("query"), limit=args.get("limit", 6), types=args.get("types", None))
+
+        # All searches requested in this turn run concurrently; merge without duplicates
+        docs = []
+        seen = set()
+        for result in execute_tool_calls(message.tool_calls, run_search):
+            for d in result if isinstance(result, list) else []:
+                key = d.get("id") or d.get("url")
+                if key in seen:
+                    continue
+                seen.add(key)
+                docs.append(d)
         print(f"Retrieved {len(docs)} documents from connectors")
-        summary = synthesize_summary(query, docs)
+        # Rank passages against the user's own wording, not just the keyword search query
+        docs_payload = build_ranked_payload(user_query, docs)
+        summary = synthesize_summary(query, docs, docs_payload=docs_payload)
         final_prompt = MASTER_PROMPT.format(
-            docs_array=json.dumps(docs, indent=2),
-            summary_array=json.dumps(summary, indent=2)
+            docs_array=json.dumps(docs_payload),
+            summary_array=json.dumps({k: v for k, v in summary.items() if k != "documents_used"})
         )
 
         messages=[
@@ -9,5 +9,78 @@ class Settings:
         self.SUPABASE_URL = os.getenv("SUPABASE_URL")
         self.SUPABASE_KEY = os.getenv("SUPABASE_KEY")
         self.DATA_FOLDER = os.getenv("DATA_FOLDER")
+        # SQL backend for the IQVIA/Patent agents: supabase | postgres | sqlite | duckdb
+        self.SQL_BACKEND = os.getenv("SQL_BACKEND", "supabase")
+        self.DATABASE_URL = os.getenv("DATABASE_URL")
+        self.LOCAL_SQL_PATH = os.getenv("LOCAL_SQL_PATH", ".cache/local_sql.db")
+        self.SQL_POOL_MIN_SIZE = int(os.getenv("SQL_POOL_MIN_SIZE", "1"))
+        self.SQL_POOL_MAX_SIZE = int(os.getenv("SQL_POOL_MAX_SIZE", "10"))
+        self.SQL_STATEMENT_CACHE_SIZE = int(os.getenv("SQL_STATEMENT_CACHE_SIZE", "100"))
+        self.SQL_STATEMENT_TIMEOUT_MS = int(os.getenv("SQL_STATEMENT_TIMEOUT_MS", "15000"))
+        # Guard on agent-written SQL: row cap added as LIMIT, EXPLAIN cost ceiling (0 disables either)
+        self.SQL_MAX_ROWS = int(os.getenv("SQL_MAX_ROWS", "50000"))
+        self.SQL_MAX_PLAN_COST = float(os.getenv("SQL_MAX_PLAN_COST", "1000000"))
+        # Local DuckDB replica of iqvia_sales/patents in front of a remote backend (empty disables)
+        self.SQL_REPLICA_PATH = os.getenv("SQL_REPLICA_PATH", "")
+        self.SQL_REPLICA_MAX_AGE_HOURS = float(os.getenv("SQL_REPLICA_MAX_AGE_HOURS", "24"))
+        self.SQL_REPLICA_SYNC_INTERVAL_HOURS = float(os.getenv("SQL_REPLICA_SYNC_INTERVAL_HOURS", "6"))
+        # Without a replica data version, IQVIA rollups re-check the source on this interval
+        self.IQVIA_ROLLUP_REFRESH_MINUTES = float(os.getenv("IQVIA_ROLLUP_REFRESH_MINUTES", "60"))
+        # Without a replica data version, the patent text/expiry indexes re-read patents on this interval
+        self.PATENT_INDEX_REFRESH_MINUTES = float(os.getenv("PATENT_INDEX_REFRESH_MINUTES", "60"))
+        # Versioned SQL result cache: in-process LRU plus a SQLite tier shared by workers
+        self.SQL_CACHE_MAX_ENTRIES = int(os.getenv("SQL_CACHE_MAX_ENTRIES", "512"))
+        self.SQL_CACHE_MAX_MB = int(os.getenv("SQL_CACHE_MAX_MB", "64"))
+        self.SQL_CACHE_PATH = os.getenv("SQL_CACHE_PATH", ".cache/sql_results.db")
+        self.SQL_CACHE_SHARED_MAX_ENTRIES = int(os.getenv("SQL_CACHE_SHARED_MAX_ENTRIES", "10000"))
+        self.SQL_CACHE_PROBE_SECONDS = float(os.getenv("SQL_CACHE_PROBE_SECONDS", "30"))
+        self.SQL_CACHE_VERSION_PROBE = os.getenv("SQL_CACHE_VERSION_PROBE", "count(*)")
+        # Results above the row threshold are streamed into a sample plus aggregates
+        self.SQL_RESULT_ROW_THRESHOLD = int(os.getenv("SQL_RESULT_ROW_THRESHOLD", "200"))
+        self.SQL_RESULT_SAMPLE_SIZE = int(os.getenv("SQL_RESULT_SAMPLE_SIZE", "25"))
+        self.SQL_FETCH_BATCH_SIZE = int(os.getenv("SQL_FETCH_BATCH_SIZE", "500"))
+        # Learned NL-to-SQL templates for the IQVIA/Patent agents (empty disables the plan cache)
+        self.SQL_PLAN_CACHE_DIR = os.getenv("SQL_PLAN_CACHE_DIR", ".cache/sql_plans")
+        # Parquet cache of Comtrade responses by HS/reporter/year (empty disables it);
+        # closed years are permanent, the current and previous year are revalidated on this interval
+        self.COMTRADE_CACHE_DIR = os.getenv("COMTRADE_CACHE_DIR", ".cache/comtrade")
+        self.COMTRADE_CACHE_REVALIDATE_HOURS = float(os.getenv("COMTRADE_CACHE_REVALIDATE_HOURS", "24"))
+        # Watchlist warm-up (empty watchlist disables it; empty window = CLI / endpoint runs only)
+        self.WARMUP_WATCHLIST = os.getenv("WARMUP_WATCHLIST", "")
+        self.WARMUP_WINDOW = os.getenv("WARMUP_WINDOW", "02:00-06:00")
+        self.WARMUP_STATUS_PATH = os.getenv("WARMUP_STATUS_PATH", ".cache/warmup_status.json")
+        self.WARMUP_STALE_HOURS = float(os.getenv("WARMUP_STALE_HOURS", "24"))
+        self.WARMUP_COMTRADE_PER_MINUTE = float(os.getenv("WARMUP_COMTRADE_PER_MINUTE", "30"))
+        self.WARMUP_TRIALS_PER_MINUTE = float(os.getenv("WARMUP_TRIALS_PER_MINUTE", "50"))
+        self.WARMUP_TRIAL_STUDIES = int(os.getenv("WARMUP_TRIAL_STUDIES", "100"))
+        # Internal documents catalog (content hashes, extracted text); rescanned every DOC_SCAN_INTERVAL_SECONDS (0 = startup only)
+        self.DOC_CATALOG_PATH = os.getenv("DOC_CATALOG_PATH", ".cache/doc_catalog.db")
+        self.DOC_SCAN_INTERVAL_SECONDS = float(os.getenv("DOC_SCAN_INTERVAL_SECONDS", "300"))
+        # Internal documents: chunk/inverted index and the prompt budget for retrieved chunks
+        self.DOC_INDEX_PATH = os.getenv("DOC_INDEX_PATH", ".cache/doc_index.db")
+        self.DOC_CHUNK_WORDS = int(os.getenv("DOC_CHUNK_WORDS", "200"))
+        self.DOC_CONTEXT_TOKENS = int(os.getenv("DOC_CONTEXT_TOKENS", "6000"))
+        # Multi-document questions: documents analyzed per query, excerpt budget per document, parallel extractions
+        self.DOC_MAX_DOCUMENTS = int(os.getenv("DOC_MAX_DOCUMENTS", "5"))
+        self.DOC_DOCUMENT_TOKENS = int(os.getenv("DOC_DOCUMENT_TOKENS", "3000"))
+        self.DOC_MAP_WORKERS = int(os.getenv("DOC_MAP_WORKERS", "4"))
+        # A further document is analyzed when its summed chunk score reaches this share of the best one,
+        # or it holds DOC_MIN_TOP_CHUNKS of the 10 best chunks
+        self.DOC_RELEVANCE_RATIO = float(os.getenv("DOC_RELEVANCE_RATIO", "0.5"))
+        self.DOC_MIN_TOP_CHUNKS = int(os.getenv("DOC_MIN_TOP_CHUNKS", "3"))
+        # Internal Knowledge answers (analysis + briefing PDF) by document hashes and query; 0 disables
+        self.ANALYSIS_CACHE_DIR = os.getenv("ANALYSIS_CACHE_DIR", ".cache/analysis")
+        self.ANALYSIS_CACHE_MAX_ENTRIES = int(os.getenv("ANALYSIS_CACHE_MAX_ENTRIES", "200"))
+        # Semantic chunk vectors: embedder ("hashing" works offline, "gemini" uses the API) and IVF above DOC_IVF_MIN_ROWS
+        self.DOC_VECTOR_DIR = os.getenv("DOC_VECTOR_DIR", ".cache/doc_vectors")
+        self.DOC_EMBEDDER = os.getenv("DOC_EMBEDDER", "hashing")
+        self.DOC_EMBEDDING_DIM = int(os.getenv("DOC_EMBEDDING_DIM", "512"))
+        self.DOC_IVF_MIN_ROWS = int(os.getenv("DOC_IVF_MIN_ROWS", "20000"))
+        self.DOC_IVF_NPROBE = int(os.getenv("DOC_IVF_NPROBE", "8"))
+        # Print full tool payloads to stdout (off by default)
+        self.DEBUG_TOOL_OUTPUT = os.getenv("DEBUG_TOOL_OUTPUT", "").lower() in ("1", "true", "yes")
+        # Local ClinicalTrials.gov study store (empty path disables it)
+        self.TRIALS_STORE_PATH = os.getenv("TRIALS_STORE_PATH", ".cache/clinical_trials.db")
+        self.TRIALS_STORE_TTL_HOURS = float(os.getenv("TRIALS_STORE_TTL_HOURS", "24"))
 
 settings = Settings()
\ No newline at end of file
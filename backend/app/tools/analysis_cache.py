@@ -0,0 +1,152 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Optional
+
+from app.config.settings import settings
+from app.utils.text_ranking import tokenize
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS analyses (
+    key TEXT PRIMARY KEY,
+    query TEXT,
+    model TEXT,
+    doc_hashes TEXT,
+    analysis TEXT,
+    briefing_args TEXT,
+    briefing_path TEXT,
+    created_at REAL,
+    last_used REAL,
+    hits INTEGER DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_analyses_last_used ON analyses(last_used);
+"""
+
+
+def normalize_query(query: str) -> str:
+    """Lowercase content words in order, so rephrasings like "Show me X?" and "x" share an entry."""
+    return " ".join(tokenize(query))
+
+
+class AnalysisCache:
+    """
+    Internal Knowledge results keyed on (content hashes of the documents the answer
+    was drawn from, normalized query, model): the analysis text, the briefing
+    arguments (summary/takeaways/table) and the rendered briefing PDF, which lives
+    in `directory` next to the SQLite index.
+
+    An entry is dropped when any of its documents' hashes leaves the catalog
+    (`invalidate`), and the least recently used entries are evicted past
+    `max_entries`.
+    """
+
+    def __init__(self, directory: str, max_entries: int = 200):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.path = os.path.join(directory, "analyses.db")
+        self.stats = {"hits": 0, "misses": 0, "stored": 0, "evicted": 0, "invalidated": 0}
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def key(doc_hashes: Iterable[str], query: str, model: str) -> str:
+        material = "\x00".join([",".join(sorted(set(doc_hashes))), normalize_query(query), model])
+        return hashlib.sha256(material.encode()).hexdigest()
+
+    def briefing_path(self, key: str) -> str:
+        """Where the briefing PDF for an entry is rendered."""
+        return os.path.join(self.directory, f"{key}.pdf")
+
+    def _delete(self, conn: sqlite3.Connection, keys: Iterable[str]) -> int:
+        keys = list(keys)
+        for key in keys:
+            try:
+                os.remove(self.briefing_path(key))
+            except FileNotFoundError:
+                pass
+        conn.executemany("DELETE FROM analyses WHERE key = ?", [(k,) for k in keys])
+        return len(keys)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock, self._connect() as conn:
+            row = conn.execute("SELECT * FROM analyses WHERE key = ?", (key,)).fetchone()
+            if row is None or not os.path.exists(row["briefing_path"]):
+                if row is not None:
+                    self._delete(conn, [key])
+                self.stats["misses"] += 1
+                return None
+            conn.execute("UPDATE analyses SET last_used = ?, hits = hits + 1 WHERE key = ?", (time.time(), key))
+            self.stats["hits"] += 1
+        return {
+            "analysis": row["analysis"],
+            "briefing_args": json.loads(row["briefing_args"]),
+            "pdf_path": row["briefing_path"],
+        }
+
+    def put(self, key: str, query: str, model: str, doc_hashes: Iterable[str], analysis: str,
+            briefing_args: Dict[str, Any]) -> None:
+        """Record an entry whose PDF has already been rendered to `briefing_path(key)`."""
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO analyses (key, query, model, doc_hashes, analysis, briefing_args, "
+                "briefing_path, created_at, last_used, hits) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 0)",
+                (key, normalize_query(query), model, json.dumps(sorted(set(doc_hashes))), analysis,
+                 json.dumps(briefing_args), self.briefing_path(key), now, now),
+            )
+            self.stats["stored"] += 1
+            overflow = conn.execute("SELECT count(*) FROM analyses").fetchone()[0] - self.max_entries
+            if overflow > 0:
+                oldest = [r["key"] for r in conn.execute(
+                    "SELECT key FROM analyses ORDER BY last_used LIMIT ?", (overflow,)
+                )]
+                self.stats["evicted"] += self._delete(conn, oldest)
+
+    def invalidate(self, current_hashes: Iterable[str]) -> int:
+        """Drop entries drawn from a document version that is no longer cataloged."""
+        current = set(current_hashes)
+        with self._lock, self._connect() as conn:
+            stale = [
+                r["key"] for r in conn.execute("SELECT key, doc_hashes FROM analyses")
+                if not set(json.loads(r["doc_hashes"])) <= current
+            ]
+            dropped = self._delete(conn, stale)
+            self.stats["invalidated"] += dropped
+        return dropped
+
+    def report(self) -> Dict[str, Any]:
+        with self._connect() as conn:
+            entries, hits = conn.execute("SELECT count(*), coalesce(sum(hits), 0) FROM analyses").fetchone()
+        return {"entries": entries, "max_entries": self.max_entries, "stored_hits": hits, **self.stats}
+
+
+_cache: Optional[AnalysisCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_analysis_cache() -> Optional[AnalysisCache]:
+    """Process-wide cache, or None when ANALYSIS_CACHE_MAX_ENTRIES is 0."""
+    global _cache
+    if settings.ANALYSIS_CACHE_MAX_ENTRIES <= 0:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = AnalysisCache(settings.ANALYSIS_CACHE_DIR, max_entries=settings.ANALYSIS_CACHE_MAX_ENTRIES)
+    return _cache
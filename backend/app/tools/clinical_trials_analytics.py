@@ -0,0 +1,161 @@
+import urllib.parse
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import pandas as pd
+
+CT_STUDY_URL = "https://clinicaltrials.gov/study/{nct_id}"
+CT_SEARCH_URL = "https://clinicaltrials.gov/search"
+
+PHASE_NUMBERS = {
+    "EARLY_PHASE1": "0",
+    "PHASE1": "1",
+    "PHASE2": "2",
+    "PHASE3": "3",
+    "PHASE4": "4",
+}
+
+
+def _search_url(**params: str) -> str:
+    query = urllib.parse.urlencode({k: v for k, v in params.items() if v}, quote_via=urllib.parse.quote)
+    return f"{CT_SEARCH_URL}?{query}"
+
+
+def _phase_param(phase: str) -> str:
+    """'PHASE2, PHASE3' -> '2,3'; phases without a search equivalent (NA, Not Specified) -> ''."""
+    nums = [PHASE_NUMBERS[p.strip()] for p in (phase or "").split(",") if p.strip() in PHASE_NUMBERS]
+    return ",".join(nums)
+
+
+def _none_if_nan(value: Any) -> Any:
+    return None if pd.isna(value) else value
+
+
+def studies_frame(studies: List[Dict[str, Any]]) -> pd.DataFrame:
+    """Normalize the compact study records from execute_fetch_clinical_trials into a typed frame."""
+    columns = [
+        "nct_id", "brief_title", "overall_status", "phase", "lead_sponsor_name", "sponsor_class",
+        "enrollment", "start_date", "completion_date", "study_type", "primary_outcome", "locations_count",
+    ]
+    df = pd.DataFrame(studies, columns=columns)
+    df = df.drop_duplicates(subset="nct_id", keep="first").reset_index(drop=True)
+    df["enrollment"] = pd.to_numeric(df["enrollment"], errors="coerce")
+    df["locations_count"] = pd.to_numeric(df["locations_count"], errors="coerce")
+    df["lead_sponsor_name"] = df["lead_sponsor_name"].fillna("").replace("", "Unknown")
+    df["sponsor_class"] = df["sponsor_class"].fillna("").replace("", "UNKNOWN")
+    df["phase"] = df["phase"].fillna("").replace("", "Not Specified")
+    return df
+
+
+def build_active_trials(df: pd.DataFrame, condition: str, total_found: int, max_trials: int = 10) -> Dict[str, Any]:
+    top = df.head(max_trials)
+    trials = [
+        {
+            "nct_id": row.nct_id,
+            "title": row.brief_title or "",
+            "sponsor": row.lead_sponsor_name,
+            "sponsor_class": row.sponsor_class,
+            "phase": row.phase,
+            "status": row.overall_status or "",
+            "enrollment": None if pd.isna(row.enrollment) else int(row.enrollment),
+            "start_date": _none_if_nan(row.start_date),
+            "completion_date": _none_if_nan(row.completion_date),
+            "study_type": _none_if_nan(row.study_type),
+            "locations_count": None if pd.isna(row.locations_count) else int(row.locations_count),
+            "primary_outcome": _none_if_nan(row.primary_outcome),
+            "trial_url": CT_STUDY_URL.format(nct_id=row.nct_id),
+            "sponsor_url": _search_url(lead=row.lead_sponsor_name),
+        }
+        for row in top.itertuples(index=False)
+    ]
+    return {
+        "total_found": int(total_found),
+        "condition_searched": condition,
+        "trials": trials,
+        "view_all_url": _search_url(cond=condition),
+    }
+
+
+def build_sponsor_profiles(df: pd.DataFrame, condition: str) -> Dict[str, Any]:
+    if df.empty:
+        return {"total_sponsors": 0, "sponsors": []}
+
+    stats = df.groupby("lead_sponsor_name", sort=False).agg(
+        number_of_trials=("nct_id", "size"),
+        sponsor_class=("sponsor_class", "first"),
+        avg_enrollment=("enrollment", "mean"),
+    )
+    phases = (
+        df.assign(single_phase=df["phase"].str.split(r",\s*"))
+        .explode("single_phase")
+        .groupby("lead_sponsor_name", sort=False)["single_phase"]
+        .unique()
+    )
+    stats = stats.join(phases).sort_values("number_of_trials", ascending=False, kind="stable")
+
+    sponsors = [
+        {
+            "sponsor_name": name,
+            "number_of_trials": int(row.number_of_trials),
+            "sponsor_class": row.sponsor_class,
+            "phases_involved": sorted(row.single_phase),
+            "avg_enrollment": None if pd.isna(row.avg_enrollment) else round(float(row.avg_enrollment), 1),
+            "sponsor_trials_url": _search_url(lead=name),
+            "sponsor_condition_url": _search_url(cond=condition, lead=name),
+        }
+        for name, row in stats.iterrows()
+    ]
+    return {"total_sponsors": len(sponsors), "sponsors": sponsors}
+
+
+def build_phase_distribution(df: pd.DataFrame, condition: str, top_n_sponsors: int = 5) -> Dict[str, Any]:
+    if df.empty:
+        return {"distributions": []}
+
+    total = len(df)
+    stats = df.groupby("phase").agg(
+        number_of_trials=("nct_id", "size"),
+        avg_enrollment=("enrollment", "mean"),
+    )
+    stats["percentage"] = (stats["number_of_trials"] / total * 100).round(1)
+
+    sponsor_counts = (
+        df.groupby(["phase", "lead_sponsor_name"]).size().rename("n").reset_index()
+        .sort_values(["phase", "n", "lead_sponsor_name"], ascending=[True, False, True])
+    )
+    top_sponsors = sponsor_counts.groupby("phase").head(top_n_sponsors).groupby("phase")["lead_sponsor_name"].agg(list)
+    stats = stats.join(top_sponsors.rename("top_sponsors")).sort_values("number_of_trials", ascending=False, kind="stable")
+
+    distributions = [
+        {
+            "phase": phase,
+            "number_of_trials": int(row.number_of_trials),
+            "percentage": float(row.percentage),
+            "avg_enrollment": None if pd.isna(row.avg_enrollment) else round(float(row.avg_enrollment), 1),
+            "top_sponsors": row.top_sponsors,
+            "phase_trials_url": _search_url(cond=condition, phase=_phase_param(phase)),
+        }
+        for phase, row in stats.iterrows()
+    ]
+    return {"distributions": distributions}
+
+
+def build_trials_report(
+    studies: List[Dict[str, Any]],
+    condition: str,
+    search_query: str,
+    total_found: Optional[int] = None,
+    max_trials: int = 10,
+) -> Dict[str, Any]:
+    """
+    Compute the full ClinicalTrialsReport payload (active trials, sponsor profiles,
+    phase distribution) directly from fetched study records. Numbers are exact; no LLM involved.
+    """
+    df = studies_frame(studies)
+    return {
+        "report_generated_at": datetime.now().isoformat(),
+        "search_query": search_query,
+        "active_trials": build_active_trials(df, condition, total_found if total_found is not None else len(df), max_trials),
+        "sponsor_profiles": build_sponsor_profiles(df, condition),
+        "phase_distribution": build_phase_distribution(df, condition),
+    }
@@ -0,0 +1,129 @@
+import os
+import re
+import threading
+import time
+from datetime import date
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import pandas as pd
+
+from app.config.settings import settings
+
+
+def _safe(value: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_.-]", "_", str(value))
+
+
+class ComtradeCache:
+    """
+    Parquet cache of cleaned Comtrade frames, one file per
+    hs=<code>/reporter=<code>/year=<yyyy>/partner=<code>_flow=<X|M>.parquet.
+
+    Annual figures for closed years are treated as final and never refetched once
+    cached. Partitions for the current and previous year, and empty partitions (a
+    country may report late), are revalidated after `revalidate_hours`.
+    """
+
+    def __init__(self, root: str, revalidate_hours: float = 24):
+        self.root = root
+        self.revalidate_seconds = revalidate_hours * 3600
+        self.stats = {"partition_hits": 0, "partition_misses": 0, "revalidated": 0, "requests": 0}
+        os.makedirs(root, exist_ok=True)
+
+    def partition_path(self, hs: str, reporter: str, year: int, partner: str, flow: str) -> str:
+        return os.path.join(
+            self.root, f"hs={_safe(hs)}", f"reporter={_safe(reporter)}", f"year={int(year)}",
+            f"partner={_safe(partner)}_flow={_safe(flow)}.parquet",
+        )
+
+    def _is_valid(self, path: str, year: int) -> bool:
+        if not os.path.exists(path):
+            return False
+        closed_year = year < date.today().year - 1
+        if closed_year and not self._is_empty(path):
+            return True
+        return time.time() - os.path.getmtime(path) < self.revalidate_seconds
+
+    @staticmethod
+    def _is_empty(path: str) -> bool:
+        import pyarrow.parquet as pq
+
+        return pq.ParquetFile(path).metadata.num_rows == 0
+
+    def missing_years(self, hs: str, reporter: str, partner: str, flow: str, years: Iterable[int]) -> List[int]:
+        return [y for y in years if not self._is_valid(self.partition_path(hs, reporter, y, partner, flow), y)]
+
+    def read(self, hs: str, reporter: str, partner: str, flow: str,
+             years: Iterable[int]) -> Tuple[List[pd.DataFrame], List[int]]:
+        """Cached frames for the valid year partitions, and the years that must be fetched."""
+        frames, missing = [], []
+        for year in years:
+            path = self.partition_path(hs, reporter, year, partner, flow)
+            if self._is_valid(path, year):
+                frames.append(pd.read_parquet(path))
+                self.stats["partition_hits"] += 1
+            else:
+                if os.path.exists(path):
+                    self.stats["revalidated"] += 1
+                missing.append(year)
+                self.stats["partition_misses"] += 1
+        return frames, missing
+
+    def write(self, hs: str, reporter: str, partner: str, flow: str,
+              years: Iterable[int], df: pd.DataFrame) -> None:
+        """Store `df` split by year; requested years without rows are stored as empty partitions."""
+        if not df.empty and "year" not in df.columns:
+            return
+        if df.empty:
+            empty = pd.DataFrame({"year": pd.Series(dtype=pd.Int64Dtype()), "trade_value": pd.Series(dtype=float)})
+            by_year = {}
+        else:
+            empty = df.iloc[0:0]
+            by_year = {int(y): part for y, part in df.groupby("year")}
+        for year in years:
+            path = self.partition_path(hs, reporter, year, partner, flow)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            by_year.get(int(year), empty).to_parquet(tmp, index=False)
+            os.replace(tmp, path)
+
+    def fetch(self, hs: str, reporter: str, partner: str, flow: str, years: List[int],
+              loader: Callable[[List[int]], pd.DataFrame]) -> pd.DataFrame:
+        """
+        Frame for `years`: cached partitions plus one `loader(missing_years)` call for the
+        missing or stale ones, whose result is written back.
+        """
+        frames, missing = self.read(hs, reporter, partner, flow, years)
+        if missing:
+            fresh = loader(missing)
+            self.stats["requests"] += 1
+            self.write(hs, reporter, partner, flow, missing, fresh)
+            frames.append(fresh)
+        frames = [f for f in frames if not f.empty]
+        if not frames:
+            return pd.DataFrame()
+        return pd.concat(frames, ignore_index=True).sort_values("year", kind="stable").reset_index(drop=True)
+
+    def report(self) -> Dict[str, Any]:
+        files, size = 0, 0
+        for dirpath, _, names in os.walk(self.root):
+            for name in names:
+                if name.endswith(".parquet"):
+                    files += 1
+                    size += os.path.getsize(os.path.join(dirpath, name))
+        return {"root": self.root, "partitions": files, "bytes": size, **self.stats}
+
+
+_cache: Optional[ComtradeCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_comtrade_cache() -> Optional[ComtradeCache]:
+    """Process-wide cache, or None when COMTRADE_CACHE_DIR is empty."""
+    global _cache
+    if not settings.COMTRADE_CACHE_DIR:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = ComtradeCache(settings.COMTRADE_CACHE_DIR, settings.COMTRADE_CACHE_REVALIDATE_HOURS)
+    return _cache
@@ -0,0 +1,303 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, List, Optional
+
+from app.config.settings import settings
+
+DOC_EXTENSIONS = {".pdf", ".txt", ".md"}
+HASH_BLOCK_BYTES = 1 << 20
+SCAN_HISTORY = 1000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS catalog (
+    file_name TEXT PRIMARY KEY,
+    path TEXT,
+    size INTEGER,
+    mtime REAL,
+    sha256 TEXT,
+    pages INTEGER,
+    title TEXT,
+    status TEXT,
+    error TEXT,
+    scanned_at REAL
+);
+CREATE TABLE IF NOT EXISTS page_text (
+    sha256 TEXT NOT NULL,
+    page INTEGER NOT NULL,
+    text TEXT,
+    PRIMARY KEY (sha256, page)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS scans (
+    id INTEGER PRIMARY KEY,
+    finished_at REAL,
+    new INTEGER,
+    changed INTEGER,
+    removed INTEGER,
+    failed INTEGER
+);
+"""
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_BYTES), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def extract_pages(path: str) -> List[str]:
+    """Text of each page (PDF) or the whole file as one page (.txt/.md)."""
+    if path.lower().endswith(".pdf"):
+        from pypdf import PdfReader
+
+        return [page.extract_text() or "" for page in PdfReader(path).pages]
+    with open(path, encoding="utf-8", errors="replace") as f:
+        return [f.read()]
+
+
+def document_title(path: str, pages: List[str]) -> str:
+    """PDF metadata title, else the first non-empty line of the document."""
+    if path.lower().endswith(".pdf"):
+        try:
+            from pypdf import PdfReader
+
+            title = (PdfReader(path).metadata or {}).get("/Title")
+            if title and str(title).strip():
+                return str(title).strip()
+        except Exception:
+            pass
+    for page in pages:
+        for line in page.splitlines():
+            if line.strip():
+                return line.strip()[:200]
+    return os.path.basename(path)
+
+
+class DocumentCatalog:
+    """
+    Persistent record of the internal documents in `data_dir`: path, size, mtime,
+    SHA-256, page count, title and extraction status, with the extracted page text
+    stored by content hash.
+
+    `scan()` is incremental. Files whose size and mtime are unchanged are skipped
+    without reading them; files that were only touched (same hash) keep their
+    extraction. Indexes built from the catalog key on `sha256`, so they stay valid
+    until a file's contents actually change.
+    """
+
+    def __init__(self, data_dir: str, path: str):
+        self.data_dir = data_dir
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _files(self) -> Dict[str, os.stat_result]:
+        from app.tools.internal_doc_tool import BRIEFING_FILE_NAME
+
+        if not os.path.isdir(self.data_dir):
+            return {}
+        files = {}
+        with os.scandir(self.data_dir) as entries:
+            for entry in entries:
+                if entry.name == BRIEFING_FILE_NAME:
+                    # Briefing left by older versions in data/: the agent's own output, not a source
+                    continue
+                if entry.is_file() and os.path.splitext(entry.name)[1].lower() in DOC_EXTENSIONS:
+                    files[entry.name] = entry.stat()
+        return files
+
+    def _process(self, file_name: str, stat: os.stat_result, known: Optional[sqlite3.Row]) -> str:
+        """Hash and (if the contents changed) extract one file; returns new/changed/touched/failed."""
+        full = os.path.join(self.data_dir, file_name)
+        sha256 = file_sha256(full)
+        row = {"file_name": file_name, "path": full, "size": stat.st_size, "mtime": stat.st_mtime,
+               "sha256": sha256, "scanned_at": time.time()}
+        if known is not None and known["sha256"] == sha256 and known["status"] == "extracted":
+            with self._lock, self._connect() as conn:
+                conn.execute("UPDATE catalog SET size = :size, mtime = :mtime, path = :path, "
+                             "scanned_at = :scanned_at WHERE file_name = :file_name", row)
+            return "touched"
+
+        try:
+            pages = extract_pages(full)
+            row.update(pages=len(pages), title=document_title(full, pages), status="extracted", error=None)
+        except Exception as e:
+            pages = []
+            row.update(pages=None, title=None, status="failed", error=str(e)[:500])
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM page_text WHERE sha256 = ?", (sha256,))
+            conn.executemany("INSERT INTO page_text (sha256, page, text) VALUES (?, ?, ?)",
+                             [(sha256, n, text) for n, text in enumerate(pages, start=1)])
+            conn.execute(
+                "INSERT OR REPLACE INTO catalog (file_name, path, size, mtime, sha256, pages, title, status, error, "
+                "scanned_at) VALUES (:file_name, :path, :size, :mtime, :sha256, :pages, :title, :status, :error, "
+                ":scanned_at)", row,
+            )
+            self._drop_orphan_text(conn)
+        if row["status"] == "failed":
+            print(f"Could not extract {file_name}: {row['error']}")
+            return "failed"
+        return "new" if known is None else "changed"
+
+    @staticmethod
+    def _drop_orphan_text(conn: sqlite3.Connection) -> None:
+        conn.execute("DELETE FROM page_text WHERE sha256 NOT IN (SELECT sha256 FROM catalog)")
+
+    def scan(self) -> Dict[str, Any]:
+        """Catalog new and changed files, drop deleted ones."""
+        started = time.monotonic()
+        files = self._files()
+        with self._connect() as conn:
+            known = {r["file_name"]: r for r in conn.execute("SELECT * FROM catalog")}
+        counts = {"new": 0, "changed": 0, "touched": 0, "failed": 0}
+        for name, stat in files.items():
+            previous = known.get(name)
+            if previous is not None and (previous["size"], previous["mtime"]) == (stat.st_size, stat.st_mtime):
+                # Unchanged since the last scan; a failed extraction is retried once the file changes
+                continue
+            try:
+                counts[self._process(name, stat, previous)] += 1
+            except OSError as e:
+                print(f"Could not read {name}: {e}")
+                counts["failed"] += 1
+        removed = [n for n in known if n not in files]
+        with self._lock, self._connect() as conn:
+            if removed:
+                conn.executemany("DELETE FROM catalog WHERE file_name = ?", [(n,) for n in removed])
+                self._drop_orphan_text(conn)
+            conn.execute(
+                "INSERT INTO scans (finished_at, new, changed, removed, failed) VALUES (?, ?, ?, ?, ?)",
+                (time.time(), counts["new"], counts["changed"], len(removed), counts["failed"]),
+            )
+            conn.execute("DELETE FROM scans WHERE id <= (SELECT max(id) FROM scans) - ?", (SCAN_HISTORY,))
+        return {**counts, "removed": len(removed), "documents": len(files),
+                "seconds": round(time.monotonic() - started, 2)}
+
+    # Reads
+
+    def documents(self, status: Optional[str] = None) -> List[Dict[str, Any]]:
+        query, params = "SELECT * FROM catalog", ()
+        if status:
+            query, params = query + " WHERE status = ?", (status,)
+        with self._connect() as conn:
+            return [dict(r) for r in conn.execute(query + " ORDER BY file_name", params)]
+
+    def hashes(self, file_names: Iterable[str]) -> Dict[str, str]:
+        """Current SHA-256 of each of `file_names` that is cataloged."""
+        wanted = set(file_names)
+        return {d["file_name"]: d["sha256"] for d in self.documents() if d["file_name"] in wanted}
+
+    def pages(self, sha256: str) -> List[str]:
+        with self._connect() as conn:
+            return [r["text"] for r in conn.execute(
+                "SELECT text FROM page_text WHERE sha256 = ? ORDER BY page", (sha256,)
+            )]
+
+    def last_scan(self) -> Optional[float]:
+        with self._connect() as conn:
+            return conn.execute("SELECT max(finished_at) FROM scans").fetchone()[0]
+
+    def report(self) -> Dict[str, Any]:
+        with self._connect() as conn:
+            by_status = dict(conn.execute("SELECT status, count(*) FROM catalog GROUP BY status").fetchall())
+            last = conn.execute("SELECT * FROM scans ORDER BY id DESC LIMIT 1").fetchone()
+        return {"documents": sum(by_status.values()), "by_status": by_status,
+                "last_scan": dict(last) if last else None, "path": self.path}
+
+
+_catalog: Optional[DocumentCatalog] = None
+_catalog_lock = threading.Lock()
+_refresh_lock = threading.Lock()
+
+
+def get_document_catalog() -> DocumentCatalog:
+    global _catalog
+    with _catalog_lock:
+        if _catalog is None:
+            from app.tools.internal_doc_tool import DATA_FOLDER
+
+            _catalog = DocumentCatalog(DATA_FOLDER, settings.DOC_CATALOG_PATH)
+    return _catalog
+
+
+def refresh_documents(max_age_seconds: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Scan the catalog and bring the chunk and vector indexes up to date. With
+    `max_age_seconds`, does nothing if a scan finished more recently than that.
+    """
+    from app.tools.analysis_cache import get_analysis_cache
+    from app.tools.doc_index import get_document_index
+    from app.tools.vector_index import get_vector_index
+
+    catalog = get_document_catalog()
+    with _refresh_lock:
+        last = catalog.last_scan()
+        if max_age_seconds is not None and last is not None and time.time() - last < max_age_seconds:
+            return {"skipped": True}
+        scanned = catalog.scan()
+        indexed = get_document_index().ingest(catalog)
+        vectors = get_vector_index().sync(get_document_index())
+        cache = get_analysis_cache()
+        if cache is not None and scanned["new"] + scanned["changed"] + scanned["removed"]:
+            cache.invalidate(d["sha256"] for d in catalog.documents())
+    return {"catalog": scanned, "index": indexed, "vectors": vectors}
+
+
+def start_catalog_scanner(interval_seconds: float) -> threading.Thread:
+    """Background thread: a scan at startup, then one every `interval_seconds` (0 = startup only)."""
+
+    def loop():
+        while True:
+            try:
+                result = refresh_documents()
+                changed = result["catalog"]["new"] + result["catalog"]["changed"] + result["catalog"]["removed"]
+                if changed:
+                    print(f"Document catalog updated: {result['catalog']}")
+            except Exception as e:
+                print(f"Document scan failed: {e}")
+            if interval_seconds <= 0:
+                return
+            time.sleep(interval_seconds)
+
+    thread = threading.Thread(target=loop, name="doc-catalog-scanner", daemon=True)
+    thread.start()
+    return thread
+
+
+def main():
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Catalog and index the internal documents in app/data")
+    parser.add_argument("command", choices=["scan", "list", "status"])
+    args = parser.parse_args()
+    catalog = get_document_catalog()
+    if args.command == "scan":
+        print(json.dumps(refresh_documents(), indent=2))
+    elif args.command == "list":
+        for doc in catalog.documents():
+            print(f"{doc['status']:9}  {doc['sha256'][:12]}  {doc['pages'] or '-':>4}p  {doc['file_name']}  {doc['title'] or ''}")
+    else:
+        print(json.dumps(catalog.report(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
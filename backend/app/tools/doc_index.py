@@ -0,0 +1,259 @@
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from app.config.settings import settings
+from app.utils.text_ranking import estimate_tokens, split_passages, tokenize
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    file_name TEXT PRIMARY KEY,
+    sha256 TEXT,
+    pages INTEGER,
+    chunks INTEGER,
+    indexed_at REAL
+);
+CREATE TABLE IF NOT EXISTS chunks (
+    id INTEGER PRIMARY KEY,
+    file_name TEXT NOT NULL,
+    page INTEGER,
+    chunk_no INTEGER,
+    text TEXT,
+    length INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_chunks_file ON chunks(file_name);
+CREATE TABLE IF NOT EXISTS postings (
+    term TEXT NOT NULL,
+    chunk_id INTEGER NOT NULL,
+    tf INTEGER,
+    PRIMARY KEY (term, chunk_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_postings_chunk ON postings(chunk_id);
+"""
+
+
+def chunk_pages(pages: List[str], max_words: int) -> List[Tuple[int, int, str]]:
+    """(page number from 1, chunk number within the page, text) for every chunk."""
+    chunks = []
+    for page_no, text in enumerate(pages, start=1):
+        for chunk_no, passage in enumerate(split_passages(" ".join(text.split()), max_words=max_words)):
+            chunks.append((page_no, chunk_no, passage))
+    return chunks
+
+
+class DocumentIndex:
+    """
+    Page-level chunks of the cataloged internal documents, persisted in SQLite
+    together with a BM25 inverted index (postings table), so a query reads only the
+    postings of its own terms instead of re-reading any document.
+
+    `ingest(catalog)` is incremental: a file is re-chunked only when its catalog
+    SHA-256 differs from the one it was indexed at, and files that left the catalog
+    are dropped.
+    """
+
+    def __init__(self, path: str, chunk_words: int = 200):
+        self.path = path
+        self.chunk_words = chunk_words
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as conn:
+            columns = {r["name"] for r in conn.execute("PRAGMA table_info(documents)")}
+            if columns and "sha256" not in columns:
+                # Index built before documents were keyed by content hash; it is derived data, rebuild it
+                conn.executescript("DROP TABLE documents; DROP TABLE chunks; DROP TABLE postings;")
+            conn.executescript(SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    # Ingestion
+
+    def _delete(self, conn: sqlite3.Connection, file_name: str) -> None:
+        conn.execute(
+            "DELETE FROM postings WHERE chunk_id IN (SELECT id FROM chunks WHERE file_name = ?)", (file_name,)
+        )
+        conn.execute("DELETE FROM chunks WHERE file_name = ?", (file_name,))
+        conn.execute("DELETE FROM documents WHERE file_name = ?", (file_name,))
+
+    def ingest_file(self, file_name: str, sha256: str, pages: List[str]) -> int:
+        """(Re)index one file from its extracted pages; returns its chunk count."""
+        chunks = chunk_pages(pages, self.chunk_words)
+        with self._lock, self._connect() as conn:
+            self._delete(conn, file_name)
+            for page, chunk_no, text in chunks:
+                tf = Counter(tokenize(text))
+                chunk_id = conn.execute(
+                    "INSERT INTO chunks (file_name, page, chunk_no, text, length) VALUES (?, ?, ?, ?, ?)",
+                    (file_name, page, chunk_no, text, sum(tf.values())),
+                ).lastrowid
+                conn.executemany(
+                    "INSERT INTO postings (term, chunk_id, tf) VALUES (?, ?, ?)",
+                    [(term, chunk_id, n) for term, n in tf.items()],
+                )
+            conn.execute(
+                "INSERT INTO documents (file_name, sha256, pages, chunks, indexed_at) VALUES (?, ?, ?, ?, ?)",
+                (file_name, sha256, len(pages), len(chunks), time.time()),
+            )
+        return len(chunks)
+
+    def ingest(self, catalog) -> Dict[str, Any]:
+        """Index new and changed files of a DocumentCatalog, drop the ones no longer in it."""
+        started = time.monotonic()
+        files = {d["file_name"]: d["sha256"] for d in catalog.documents(status="extracted")}
+        with self._connect() as conn:
+            known = {r["file_name"]: r["sha256"] for r in conn.execute("SELECT file_name, sha256 FROM documents")}
+        changed = [n for n, sha256 in files.items() if known.get(n) != sha256]
+        removed = [n for n in known if n not in files]
+        if removed:
+            with self._lock, self._connect() as conn:
+                for name in removed:
+                    self._delete(conn, name)
+        failed = []
+        for name in changed:
+            try:
+                chunks = self.ingest_file(name, files[name], catalog.pages(files[name]))
+                print(f"Indexed {name}: {chunks} chunks")
+            except Exception as e:
+                print(f"Could not index {name}: {e}")
+                failed.append(name)
+        return {
+            "documents": len(files),
+            "indexed": len(changed) - len(failed),
+            "removed": len(removed),
+            "failed": failed,
+            "seconds": round(time.monotonic() - started, 2),
+        }
+
+    # Retrieval
+
+    def search(self, query: str, token_budget: int = 6000, files: Optional[Iterable[str]] = None,
+               max_chunks: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Best-scoring chunks across all documents (or only `files`) by BM25, in score
+        order, as many as fit in `token_budget`.
+        """
+        terms = sorted(set(tokenize(query)))
+        if not terms:
+            return []
+        marks = ", ".join("?" * len(terms))
+        file_filter, file_params = "", []
+        if files is not None:
+            files = list(files)
+            if not files:
+                return []
+            file_filter = f" AND c.file_name IN ({', '.join('?' * len(files))})"
+            file_params = files
+
+        with self._connect() as conn:
+            n, total = conn.execute("SELECT count(*), coalesce(sum(length), 0) FROM chunks").fetchone()
+            if n == 0:
+                return []
+            avgdl = total / n or 1.0
+            df = dict(conn.execute(
+                f"SELECT term, count(*) FROM postings WHERE term IN ({marks}) GROUP BY term", terms
+            ).fetchall())
+            scores: Dict[int, float] = defaultdict(float)
+            for row in conn.execute(
+                f"SELECT p.term, p.chunk_id, p.tf, c.length FROM postings p JOIN chunks c ON c.id = p.chunk_id "
+                f"WHERE p.term IN ({marks}){file_filter}", terms + file_params
+            ):
+                idf = math.log(1 + (n - df[row["term"]] + 0.5) / (df[row["term"]] + 0.5))
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * row["length"] / avgdl)
+                scores[row["chunk_id"]] += idf * row["tf"] * (BM25_K1 + 1) / (row["tf"] + norm)
+
+            ranked = sorted(scores.items(), key=lambda kv: kv[1], reverse=True)
+            selected, used = [], 0
+            for chunk_id, score in ranked:
+                row = conn.execute("SELECT file_name, page, chunk_no, text FROM chunks WHERE id = ?", (chunk_id,)).fetchone()
+                cost = estimate_tokens(row["text"])
+                if used + cost > token_budget:
+                    continue
+                used += cost
+                selected.append({**dict(row), "chunk_id": chunk_id, "score": round(score, 4)})
+                if (max_chunks and len(selected) >= max_chunks) or token_budget - used < 20:
+                    break
+        return selected
+
+    def file_chunks(self, file_name: str) -> List[Dict[str, Any]]:
+        with self._connect() as conn:
+            return [dict(r) for r in conn.execute(
+                "SELECT id AS chunk_id, page, chunk_no, text FROM chunks WHERE file_name = ? ORDER BY id", (file_name,)
+            )]
+
+    def chunks_by_id(self, chunk_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+        if not chunk_ids:
+            return {}
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT id AS chunk_id, file_name, page, chunk_no, text FROM chunks "
+                f"WHERE id IN ({', '.join('?' * len(chunk_ids))})", chunk_ids
+            )
+            return {r["chunk_id"]: dict(r) for r in rows}
+
+    def documents(self) -> List[Dict[str, Any]]:
+        with self._connect() as conn:
+            return [dict(r) for r in conn.execute("SELECT * FROM documents ORDER BY file_name")]
+
+    def report(self) -> Dict[str, Any]:
+        with self._connect() as conn:
+            docs, chunks = conn.execute("SELECT count(*), coalesce(sum(chunks), 0) FROM documents").fetchone()
+            terms = conn.execute("SELECT count(DISTINCT term) FROM postings").fetchone()[0]
+        return {"documents": docs, "chunks": chunks, "terms": terms, "path": self.path}
+
+
+def format_chunks(chunks: List[Dict[str, Any]]) -> str:
+    """Chunks as prompt context, each labelled with its file and page for citations."""
+    return "\n\n".join(f"[{c['file_name']} p.{c['page']}]\n{c['text']}" for c in chunks)
+
+
+_index: Optional[DocumentIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_document_index() -> DocumentIndex:
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = DocumentIndex(settings.DOC_INDEX_PATH, chunk_words=settings.DOC_CHUNK_WORDS)
+    return _index
+
+
+def main():
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Index the internal documents in app/data")
+    parser.add_argument("command", choices=["ingest", "search", "status"])
+    parser.add_argument("query", nargs="?", default="")
+    args = parser.parse_args()
+    index = get_document_index()
+    if args.command == "ingest":
+        from app.tools.doc_catalog import refresh_documents
+
+        print(json.dumps(refresh_documents(), indent=2))
+    elif args.command == "search":
+        for chunk in index.search(args.query, token_budget=2000):
+            print(f"{chunk['score']:8.3f}  {chunk['file_name']} p.{chunk['page']}: {chunk['text'][:120]}")
+    else:
+        print(json.dumps(index.report(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
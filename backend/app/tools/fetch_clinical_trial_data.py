@@ -1,110 +1,282 @@
 import requests
+import httpx
 import json
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional, Iterator, AsyncIterator, Tuple
+from app.config.settings import settings
+from app.tools.trial_store import get_trial_store
+from app.utils.tool_encoding import encode_payload
 
-def execute_fetch_clinical_trials(args: Dict[str, Any]) -> str:
-    """
-    Execute the fetch_clinical_trials tool by calling the ClinicalTrials.gov API v2.
-    Returns a JSON string with enhanced study data including enrollment, dates, locations.
-    """
-    url = "https://clinicaltrials.gov/api/v2/studies" #ClinicalTrials.gov 
+CT_API_URL = "https://clinicaltrials.gov/api/v2/studies" #ClinicalTrials.gov
+MAX_PAGE_SIZE = 1000
+DEFAULT_MAX_STUDIES = 10
+# Incremental refreshes that changed more studies than this refetch the query instead
+MAX_UPDATE_STUDIES = 5000
+
+# Field projection: only the pieces compact_study() reads are requested from the API
+STUDY_FIELDS = [
+    "NCTId",
+    "BriefTitle",
+    "OverallStatus",
+    "Phase",
+    "LeadSponsorName",
+    "LeadSponsorClass",
+    "Condition",
+    "InterventionName",
+    "EnrollmentCount",
+    "StartDate",
+    "CompletionDate",
+    "PrimaryCompletionDate",
+    "StudyType",
+    "PrimaryOutcomeMeasure",
+    "LocationCountry",
+    "LastUpdatePostDate",
+]
+
+
+def build_study_params(args: Dict[str, Any], page_size: int, page_token: Optional[str] = None) -> Dict[str, Any]:
+    """Query parameters for one page of the v2 /studies endpoint."""
     params = {
         "query.cond": args.get("condition"),
-        "filter.overallStatus": args.get("status", "RECRUITING"),
-        "pageSize": 5,
+        "pageSize": max(1, min(page_size, MAX_PAGE_SIZE)),
+        "fields": ",".join(STUDY_FIELDS),
         "format": "json",
         "countTotal": "true"
     }
-    
+    # An explicit status of None means no status filter (incremental refreshes)
+    status = args.get("status", "RECRUITING")
+    if status:
+        params["filter.overallStatus"] = status
+
+    advanced = []
     if args.get("phase"):
         phase = args["phase"].replace("_", "")
-        params["filter.phase"] = phase
+        advanced.append(f"AREA[Phase]{phase}")
+    if args.get("updated_since"):
+        # Incremental refresh: only studies posted/updated on or after this date
+        advanced.append(f"AREA[LastUpdatePostDate]RANGE[{args['updated_since']},MAX]")
+    if advanced:
+        params["filter.advanced"] = " AND ".join(advanced)
+
+    if page_token:
+        params["pageToken"] = page_token
+        # totalCount is only needed once
+        params.pop("countTotal")
+    return params
+
+
+def compact_study(study: Dict[str, Any]) -> Dict[str, Any]:
+    """Reduce one (projected) v2 study record to the flat per-study dict used by the agents."""
+    protocol = study.get("protocolSection", {})
+    identification = protocol.get("identificationModule", {})
+    status_module = protocol.get("statusModule", {})
+    design = protocol.get("designModule", {})
+    conditions_module = protocol.get("conditionsModule", {})
+    arms_module = protocol.get("armsInterventionsModule", {})
+    sponsor_collab = protocol.get("sponsorCollaboratorsModule", {})
+    outcomes_module = protocol.get("outcomesModule", {})
+    contacts_locations = protocol.get("contactsLocationsModule", {})
+
+    lead_sponsor = sponsor_collab.get("leadSponsor", {})
+    phases_list = design.get("phases", [])
+    phase_str = ", ".join(phases_list) if phases_list else "Not Specified"
+
+    conditions_list = conditions_module.get("conditions", [])
+    conditions_str = ", ".join(conditions_list) if conditions_list else "Not Specified"
+
+    interventions_list = arms_module.get("interventions", [])
+    interventions_str = ", ".join([i.get("name", "") for i in interventions_list]) if interventions_list else "Not Specified"
+
+    # Extract enrollment
+    enrollment = design.get("enrollmentInfo", {}).get("count")
 
+    # Extract dates
+    start_date_struct = status_module.get("startDateStruct", {})
+    start_date = start_date_struct.get("date", "Not Available")
+
+    completion_date_struct = status_module.get("completionDateStruct", {}) or status_module.get("primaryCompletionDateStruct", {})
+    completion_date = completion_date_struct.get("date", "Not Available")
+
+    # Extract study type
+    study_type = design.get("studyType", "Not Specified")
+
+    # Extract primary outcome
+    primary_outcomes = outcomes_module.get("primaryOutcomes", [])
+    primary_outcome = primary_outcomes[0].get("measure", "Not Specified") if primary_outcomes else "Not Specified"
+
+    # Count locations
+    locations = contacts_locations.get("locations", [])
+    locations_count = len(locations)
+
+    return {
+        "nct_id": identification.get("nctId", ""),
+        "brief_title": identification.get("briefTitle", ""),
+        "overall_status": status_module.get("overallStatus", ""),
+        "phase": phase_str,
+        "lead_sponsor_name": lead_sponsor.get("name", ""),
+        "sponsor_class": lead_sponsor.get("class", ""),
+        "conditions": conditions_str,
+        "interventions": interventions_str,
+        "enrollment": enrollment,
+        "start_date": start_date,
+        "completion_date": completion_date,
+        "study_type": study_type,
+        "primary_outcome": primary_outcome,
+        "locations_count": locations_count,
+        "last_update_date": status_module.get("lastUpdatePostDateStruct", {}).get("date")
+    }
+
+
+def _parse_page(data: Dict[str, Any], remaining: int) -> Dict[str, Any]:
+    studies = data.get("studies", [])[:remaining]
+    return {
+        "studies": [compact_study(s) for s in studies],
+        "total_count": data.get("totalCount"),
+        "next_page_token": data.get("nextPageToken")
+    }
+
+
+async def aiter_clinical_trials(
+    args: Dict[str, Any],
+    max_studies: int = DEFAULT_MAX_STUDIES,
+    client: Optional[httpx.AsyncClient] = None,
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Async generator over ClinicalTrials.gov v2 result pages, following nextPageToken
+    until `max_studies` compact records have been produced or the results run out.
+
+    Each yielded page is {"studies": [...compact records...], "total_count", "next_page_token"};
+    total_count is only present on the first page. Only one page is held in memory at a time.
+    """
+    own_client = client is None
+    client = client or httpx.AsyncClient(timeout=30)
     try:
-        response = requests.get(url, params=params, timeout=30)
-        response.raise_for_status()
-    except requests.exceptions.RequestException as e:
-        return json.dumps({"error": f"API request failed: {str(e)}"})
+        remaining = max_studies
+        page_token = None
+        while remaining > 0:
+            params = build_study_params(args, remaining, page_token)
+            response = await client.get(CT_API_URL, params=params)
+            response.raise_for_status()
+            page = _parse_page(response.json(), remaining)
+            remaining -= len(page["studies"])
+            yield page
+            page_token = page["next_page_token"]
+            if not page_token or not page["studies"]:
+                break
+    finally:
+        if own_client:
+            await client.aclose()
 
+
+def iter_clinical_trials(args: Dict[str, Any], max_studies: int = DEFAULT_MAX_STUDIES) -> Iterator[Dict[str, Any]]:
+    """
+    Blocking counterpart of aiter_clinical_trials, yielding the same pages. The agent
+    tool loop runs tools in worker threads, so fetch_clinical_trials pages with this one.
+    """
+    remaining = max_studies
+    page_token = None
+    with requests.Session() as session:
+        while remaining > 0:
+            params = build_study_params(args, remaining, page_token)
+            response = session.get(CT_API_URL, params=params, timeout=30)
+            response.raise_for_status()
+            page = _parse_page(response.json(), remaining)
+            remaining -= len(page["studies"])
+            yield page
+            page_token = page["next_page_token"]
+            if not page_token or not page["studies"]:
+                break
+
+
+def _fetch_live(args: Dict[str, Any], max_studies: int) -> Tuple[List[Dict[str, Any]], int]:
+    """All pages up to max_studies. A failure after the first page keeps what was fetched."""
+    studies: List[Dict[str, Any]] = []
+    total = 0
     try:
-        data = response.json()
-    except json.JSONDecodeError:
-        return json.dumps({"error": "Failed to parse API response"})
-
-    studies = data.get("studies", [])
-    total = data.get("totalCount", 0)
-
-    # Enhanced data extraction with more details
-    enhanced_studies = []
-    for study in studies:
-        protocol = study.get("protocolSection", {})
-        identification = protocol.get("identificationModule", {})
-        status_module = protocol.get("statusModule", {})
-        design = protocol.get("designModule", {})
-        conditions_module = protocol.get("conditionsModule", {})
-        arms_module = protocol.get("armsInterventionsModule", {})
-        sponsor_collab = protocol.get("sponsorCollaboratorsModule", {})
-        outcomes_module = protocol.get("outcomesModule", {})
-        eligibility_module = protocol.get("eligibilityModule", {})
-        contacts_locations = protocol.get("contactsLocationsModule", {})
-        
-        lead_sponsor = sponsor_collab.get("leadSponsor", {})
-        phases_list = design.get("phases", [])
-        phase_str = ", ".join(phases_list) if phases_list else "Not Specified"
-        
-        conditions_list = conditions_module.get("conditions", [])
-        conditions_str = ", ".join(conditions_list) if conditions_list else "Not Specified"
-        
-        interventions_list = arms_module.get("interventions", [])
-        interventions_str = ", ".join([i.get("name", "") for i in interventions_list]) if interventions_list else "Not Specified"
-        
-        # Extract enrollment
-        enrollment = design.get("enrollmentInfo", {}).get("count")
-        
-        # Extract dates
-        start_date_struct = status_module.get("startDateStruct", {})
-        start_date = start_date_struct.get("date", "Not Available")
-        
-        completion_date_struct = status_module.get("completionDateStruct", {}) or status_module.get("primaryCompletionDateStruct", {})
-        completion_date = completion_date_struct.get("date", "Not Available")
-        
-        # Extract study type
-        study_type = design.get("studyType", "Not Specified")
-        
-        # Extract primary outcome
-        primary_outcomes = outcomes_module.get("primaryOutcomes", [])
-        primary_outcome = primary_outcomes[0].get("measure", "Not Specified") if primary_outcomes else "Not Specified"
-        
-        # Count locations
-        locations = contacts_locations.get("locations", [])
-        locations_count = len(locations)
-
-        enhanced = {
-            "nct_id": identification.get("nctId", ""),
-            "brief_title": identification.get("briefTitle", ""),
-            "overall_status": status_module.get("overallStatus", ""),
-            "phase": phase_str,
-            "lead_sponsor_name": lead_sponsor.get("name", ""),
-            "sponsor_class": lead_sponsor.get("class", ""),
-            "conditions": conditions_str,
-            "interventions": interventions_str,
-            "enrollment": enrollment,
-            "start_date": start_date,
-            "completion_date": completion_date,
-            "study_type": study_type,
-            "primary_outcome": primary_outcome,
-            "locations_count": locations_count
-        }
-        enhanced_studies.append(enhanced)
-    print(json.dumps({
-        "total_studies": total,
-        "fetched_count": len(enhanced_studies),
-        "search_condition": args.get("condition"),
-        "studies": enhanced_studies
-    }, indent=2))
-    return json.dumps({
+        for page in iter_clinical_trials(args, max_studies):
+            if page["total_count"] is not None:
+                total = page["total_count"]
+            studies.extend(page["studies"])
+    except (requests.exceptions.RequestException, json.JSONDecodeError) as e:
+        if not studies:
+            raise
+        print(f"ClinicalTrials.gov pagination stopped early: {str(e)}")
+    return studies, total
+
+
+def _tool_payload(args: Dict[str, Any], total: int, studies: List[Dict[str, Any]], source: str) -> Dict[str, Any]:
+    return {
         "total_studies": total,
-        "fetched_count": len(enhanced_studies),
+        "fetched_count": len(studies),
         "search_condition": args.get("condition"),
-        "studies": enhanced_studies
-    }, indent=2)
+        "source": source,
+        "studies": studies
+    }
+
+
+def _fetch_with_store(args: Dict[str, Any], max_studies: int) -> Dict[str, Any]:
+    store = get_trial_store()
+    if store is None:
+        studies, total = _fetch_live(args, max_studies)
+        return _tool_payload(args, total, studies, "live")
+
+    state = store.query_state(args)
+    covered = state is not None and state["stored_count"] >= min(max_studies, state["total_count"] or 0)
+    if covered and state["fresh"]:
+        return _tool_payload(args, state["total_count"], store.lookup(args, max_studies), "local_store")
+    if state is None and store.bulk_fresh():
+        local_total = store.count(args)
+        if local_total >= max_studies:
+            return _tool_payload(args, local_total, store.lookup(args, max_studies), "local_store")
+
+    try:
+        complete = covered and state["stored_count"] >= (state["total_count"] or 0)
+        if complete and state["latest_update"]:
+            # Incremental refresh: pull every study of the condition updated since the newest one we
+            # hold, without status/phase filters, so studies that left the query's status are updated too
+            updated, changed = _fetch_live(
+                {"condition": args.get("condition"), "status": None, "updated_since": state["latest_update"]},
+                MAX_UPDATE_STUDIES,
+            )
+            if len(updated) >= changed:
+                total = store.merge_updates(args, updated)
+                return _tool_payload(args, total, store.lookup(args, max_studies), "local_store")
+            # Merging part of the updates would skip the rest for good: refetch the query instead
+            print(f"Incremental refresh got {len(updated)} of {changed} updated studies; refetching")
+
+        studies, total = _fetch_live(args, max_studies)
+        store.record_query(args, studies, total)
+        return _tool_payload(args, total, studies, "live")
+    except (requests.exceptions.RequestException, json.JSONDecodeError):
+        # Upstream outage: serve whatever the store holds, flagged as stale
+        local = store.lookup(args, max_studies)
+        if not local:
+            raise
+        total = state["total_count"] if state else store.count(args)
+        return {**_tool_payload(args, total, local, "local_store"), "stale": True}
+
+
+def fetch_clinical_trials(args: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Execute the fetch_clinical_trials tool by calling the ClinicalTrials.gov API v2.
+    Follows pagination up to `page_size` studies (max 1000, as advertised in the tool schema).
+    Answers from the local study store when it holds a fresh copy of the query.
+    Returns the payload dict with enhanced study data including enrollment, dates, locations,
+    or {"error": ...}.
+    """
+    max_studies = max(1, min(int(args.get("page_size") or DEFAULT_MAX_STUDIES), MAX_PAGE_SIZE))
+
+    try:
+        payload = _fetch_with_store(args, max_studies)
+    except requests.exceptions.RequestException as e:
+        return {"error": f"API request failed: {str(e)}"}
+    except json.JSONDecodeError:
+        return {"error": "Failed to parse API response"}
+
+    if settings.DEBUG_TOOL_OUTPUT:
+        print(json.dumps(payload, indent=2))
+    return payload
+
+
+def execute_fetch_clinical_trials(args: Dict[str, Any]) -> str:
+    """fetch_clinical_trials with the result in the compact tool-message encoding."""
+    return encode_payload(fetch_clinical_trials(args))
@@ -10,12 +10,16 @@ import os
 BASE_DIR = os.path.dirname(os.path.dirname(__file__))
 
 DATA_FOLDER = os.path.join(BASE_DIR, "data")
+# Briefings are written with the other generated reports (served under /reports), never into
+# DATA_FOLDER, which the document catalog indexes
+REPORTS_FOLDER = "generated_reports"
+BRIEFING_FILE_NAME = "briefing_report.pdf"
 
 def list_documents():
-    return [
-        f for f in os.listdir(DATA_FOLDER)
-        if os.path.isfile(os.path.join(DATA_FOLDER, f))
-    ]
+    """Cataloged documents (kept current by the background scanner), not a directory listing."""
+    from app.tools.doc_catalog import get_document_catalog
+
+    return [d["file_name"] for d in get_document_catalog().documents()]
 
 
 def load_document_file(file_name: str):
@@ -29,10 +33,12 @@ def load_document_file(file_name: str):
 
 
 
-def generate_briefing_pdf(summary: str, takeaways: str, table: str):
-    """Generate a professionally formatted briefing PDF."""
-    
-    output_path = os.path.join(DATA_FOLDER, "briefing_report.pdf")
+def generate_briefing_pdf(summary: str, takeaways: str, table: str, output_path: str = None):
+    """Generate a professionally formatted briefing PDF (generated_reports/briefing_report.pdf unless output_path is given)."""
+
+    if not output_path:
+        os.makedirs(REPORTS_FOLDER, exist_ok=True)
+        output_path = os.path.join(REPORTS_FOLDER, BRIEFING_FILE_NAME)
 
     doc = SimpleDocTemplate(
         output_path,
@@ -44,6 +50,7 @@ def generate_briefing_pdf(summary: str, takeaways: str, table: str):
     )
 
     styles = getSampleStyleSheet()
+    cell_style = ParagraphStyle("TableCell", parent=styles["BodyText"], fontSize=9, leading=11)
     story = []
 
     # --- TITLE ---
@@ -86,18 +93,23 @@ def generate_briefing_pdf(summary: str, takeaways: str, table: str):
                 wrapped = [Paragraph(col, cell_style) for col in parts]
                 parsed_rows.append(wrapped)
 
-    # Create clean table
-    tbl = Table(parsed_rows, colWidths=[2.5*inch, 3.8*inch])
-    tbl.setStyle(TableStyle([
-        ('BACKGROUND', (0,0), (-1,0), colors.lightgrey),
-        ('FONTNAME', (0,0), (-1,0), 'Helvetica-Bold'),
-        ('ALIGN', (0,0), (-1,-1), 'LEFT'),
-        ('VALIGN', (0,0), (-1,-1), 'TOP'),     # IMPORTANT: prevents overlap
-        ('GRID', (0,0), (-1,-1), 0.5, colors.grey),
-        ('LEFTPADDING', (0,0), (-1,-1), 6),
-        ('RIGHTPADDING', (0,0), (-1,-1), 6),
-    ]))
-    story.append(tbl)
+    if parsed_rows:
+        # Pad ragged rows; the two-column layout applies when every row has two cells
+        width = max(len(row) for row in parsed_rows)
+        parsed_rows = [row + [""] * (width - len(row)) for row in parsed_rows]
+
+        # Create clean table
+        tbl = Table(parsed_rows, colWidths=[2.5*inch, 3.8*inch] if width == 2 else None)
+        tbl.setStyle(TableStyle([
+            ('BACKGROUND', (0,0), (-1,0), colors.lightgrey),
+            ('FONTNAME', (0,0), (-1,0), 'Helvetica-Bold'),
+            ('ALIGN', (0,0), (-1,-1), 'LEFT'),
+            ('VALIGN', (0,0), (-1,-1), 'TOP'),     # IMPORTANT: prevents overlap
+            ('GRID', (0,0), (-1,-1), 0.5, colors.grey),
+            ('LEFTPADDING', (0,0), (-1,-1), 6),
+            ('RIGHTPADDING', (0,0), (-1,-1), 6),
+        ]))
+        story.append(tbl)
 
     # Build PDF
     doc.build(story)
@@ -0,0 +1,271 @@
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import pandas as pd
+
+from app.config.settings import settings
+
+ROLLUP_VIEWS = ["top_molecules", "region_breakdown", "yearly_trend", "cagr", "competitors"]
+FINGERPRINT_SQL = (
+    "SELECT molecule, count(*) AS n, sum(sales_value) AS value, sum(sales_volume) AS volume, "
+    "max(year) AS max_year FROM iqvia_sales GROUP BY molecule"
+)
+RAW_COLUMNS = "molecule, region, year, sales_value, sales_volume, cagr, competitors"
+MOLECULES_PER_FETCH = 200
+CUBE_COLUMNS = ["molecule", "region", "year", "sales_value", "sales_volume", "cagr", "rows"]
+
+
+def _literal(value: str) -> str:
+    return "'" + value.replace("'", "''") + "'"
+
+
+def _records(df: pd.DataFrame) -> List[Dict[str, Any]]:
+    df = df.astype(object).where(df.notna(), None)
+    return [{k: (v.item() if hasattr(v, "item") else v) for k, v in row.items()} for row in df.to_dict("records")]
+
+
+class IQVIARollups:
+    """
+    Pre-aggregated views over iqvia_sales for the common market questions.
+
+    The base cube holds molecule x region x year totals (sales summed, reported CAGR
+    averaged). Refreshes are incremental: a per-molecule fingerprint (row count, sums,
+    latest year) is compared with the previous one and only molecules whose rows
+    changed are re-read. Lookup tables derived from the cube (rankings per region/year,
+    per-molecule slices, computed CAGR, competitor adjacency) are rebuilt after each
+    refresh so queries are dictionary lookups.
+    """
+
+    def __init__(self, loader: Callable[[str], Any]):
+        self.loader = loader
+        self.cube = pd.DataFrame(columns=CUBE_COLUMNS)
+        self.adjacency = pd.DataFrame(columns=["molecule", "competitor"])
+        self.fingerprints: Dict[str, tuple] = {}
+        self.refreshed_at: Optional[float] = None
+        self.data_version: Optional[str] = None
+        self._lock = threading.Lock()
+        self._rankings: Dict[tuple, pd.DataFrame] = {}
+        self._by_molecule: Dict[str, pd.DataFrame] = {}
+        self._competitors: Dict[str, List[str]] = {}
+        self._growth = pd.DataFrame()
+        self._names: Dict[str, str] = {}
+
+    # Refresh
+
+    def _load(self, sql: str) -> List[Dict[str, Any]]:
+        rows = self.loader(sql)
+        if isinstance(rows, dict):
+            raise RuntimeError(rows.get("error", "rollup query failed"))
+        return rows
+
+    def refresh(self, data_version: Optional[str] = None) -> Dict[str, Any]:
+        with self._lock:
+            started = time.monotonic()
+            fingerprints = {
+                row["molecule"]: (row["n"], round(row["value"] or 0, 6), round(row["volume"] or 0, 6), row["max_year"])
+                for row in self._load(FINGERPRINT_SQL) if row.get("molecule")
+            }
+            changed = [m for m, fp in fingerprints.items() if self.fingerprints.get(m) != fp]
+            removed = set(self.fingerprints) - set(fingerprints)
+
+            slices, pairs = [], []
+            for i in range(0, len(changed), MOLECULES_PER_FETCH):
+                chunk = changed[i:i + MOLECULES_PER_FETCH]
+                raw = pd.DataFrame(self._load(
+                    f"SELECT {RAW_COLUMNS} FROM iqvia_sales WHERE molecule IN ({', '.join(map(_literal, chunk))})"
+                ))
+                if raw.empty:
+                    continue
+                for col in ("sales_value", "sales_volume", "cagr", "year"):
+                    raw[col] = pd.to_numeric(raw[col], errors="coerce")
+                slices.append(
+                    raw.groupby(["molecule", "region", "year"], dropna=False)
+                    .agg(sales_value=("sales_value", "sum"), sales_volume=("sales_volume", "sum"),
+                         cagr=("cagr", "mean"), rows=("molecule", "size"))
+                    .reset_index()
+                )
+                # Pre-split the comma-separated competitors column once
+                comp = raw[["molecule", "competitors"]].dropna()
+                comp = comp.assign(competitor=comp["competitors"].str.split(",")).explode("competitor")
+                comp["competitor"] = comp["competitor"].str.strip()
+                pairs.append(comp.loc[comp["competitor"] != "", ["molecule", "competitor"]].drop_duplicates())
+
+            stale = set(changed) | removed
+            if stale:
+                kept = self.cube[~self.cube["molecule"].isin(stale)]
+                self.cube = pd.concat([kept] + slices, ignore_index=True) if slices else kept
+                kept_pairs = self.adjacency[~self.adjacency["molecule"].isin(stale)]
+                self.adjacency = pd.concat([kept_pairs] + pairs, ignore_index=True) if pairs else kept_pairs
+                self._build_indexes()
+            self.fingerprints = fingerprints
+            self.refreshed_at = time.time()
+            self.data_version = data_version
+            return {
+                "molecules": len(fingerprints),
+                "changed": len(changed),
+                "removed": len(removed),
+                "cube_rows": len(self.cube),
+                "seconds": round(time.monotonic() - started, 3),
+            }
+
+    def _build_indexes(self) -> None:
+        cube = self.cube
+        self._names = {m.lower(): m for m in cube["molecule"].dropna().unique()}
+        self._by_molecule = {m.lower(): df for m, df in cube.groupby("molecule")}
+
+        # Molecule rankings for every (region, year) combination, including "all" (None)
+        rankings = {}
+        for region in [None] + sorted(cube["region"].dropna().unique()):
+            part = cube if region is None else cube[cube["region"] == region]
+            for year in [None] + sorted(part["year"].dropna().unique()):
+                sub = part if year is None else part[part["year"] == year]
+                totals = (
+                    sub.groupby("molecule")
+                    .agg(sales_value=("sales_value", "sum"), sales_volume=("sales_volume", "sum"), cagr=("cagr", "mean"))
+                    .sort_values("sales_value", ascending=False)
+                    .reset_index()
+                )
+                totals.insert(1, "region", region or "All")
+                totals.insert(2, "year", year)
+                rankings[(region.lower() if region else None, int(year) if year is not None else None)] = totals
+        self._rankings = rankings
+
+        # CAGR computed from the first and last year on record per molecule x region
+        keys = ["molecule", "region"]
+        ordered = cube.dropna(subset=["year"]).sort_values("year")
+        first = ordered.groupby(keys).head(1).set_index(keys)
+        last = ordered.groupby(keys).tail(1).set_index(keys).reindex(first.index)
+        span = (last["year"] - first["year"]).astype(float)
+        ratio = (last["sales_value"] / first["sales_value"]).astype(float)
+        self._growth = pd.DataFrame({
+            "start_year": first["year"],
+            "end_year": last["year"],
+            "start_sales_value": first["sales_value"],
+            "end_sales_value": last["sales_value"],
+            # 1 ** NaN is 1: mask single-year spans after the power, not only in the exponent
+            "computed_cagr": (ratio ** (1 / span.where(span > 0)) - 1).where((first["sales_value"] > 0) & (span > 0)),
+            "cagr": ordered.groupby(keys)["cagr"].mean(),
+        }).reset_index()
+        self._competitors = {
+            m.lower(): sorted(set(df["competitor"])) for m, df in self.adjacency.groupby("molecule")
+        }
+
+    def ensure_fresh(self) -> None:
+        """Refresh when the replica's data version changed, or after IQVIA_ROLLUP_REFRESH_MINUTES."""
+        from app.tools.sql_backends import get_sql_backend
+
+        backend = get_sql_backend()
+        version = backend.data_version() if hasattr(backend, "data_version") else None
+        if self.refreshed_at is None:
+            self.refresh(version)
+        elif version is not None:
+            if version != self.data_version:
+                self.refresh(version)
+        elif time.time() - self.refreshed_at > settings.IQVIA_ROLLUP_REFRESH_MINUTES * 60:
+            self.refresh()
+
+    # Queries
+
+    def _molecule(self, name: Optional[str]) -> Optional[str]:
+        return self._names.get((name or "").strip().lower())
+
+    def _latest_year(self, df: pd.DataFrame) -> Optional[int]:
+        years = df["year"].dropna()
+        return int(years.max()) if not years.empty else None
+
+    def query(self, view: str, molecule: Optional[str] = None, region: Optional[str] = None,
+              year: Optional[int] = None, limit: int = 10) -> Any:
+        """Rows for one rollup view, or {"error": ...} for bad arguments."""
+        if view not in ROLLUP_VIEWS:
+            return {"error": f"Unknown rollup view {view}; use one of {', '.join(ROLLUP_VIEWS)}"}
+        limit = max(1, min(int(limit or 10), 100))
+        year = int(year) if year else None
+        region_key = region.strip().lower() if region else None
+
+        if view == "top_molecules":
+            ranking = self._rankings.get((region_key, year))
+            return _records(ranking.head(limit)) if ranking is not None else []
+
+        name = self._molecule(molecule)
+        if name is None:
+            return {"error": f"Molecule {molecule!r} not found in iqvia_sales"}
+        df = self._by_molecule[name.lower()]
+        if region_key:
+            df = df[df["region"].str.lower() == region_key]
+
+        if view == "region_breakdown":
+            year = year or self._latest_year(df)
+            sub = df[df["year"] == year] if year else df
+            return _records(sub.sort_values("sales_value", ascending=False)[CUBE_COLUMNS[:-1]])
+
+        if view == "yearly_trend":
+            trend = (
+                df.groupby("year")
+                .agg(sales_value=("sales_value", "sum"), sales_volume=("sales_volume", "sum"), cagr=("cagr", "mean"))
+                .sort_index()
+                .reset_index()
+            )
+            trend["yoy_growth"] = trend["sales_value"].pct_change()
+            trend.insert(0, "molecule", name)
+            trend.insert(1, "region", region or "All")
+            return _records(trend)
+
+        if view == "cagr":
+            growth = self._growth[self._growth["molecule"] == name]
+            if region_key:
+                growth = growth[growth["region"].str.lower() == region_key]
+            return _records(growth)
+
+        # competitors: the molecule and each listed competitor side by side
+        names = [name] + [c for c in self._competitors.get(name.lower(), []) if c != name]
+        year = year or self._latest_year(df)
+        ranking = self._rankings.get((region_key, year))
+        if ranking is None:
+            return []
+        rows = ranking[ranking["molecule"].str.lower().isin([n.lower() for n in names])].copy()
+        rows["is_competitor"] = rows["molecule"] != name
+        missing = [n for n in names if n.lower() not in set(rows["molecule"].str.lower())]
+        result = _records(rows.head(limit + 1))
+        if missing:
+            result.append({"molecule": ", ".join(missing), "region": region or "All", "year": year,
+                           "sales_value": None, "sales_volume": None, "cagr": None,
+                           "is_competitor": True, "note": "no sales data"})
+        return result
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "molecules": len(self.fingerprints),
+            "cube_rows": len(self.cube),
+            "competitor_pairs": len(self.adjacency),
+            "refreshed_at": self.refreshed_at,
+            "data_version": self.data_version,
+        }
+
+
+_rollups: Optional[IQVIARollups] = None
+_rollups_lock = threading.Lock()
+
+
+def get_iqvia_rollups() -> IQVIARollups:
+    global _rollups
+    with _rollups_lock:
+        if _rollups is None:
+            from app.tools.supabase_tool import run_query
+
+            _rollups = IQVIARollups(run_query)
+    return _rollups
+
+
+def query_market_rollup(args: Dict[str, Any]) -> Any:
+    """Tool entry point for the IQVIA agent."""
+    rollups = get_iqvia_rollups()
+    try:
+        rollups.ensure_fresh()
+    except Exception as e:
+        return {"error": f"Rollups unavailable: {e}", "code": "rollup_unavailable",
+                "hint": "Use query_supabase with SQL instead."}
+    return rollups.query(
+        args.get("view"), molecule=args.get("molecule"), region=args.get("region"),
+        year=args.get("year"), limit=args.get("limit") or 10,
+    )
@@ -0,0 +1,218 @@
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import date
+from typing import Any, Callable, Dict, List, Optional
+
+from app.config.settings import settings
+from app.utils.text_ranking import BM25Index
+
+PATENT_COLUMNS = [
+    "patent_number", "title", "assignee", "molecule", "filing_date", "grant_date",
+    "expiration_date", "status", "jurisdiction", "abstract",
+]
+ROW_COLUMNS = [c for c in PATENT_COLUMNS if c != "abstract"]
+LAPSED_STATUSES = {"expired", "lapsed", "revoked", "abandoned", "withdrawn", "invalidated"}
+SNIPPET_CHARS = 300
+
+
+def _in_force(row: Dict[str, Any], today: str) -> bool:
+    status = (row.get("status") or "").strip().lower()
+    expiry = row.get("expiration_date") or ""
+    return status not in LAPSED_STATUSES and (not expiry or expiry >= today)
+
+
+class PatentIndex:
+    """
+    In-memory indexes over the patents table for the Patent Landscape agent:
+
+    - a BM25 full-text index over title (weighted double) and abstract, for topic search;
+    - per-molecule, per-jurisdiction expiry timelines sorted by expiration_date, for
+      patent-cliff and earliest-generic-entry questions.
+
+    Refreshes re-read the table and re-index only patents whose row changed.
+    """
+
+    def __init__(self, loader: Callable[[str], Any]):
+        self.loader = loader
+        self.text_index = BM25Index()
+        self.rows: Dict[str, Dict[str, Any]] = {}
+        self.timelines: Dict[str, Dict[str, List[Dict[str, Any]]]] = {}
+        self.refreshed_at: Optional[float] = None
+        self.data_version: Optional[str] = None
+        self._names: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    # Refresh
+
+    def refresh(self, data_version: Optional[str] = None) -> Dict[str, Any]:
+        with self._lock:
+            started = time.monotonic()
+            result = self.loader(f"SELECT {', '.join(PATENT_COLUMNS)} FROM patents")
+            if isinstance(result, dict):
+                raise RuntimeError(result.get("error", "patent query failed"))
+            rows = {r["patent_number"]: r for r in result if r.get("patent_number")}
+
+            changed = [k for k, r in rows.items() if self.rows.get(k) != r]
+            removed = set(self.rows) - set(rows)
+            for key in removed:
+                self.text_index.remove(key)
+            for key in changed:
+                row = rows[key]
+                title = row.get("title") or ""
+                self.text_index.add(key, f"{title} {title} {row.get('abstract') or ''}")
+            self.rows = rows
+            if changed or removed:
+                self._build_timelines()
+            self.refreshed_at = time.time()
+            self.data_version = data_version
+            return {
+                "patents": len(rows),
+                "reindexed": len(changed),
+                "removed": len(removed),
+                "seconds": round(time.monotonic() - started, 3),
+            }
+
+    def _build_timelines(self) -> None:
+        timelines: Dict[str, Dict[str, List[Dict[str, Any]]]] = defaultdict(lambda: defaultdict(list))
+        names = {}
+        for row in self.rows.values():
+            molecule = (row.get("molecule") or "").strip()
+            if not molecule:
+                continue
+            names[molecule.lower()] = molecule
+            timelines[molecule.lower()][row.get("jurisdiction") or "Unknown"].append(
+                {c: row.get(c) for c in ROW_COLUMNS}
+            )
+        for by_jurisdiction in timelines.values():
+            for patents in by_jurisdiction.values():
+                patents.sort(key=lambda r: r.get("expiration_date") or "9999")
+        self.timelines = {m: dict(j) for m, j in timelines.items()}
+        self._names = names
+
+    def ensure_fresh(self) -> None:
+        """Refresh when the replica's data version changed, or after PATENT_INDEX_REFRESH_MINUTES."""
+        from app.tools.sql_backends import get_sql_backend
+
+        backend = get_sql_backend()
+        version = backend.data_version() if hasattr(backend, "data_version") else None
+        if self.refreshed_at is None:
+            self.refresh(version)
+        elif version is not None:
+            if version != self.data_version:
+                self.refresh(version)
+        elif time.time() - self.refreshed_at > settings.PATENT_INDEX_REFRESH_MINUTES * 60:
+            self.refresh()
+
+    # Queries
+
+    def search(self, query: str, molecule: Optional[str] = None, jurisdiction: Optional[str] = None,
+               in_force_only: bool = False, limit: int = 10) -> List[Dict[str, Any]]:
+        """Patents ranked by BM25 relevance of title/abstract to `query`, optionally filtered."""
+        today = date.today().isoformat()
+        limit = max(1, min(int(limit or 10), 100))
+        results = []
+        for key, score in self.text_index.search(query):
+            row = self.rows[key]
+            if molecule and (row.get("molecule") or "").lower() != molecule.strip().lower():
+                continue
+            if jurisdiction and (row.get("jurisdiction") or "").lower() != jurisdiction.strip().lower():
+                continue
+            if in_force_only and not _in_force(row, today):
+                continue
+            abstract = row.get("abstract") or ""
+            results.append({
+                **{c: row.get(c) for c in ROW_COLUMNS},
+                "score": round(score, 4),
+                "snippet": abstract[:SNIPPET_CHARS] + ("..." if len(abstract) > SNIPPET_CHARS else ""),
+            })
+            if len(results) >= limit:
+                break
+        return results
+
+    def expiry_timeline(self, molecule: str, jurisdiction: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Per-jurisdiction expiry summary for a molecule. The last expiry among patents
+        still in force is the earliest date generics can enter without a licence or
+        challenge; the year with the most in-force expiries is the patent cliff.
+        """
+        name = self._names.get((molecule or "").strip().lower())
+        if name is None:
+            return {"error": f"No patents found for molecule {molecule!r}"}
+        today = date.today().isoformat()
+        by_jurisdiction = self.timelines[name.lower()]
+        if jurisdiction:
+            by_jurisdiction = {j: p for j, p in by_jurisdiction.items() if j.lower() == jurisdiction.strip().lower()}
+            if not by_jurisdiction:
+                return {"error": f"No {name} patents in jurisdiction {jurisdiction!r}"}
+
+        rows, timeline = [], []
+        for juris, patents in sorted(by_jurisdiction.items()):
+            rows.extend(patents)
+            active = [p for p in patents if _in_force(p, today)]
+            per_year = Counter((p.get("expiration_date") or "")[:4] for p in active if p.get("expiration_date"))
+            last_expiry = active[-1].get("expiration_date") if active else None
+            timeline.append({
+                "molecule": name,
+                "jurisdiction": juris,
+                "total_patents": len(patents),
+                "in_force": len(active),
+                "next_expiry": active[0].get("expiration_date") if active else None,
+                "last_expiry": last_expiry,
+                "earliest_generic_entry": last_expiry or today,
+                "cliff_year": per_year.most_common(1)[0][0] if per_year else None,
+                "expiring_by_year": dict(sorted(per_year.items())),
+            })
+        return {"rows": rows, "timeline": timeline}
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "patents": len(self.rows),
+            "indexed_terms": len(self.text_index.postings),
+            "molecules": len(self.timelines),
+            "refreshed_at": self.refreshed_at,
+            "data_version": self.data_version,
+        }
+
+
+_index: Optional[PatentIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_patent_index() -> PatentIndex:
+    global _index
+    with _index_lock:
+        if _index is None:
+            from app.tools.supabase_tool import run_query
+
+            _index = PatentIndex(run_query)
+    return _index
+
+
+def _fresh_index():
+    index = get_patent_index()
+    try:
+        index.ensure_fresh()
+    except Exception as e:
+        return None, {"error": f"Patent index unavailable: {e}", "code": "index_unavailable",
+                      "hint": "Use query_supabase with SQL instead."}
+    return index, None
+
+
+def search_patents(args: Dict[str, Any]) -> Any:
+    """Tool entry point: ranked full-text search over patent titles and abstracts."""
+    index, error = _fresh_index()
+    if error:
+        return error
+    return index.search(
+        args.get("query") or "", molecule=args.get("molecule"), jurisdiction=args.get("jurisdiction"),
+        in_force_only=bool(args.get("in_force_only")), limit=args.get("limit") or 10,
+    )
+
+
+def patent_expiry_timeline(args: Dict[str, Any]) -> Any:
+    """Tool entry point: expiry timeline / earliest generic entry for a molecule."""
+    index, error = _fresh_index()
+    if error:
+        return error
+    return index.expiry_timeline(args.get("molecule") or "", jurisdiction=args.get("jurisdiction"))
@@ -0,0 +1,392 @@
+import asyncio
+import datetime
+import decimal
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+from app.config.settings import settings
+
+# Schemas of the tables the IQVIA and Patent agents query, for local backends
+LOCAL_SCHEMA = {
+    "iqvia_sales": """
+        CREATE TABLE IF NOT EXISTS iqvia_sales (
+            molecule TEXT,
+            region TEXT,
+            sales_value DOUBLE PRECISION,
+            sales_volume DOUBLE PRECISION,
+            cagr DOUBLE PRECISION,
+            competitors TEXT,
+            atc_code TEXT,
+            year INTEGER
+        )
+    """,
+    "patents": """
+        CREATE TABLE IF NOT EXISTS patents (
+            patent_number TEXT PRIMARY KEY,
+            title TEXT,
+            assignee TEXT,
+            molecule TEXT,
+            filing_date DATE,
+            grant_date DATE,
+            expiration_date DATE,
+            status TEXT,
+            jurisdiction TEXT,
+            abstract TEXT
+        )
+    """,
+}
+
+PLACEHOLDER_RE = re.compile(r"\$(\d+)")
+
+
+def _jsonable(value: Any) -> Any:
+    """Match the JSON-native types the exec_sql RPC used to return."""
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    return value
+
+
+class SQLBackend(ABC):
+    """
+    Executes read queries for the agents. SQL uses Postgres-style `$1, $2, ...` placeholders
+    for `params`; backends translate them where needed.
+    """
+
+    name = "base"
+
+    @abstractmethod
+    def fetch(self, sql: str, params: Optional[Sequence[Any]] = None,
+              timeout_ms: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Run a statement and return its rows as dicts."""
+
+    def iter_rows(self, sql: str, params: Optional[Sequence[Any]] = None, timeout_ms: Optional[int] = None,
+                  batch_size: int = 500) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Stream a statement's rows in batches. Backends with server-side cursors override
+        this; the default fetches everything and slices it.
+        """
+        rows = self.fetch(sql, params, timeout_ms)
+        for i in range(0, len(rows), batch_size):
+            yield rows[i:i + batch_size]
+
+    def explain_cost(self, sql: str) -> Optional[float]:
+        """Planner's estimated total cost for `sql`, or None when the backend cannot tell."""
+        return None
+
+    def close(self) -> None:
+        pass
+
+
+class SupabaseRPCBackend(SQLBackend):
+    """
+    The original path: every statement goes through the `exec_sql` PostgREST RPC.
+
+    The RPC takes no timeout, so `default_timeout_ms` only bounds how long the client
+    waits for a response; the statement itself keeps running on the server unless the
+    function or its role has a `statement_timeout` (ALTER FUNCTION exec_sql SET
+    statement_timeout = '15s').
+    """
+
+    name = "supabase"
+
+    def __init__(self, url: str, key: str, default_timeout_ms: Optional[int] = None):
+        from supabase import ClientOptions, create_client
+
+        options = ClientOptions(postgrest_client_timeout=default_timeout_ms / 1000) if default_timeout_ms else None
+        self.client = create_client(url, key, options=options)
+
+    def fetch(self, sql, params=None, timeout_ms=None):
+        if params:
+            raise ValueError("The exec_sql RPC does not support bound parameters")
+        result = self.client.rpc("exec_sql", {"query": sql}).execute()
+        return result.data
+
+
+class PostgresBackend(SQLBackend):
+    """
+    Direct Postgres access through an asyncpg connection pool.
+
+    The pool lives on a dedicated event-loop thread so both the synchronous agent code
+    (`fetch`) and async callers (`afetch`) share one bounded set of connections.
+    asyncpg keeps an LRU cache of prepared statements per connection, so repeated
+    query shapes skip the parse/plan round trip. Each statement runs in a read-only
+    transaction with a server-side `statement_timeout`.
+    """
+
+    name = "postgres"
+
+    def __init__(self, dsn: str, min_size: int = 1, max_size: int = 10,
+                 statement_cache_size: int = 100, default_timeout_ms: Optional[int] = None):
+        self.dsn = dsn
+        self.min_size = min_size
+        self.max_size = max_size
+        self.statement_cache_size = statement_cache_size
+        self.default_timeout_ms = default_timeout_ms
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="postgres-pool", daemon=True)
+        self._thread.start()
+        self._pool = None
+        self._pool_lock = asyncio.Lock()
+
+    async def _get_pool(self):
+        async with self._pool_lock:
+            if self._pool is None:
+                import asyncpg
+
+                self._pool = await asyncpg.create_pool(
+                    self.dsn,
+                    min_size=self.min_size,
+                    max_size=self.max_size,
+                    statement_cache_size=self.statement_cache_size,
+                )
+        return self._pool
+
+    async def _fetch(self, sql, params, timeout_ms):
+        pool = await self._get_pool()
+        timeout_ms = timeout_ms or self.default_timeout_ms
+        async with pool.acquire() as conn:
+            async with conn.transaction(readonly=True):
+                if timeout_ms:
+                    await conn.execute(f"SET LOCAL statement_timeout = {int(timeout_ms)}")
+                rows = await conn.fetch(sql, *(params or []))
+        return [{k: _jsonable(v) for k, v in row.items()} for row in rows]
+
+    async def afetch(self, sql: str, params: Optional[Sequence[Any]] = None,
+                     timeout_ms: Optional[int] = None) -> List[Dict[str, Any]]:
+        future = asyncio.run_coroutine_threadsafe(self._fetch(sql, params, timeout_ms), self._loop)
+        return await asyncio.wrap_future(future)
+
+    def fetch(self, sql, params=None, timeout_ms=None):
+        return asyncio.run_coroutine_threadsafe(self._fetch(sql, params, timeout_ms), self._loop).result()
+
+    async def _iter(self, sql, params, timeout_ms, batch_size):
+        pool = await self._get_pool()
+        timeout_ms = timeout_ms or self.default_timeout_ms
+        async with pool.acquire() as conn:
+            async with conn.transaction(readonly=True):
+                if timeout_ms:
+                    await conn.execute(f"SET LOCAL statement_timeout = {int(timeout_ms)}")
+                cursor = await conn.cursor(sql, *(params or []))
+                while True:
+                    rows = await cursor.fetch(batch_size)
+                    if not rows:
+                        break
+                    yield [{k: _jsonable(v) for k, v in row.items()} for row in rows]
+
+    def iter_rows(self, sql, params=None, timeout_ms=None, batch_size=500):
+        # Server-side cursor: the connection and transaction stay open while the caller iterates
+        agen = self._iter(sql, params, timeout_ms, batch_size)
+        try:
+            while True:
+                try:
+                    batch = asyncio.run_coroutine_threadsafe(agen.__anext__(), self._loop).result()
+                except StopAsyncIteration:
+                    return
+                yield batch
+        finally:
+            asyncio.run_coroutine_threadsafe(agen.aclose(), self._loop).result()
+
+    def explain_cost(self, sql):
+        rows = self.fetch(f"EXPLAIN (FORMAT JSON) {sql}")
+        plan = rows[0]["QUERY PLAN"]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return float(plan[0]["Plan"]["Total Cost"])
+
+    def close(self):
+        async def _close():
+            if self._pool is not None:
+                await self._pool.close()
+
+        asyncio.run_coroutine_threadsafe(_close(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+
+
+class SQLiteBackend(SQLBackend):
+    """
+    Local SQLite database with the iqvia_sales and patents schemas, for offline
+    development, tests and benchmarks. Postgres-only syntax (ILIKE, string_to_array,
+    ...) is not available here.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path: str, default_timeout_ms: Optional[int] = None):
+        self.path = path
+        self.default_timeout_ms = default_timeout_ms
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._local = threading.local()
+        conn = self._conn()
+        for ddl in LOCAL_SCHEMA.values():
+            conn.execute(ddl)
+        conn.commit()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path)
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    def fetch(self, sql, params=None, timeout_ms=None):
+        return [row for batch in self.iter_rows(sql, params, timeout_ms, batch_size=10000) for row in batch]
+
+    def iter_rows(self, sql, params=None, timeout_ms=None, batch_size=500):
+        conn = self._conn()
+        timeout_ms = timeout_ms or self.default_timeout_ms
+        if timeout_ms:
+            deadline = time.monotonic() + timeout_ms / 1000
+            # A non-zero return aborts the running statement
+            conn.set_progress_handler(lambda: int(time.monotonic() > deadline), 10000)
+        try:
+            cur = conn.execute(PLACEHOLDER_RE.sub(r"?\1", sql), list(params or []))
+            while True:
+                rows = cur.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield [dict(row) for row in rows]
+        finally:
+            conn.set_progress_handler(None, 0)
+
+    def load_rows(self, table: str, rows: List[Dict[str, Any]]) -> int:
+        if not rows:
+            return 0
+        columns = list(rows[0])
+        conn = self._conn()
+        conn.executemany(
+            f"INSERT OR REPLACE INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)})",
+            [[row.get(c) for c in columns] for row in rows],
+        )
+        conn.commit()
+        return len(rows)
+
+
+class DuckDBBackend(SQLBackend):
+    """
+    Local DuckDB database with the same schemas. Unlike SQLite it understands most of the
+    Postgres syntax the agents generate (ILIKE, string_to_array, unnest). Needs `duckdb`.
+    """
+
+    name = "duckdb"
+
+    def __init__(self, path: str, default_timeout_ms: Optional[int] = None):
+        import duckdb
+
+        self.path = path
+        self.default_timeout_ms = default_timeout_ms
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = duckdb.connect(path)
+        for ddl in LOCAL_SCHEMA.values():
+            self._db.execute(ddl)
+
+    def fetch(self, sql, params=None, timeout_ms=None):
+        return [row for batch in self.iter_rows(sql, params, timeout_ms, batch_size=10000) for row in batch]
+
+    def iter_rows(self, sql, params=None, timeout_ms=None, batch_size=500):
+        cur = self._db.cursor()
+        timeout_ms = timeout_ms or self.default_timeout_ms
+        timer = threading.Timer(timeout_ms / 1000, cur.interrupt) if timeout_ms else None
+        if timer:
+            timer.start()
+        try:
+            cur.execute(sql, list(params or []))
+            columns = [d[0] for d in cur.description]
+            while True:
+                rows = cur.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield [{c: _jsonable(v) for c, v in zip(columns, row)} for row in rows]
+        finally:
+            if timer:
+                timer.cancel()
+            cur.close()
+
+    def load_rows(self, table: str, rows: List[Dict[str, Any]]) -> int:
+        if not rows:
+            return 0
+        columns = list(rows[0])
+        # DuckDB only accepts OR REPLACE on tables with a primary key
+        verb = "INSERT OR REPLACE" if table == "patents" else "INSERT"
+        self._db.executemany(
+            f"{verb} INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)})",
+            [[row.get(c) for c in columns] for row in rows],
+        )
+        return len(rows)
+
+    def close(self):
+        self._db.close()
+
+
+_backend: Optional[SQLBackend] = None
+_backend_lock = threading.Lock()
+
+
+def create_sql_backend(kind: str) -> SQLBackend:
+    timeout_ms = settings.SQL_STATEMENT_TIMEOUT_MS
+    if kind == "supabase":
+        return SupabaseRPCBackend(settings.SUPABASE_URL, settings.SUPABASE_KEY, default_timeout_ms=timeout_ms)
+    if kind == "postgres":
+        return PostgresBackend(
+            settings.DATABASE_URL,
+            min_size=settings.SQL_POOL_MIN_SIZE,
+            max_size=settings.SQL_POOL_MAX_SIZE,
+            statement_cache_size=settings.SQL_STATEMENT_CACHE_SIZE,
+            default_timeout_ms=timeout_ms,
+        )
+    if kind == "sqlite":
+        return SQLiteBackend(settings.LOCAL_SQL_PATH, default_timeout_ms=timeout_ms)
+    if kind == "duckdb":
+        return DuckDBBackend(settings.LOCAL_SQL_PATH, default_timeout_ms=timeout_ms)
+    raise ValueError(f"Unknown SQL_BACKEND: {kind}")
+
+
+def get_sql_backend() -> SQLBackend:
+    """
+    Process-wide backend selected by SQL_BACKEND (created on first use, not at import).
+    With SQL_REPLICA_PATH set, a remote backend is fronted by the local DuckDB replica.
+    """
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            _backend = create_sql_backend(settings.SQL_BACKEND)
+            if settings.SQL_REPLICA_PATH and settings.SQL_BACKEND in ("supabase", "postgres"):
+                from app.tools.sql_replica import create_replica, start_sync_scheduler
+
+                _backend = create_replica(_backend)
+                start_sync_scheduler(_backend, settings.SQL_REPLICA_SYNC_INTERVAL_HOURS)
+        return _backend
+
+
+def main():
+    import argparse
+    import csv
+
+    parser = argparse.ArgumentParser(description="Load a CSV export into the local SQL backend")
+    parser.add_argument("table", choices=sorted(LOCAL_SCHEMA))
+    parser.add_argument("csv_path")
+    args = parser.parse_args()
+    backend = get_sql_backend()
+    if not hasattr(backend, "load_rows"):
+        raise SystemExit(f"SQL_BACKEND={backend.name} is not a local backend")
+    with open(args.csv_path, newline="") as f:
+        rows = [{k: (v if v != "" else None) for k, v in row.items()} for row in csv.DictReader(f)]
+    print(f"Loaded {backend.load_rows(args.table, rows)} rows into {args.table}")
+
+    from app.tools.sql_result_cache import bump_table_version
+
+    bump_table_version(args.table)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+import re
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from app.config.settings import settings
+
+FORBIDDEN_KEYWORDS = {
+    "insert", "update", "delete", "merge", "upsert", "drop", "alter", "create", "truncate",
+    "grant", "revoke", "copy", "call", "do", "execute", "prepare", "vacuum", "analyze",
+    "set", "reset", "lock", "listen", "notify", "refresh", "comment", "attach", "detach",
+    "pragma", "install", "load", "into",
+}
+# set_config/current_setting could lift statement_timeout from inside a SELECT
+FORBIDDEN_FUNCTIONS = ("pg_sleep", "pg_read_file", "pg_ls_dir", "dblink", "lo_import", "lo_export",
+                       "set_config", "current_setting")
+WORD_RE = re.compile(r"[a-z_][a-z0-9_$]*", re.IGNORECASE)
+TABLE_REF_RE = re.compile(r"\b(from|join)\s+([a-z_][a-z0-9_.\"]*)(\s*\()?", re.IGNORECASE)
+CTE_RE = re.compile(r"(?:\bwith\b|,)\s*(?:recursive\s+)?([a-z_][a-z0-9_]*)\s+as\s*\(", re.IGNORECASE)
+LIMIT_RE = re.compile(r"\blimit\s+(\d+|all)\b", re.IGNORECASE)
+FETCH_RE = re.compile(r"\bfetch\s+(?:first|next)\s+(\d+\s+)?rows?\s+only\b", re.IGNORECASE)
+# Keywords that end a FROM list at the same nesting level
+FROM_END_RE = re.compile(
+    r"\b(where|group|having|order|limit|offset|fetch|union|intersect|except|window|qualify)\b", re.IGNORECASE
+)
+COMMA_RELATION_RE = re.compile(r"\s*(?:lateral\s+)?([a-z_][a-z0-9_.\"]*)(\s*\()?", re.IGNORECASE)
+
+
+class SQLGuardError(Exception):
+    """A statement rejected before execution. `to_dict()` is returned to the agent as the tool result."""
+
+    def __init__(self, code: str, message: str, hint: Optional[str] = None):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+        self.hint = hint
+
+    def to_dict(self) -> Dict[str, Any]:
+        error = {"error": self.message, "code": self.code}
+        if self.hint:
+            error["hint"] = self.hint
+        return error
+
+
+def mask_sql(sql: str) -> Tuple[str, List[int]]:
+    """
+    Copy of `sql` with string literals, quoted identifiers and comments blanked out
+    (same length, so offsets line up), plus the parenthesis depth of every character.
+    """
+    out = []
+    depth = []
+    level = 0
+    i = 0
+    n = len(sql)
+    while i < n:
+        ch = sql[i]
+        if ch in ("'", '"'):
+            j = i + 1
+            while j < n:
+                if sql[j] == ch:
+                    if j + 1 < n and sql[j + 1] == ch:
+                        j += 2
+                        continue
+                    break
+                j += 1
+            if j >= n:
+                raise SQLGuardError("syntax", "Unterminated quoted string in SQL")
+            # Keep the quotes so the statement shape is still recognisable
+            out.append(ch + " " * (j - i - 1) + ch)
+            depth.extend([level] * (j - i + 1))
+            i = j + 1
+            continue
+        if sql.startswith("--", i):
+            j = sql.find("\n", i)
+            j = n if j == -1 else j
+            out.append(" " * (j - i))
+            depth.extend([level] * (j - i))
+            i = j
+            continue
+        if sql.startswith("/*", i):
+            j = sql.find("*/", i + 2)
+            j = n if j == -1 else j + 2
+            out.append(" " * (j - i))
+            depth.extend([level] * (j - i))
+            i = j
+            continue
+        if ch == "(":
+            level += 1
+        elif ch == ")":
+            level -= 1
+            if level < 0:
+                raise SQLGuardError("syntax", "Unbalanced parentheses in SQL")
+        out.append(ch)
+        depth.append(level)
+        i += 1
+    if level != 0:
+        raise SQLGuardError("syntax", "Unbalanced parentheses in SQL")
+    return "".join(out), depth
+
+
+def _is_table_ref(masked: str, depth: List[int], pos: int) -> bool:
+    """FROM/JOIN at `pos` names a relation unless it sits inside a function call (EXTRACT(year FROM d))."""
+    if re.search(r"\bdistinct\s*$", masked[:pos], re.IGNORECASE):
+        return False  # IS DISTINCT FROM
+    level = depth[pos]
+    if level == 0:
+        return True
+    start = max(k for k in range(pos) if masked[k] == "(" and depth[k] == level)
+    return bool(re.match(r"\s*(select|with)\b", masked[start + 1:], re.IGNORECASE))
+
+
+def _comma_relations(masked: str, depth: List[int], start: int) -> List[Tuple[str, bool]]:
+    """
+    Relations after the commas of the FROM list that begins at `start`
+    (FROM a, b JOIN c ON ..., d): (name, is a function call). Subqueries are
+    skipped here; their own FROM clauses are checked separately.
+    """
+    if start >= len(masked):
+        # The relation name ends the statement (SELECT * FROM t)
+        return []
+    level = depth[start]
+    end = len(masked)
+    for m in FROM_END_RE.finditer(masked, start):
+        if depth[m.start()] == level:
+            end = m.start()
+            break
+    for k in range(start, end):
+        if depth[k] < level:
+            end = k
+            break
+    relations = []
+    for k in range(start, end):
+        if masked[k] == "," and depth[k] == level:
+            m = COMMA_RELATION_RE.match(masked, k + 1)
+            if m:
+                relations.append((m.group(1), bool(m.group(2))))
+    return relations
+
+
+def guard_sql(sql: str, allowed_tables: Iterable[str], max_rows: Optional[int] = None) -> str:
+    """
+    Validate an LLM-written statement and return the SQL to execute.
+
+    Only a single read-only SELECT (optionally with CTEs) over `allowed_tables` is
+    accepted. A top-level LIMIT (or FETCH FIRST) of at most `max_rows` is enforced:
+    LIMIT is added when neither is present, and a larger cap is lowered. Raises SQLGuardError describing the violation otherwise.
+    """
+    allowed = {t.lower() for t in allowed_tables}
+    max_rows = settings.SQL_MAX_ROWS if max_rows is None else max_rows
+    sql = (sql or "").strip()
+    masked, depth = mask_sql(sql)
+
+    # A single trailing semicolon is fine; anything after it is a second statement
+    stripped = masked.rstrip()
+    if stripped.endswith(";"):
+        sql = sql[:len(stripped) - 1].rstrip()
+        masked, depth = masked[:len(sql)], depth[:len(sql)]
+    if not sql:
+        raise SQLGuardError("empty", "No SQL statement was provided")
+    if ";" in masked:
+        raise SQLGuardError("multiple_statements", "Only one SQL statement may be run per call",
+                            "Split the work into separate query_supabase calls.")
+
+    words = [w.lower() for w in WORD_RE.findall(masked)]
+    if not words:
+        raise SQLGuardError("empty", "No SQL statement was provided")
+    if words[0] not in ("select", "with"):
+        raise SQLGuardError("not_select", f"Only SELECT queries are allowed, got {words[0].upper()}")
+    bad = sorted(FORBIDDEN_KEYWORDS.intersection(words))
+    if bad:
+        raise SQLGuardError("read_only", f"Statement contains disallowed keyword(s): {', '.join(bad).upper()}",
+                            "Queries are read-only; use a plain SELECT.")
+    for fn in FORBIDDEN_FUNCTIONS:
+        if fn in words:
+            raise SQLGuardError("read_only", f"Function {fn} is not allowed")
+    if "for" in words and re.search(r"\bfor\s+(update|share|no\s+key|key)\b", masked, re.IGNORECASE):
+        raise SQLGuardError("read_only", "Row locking clauses are not allowed")
+
+    ctes = {m.group(1).lower() for m in CTE_RE.finditer(masked)}
+    relations = []
+    for m in TABLE_REF_RE.finditer(masked):
+        if not _is_table_ref(masked, depth, m.start()):
+            continue
+        relations.append((m.group(2), bool(m.group(3))))
+        if m.group(1).lower() == "from":
+            # FROM a, b: every comma-separated relation is checked, not just the first
+            relations.extend(_comma_relations(masked, depth, m.end(2)))
+    for raw_name, is_call in relations:
+        name = raw_name.strip('"').lower()
+        if is_call or name in ctes:
+            # FROM unnest(...) / FROM generate_series(...): a function, not a table
+            continue
+        if name.split(".")[-1] not in allowed or name.split(".")[0] in ("pg_catalog", "information_schema"):
+            raise SQLGuardError("unknown_table", f"Table {name} is not available",
+                                f"Query only: {', '.join(sorted(allowed))}.")
+
+    if not max_rows:
+        return sql
+    top_fetches = [m for m in FETCH_RE.finditer(masked) if depth[m.start()] == 0]
+    if top_fetches:
+        # FETCH FIRST n ROWS ONLY is the row cap; adding LIMIT as well would be invalid
+        m = top_fetches[-1]
+        if m.group(1) and int(m.group(1)) > max_rows:
+            return f"{sql[:m.start(1)]}{max_rows} {sql[m.end(1):]}"
+        return sql
+    top_limits = [m for m in LIMIT_RE.finditer(masked) if depth[m.start()] == 0]
+    if not top_limits:
+        return f"{sql}\nLIMIT {max_rows}"
+    m = top_limits[-1]
+    if m.group(1).lower() == "all" or int(m.group(1)) > max_rows:
+        return f"{sql[:m.start(1)]}{max_rows}{sql[m.end(1):]}"
+    return sql
+
+
+def check_plan_cost(sql: str, backend: Any, max_cost: Optional[float] = None) -> Optional[float]:
+    """
+    Reject the statement when the planner's estimated total cost is above `max_cost`.
+    Backends that cannot estimate cost (explain_cost returns None) are not checked.
+    """
+    max_cost = settings.SQL_MAX_PLAN_COST if max_cost is None else max_cost
+    if not max_cost:
+        return None
+    cost = backend.explain_cost(sql)
+    if cost is not None and cost > max_cost:
+        raise SQLGuardError(
+            "too_expensive",
+            f"Estimated query cost {cost:.0f} exceeds the limit of {max_cost:.0f}",
+            "Filter on molecule/region/year (or other indexed columns), avoid correlated subqueries, "
+            "and aggregate instead of returning raw rows.",
+        )
+    return cost
@@ -0,0 +1,243 @@
+import json
+import os
+import re
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.config.settings import settings
+from app.utils.text_ranking import tokenize
+
+YEAR_RE = re.compile(r"\b(19\d{2}|20\d{2})\b")
+LIMIT_RE = re.compile(r"\btop[\s-]+(\d{1,4})\b|\b(\d{1,4})\s+(?:top|best|largest|leading|biggest)\b", re.IGNORECASE)
+SQL_LITERAL_RE = re.compile(r"'((?:[^']|'')*)'")
+SQL_LIMIT_RE = re.compile(r"\bLIMIT\s+(\d+)\b", re.IGNORECASE)
+SLOT_RE = re.compile(r"\{\{(\w+?)(\d*)\}\}")
+
+
+def sql_literal(value: str) -> str:
+    return value.replace("'", "''")
+
+
+class PlanCache:
+    """
+    Maps natural-language questions to parameterized SQL templates learned from
+    previous LLM generations, so recurring question shapes skip the LLM.
+
+    A question is reduced to an intent key: its tokens with entity mentions (known
+    values of `entity_columns`, years, top-N limits) replaced by slot names. The SQL
+    generated for it is stored with the same entities replaced by `{{slot}}` markers.
+    A later question with the same intent key and the same slot types is answered by
+    filling the template with its own entities.
+    """
+
+    def __init__(self, namespace: str, entity_columns: List[str], table: str,
+                 loader: Optional[Callable[[str], Any]] = None, path: Optional[str] = None):
+        self.namespace = namespace
+        self.entity_columns = entity_columns
+        self.table = table
+        self.loader = loader
+        self.path = path
+        self.templates: Dict[str, str] = {}
+        # column -> {lowercase value: canonical value}
+        self.vocab: Dict[str, Dict[str, str]] = {c: {} for c in entity_columns}
+        self.stats = {"hits": 0, "misses": 0, "stored": 0}
+        self._seeded = False
+        self._lock = threading.Lock()
+        self._load()
+
+    # Persistence
+
+    def _load(self) -> None:
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+            self.templates = data.get("templates", {})
+            for col, values in data.get("vocab", {}).items():
+                self.vocab.setdefault(col, {}).update({v.lower(): v for v in values})
+        except (OSError, ValueError) as e:
+            print(f"Plan cache {self.namespace}: ignoring unreadable {self.path}: {e}")
+
+    def _save(self) -> None:
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump({
+                "templates": self.templates,
+                "vocab": {c: sorted(v.values()) for c, v in self.vocab.items()},
+            }, f)
+        os.replace(tmp, self.path)
+
+    def _seed_vocab(self) -> None:
+        """Load distinct entity values from the table once (best effort)."""
+        if self._seeded or self.loader is None:
+            return
+        self._seeded = True
+        for col in self.entity_columns:
+            rows = self.loader(f"SELECT DISTINCT {col} FROM {self.table}")
+            if isinstance(rows, list):
+                for row in rows:
+                    value = row.get(col)
+                    if isinstance(value, str) and value.strip():
+                        self.vocab[col][value.strip().lower()] = value.strip()
+
+    # Matching
+
+    def extract(self, question: str) -> Tuple[str, Dict[str, str]]:
+        """Intent key and slot values ({"molecule0": "Metformin", "year0": "2023", ...})."""
+        text = question.lower()
+        slots: Dict[str, str] = {}
+        spans: List[Tuple[int, int, str]] = []
+
+        candidates = [
+            (value, canonical, col)
+            for col in self.entity_columns
+            for value, canonical in self.vocab[col].items()
+        ]
+        # Longest names first so "insulin glargine" wins over "insulin"
+        candidates.sort(key=lambda c: len(c[0]), reverse=True)
+        counters: Dict[str, int] = {}
+        for value, canonical, col in candidates:
+            for m in re.finditer(rf"(?<![a-z0-9]){re.escape(value)}(?![a-z0-9])", text):
+                if any(m.start() < e and m.end() > s for s, e, _ in spans):
+                    continue
+                spans.append((m.start(), m.end(), col))
+        spans.sort()
+        # (start, end, replacement token) for every entity mention in the question
+        mentions = []
+        for s, e, col in spans:
+            n = counters.get(col, 0)
+            counters[col] = n + 1
+            slots[f"{col}{n}"] = self.vocab[col][text[s:e]]
+            mentions.append((s, e, f"{col}{n}"))
+
+        for m in LIMIT_RE.finditer(text):
+            slots["limit"] = m.group(1) or m.group(2)
+            mentions.append((m.start(), m.end(), "top limit"))
+        years = 0
+        for m in YEAR_RE.finditer(text):
+            if not any(m.start() >= s and m.end() <= e for s, e, _ in mentions):
+                slots[f"year{years}"] = m.group(1)
+                mentions.append((m.start(), m.end(), f"year{years}"))
+                years += 1
+
+        for s, e, token in sorted(mentions, reverse=True):
+            text = f"{text[:s]} {token} {text[e:]}"
+        key = " ".join(sorted(set(tokenize(text))))
+        return key, slots
+
+    def _template_from_sql(self, sql: str, slots: Dict[str, str]) -> Optional[str]:
+        """Replace slot values in the SQL with markers; None if the SQL is not cleanly parameterizable."""
+        by_value = {v.lower(): k for k, v in slots.items() if not k.startswith(("year", "limit"))}
+        used = set()
+        known = {v for col in self.entity_columns for v in self.vocab[col]}
+
+        def literal(m):
+            raw = m.group(1)
+            bare = raw.replace("''", "'").strip("%").lower()
+            if bare in by_value:
+                used.add(by_value[bare])
+                return "'" + raw.lower().replace(bare.replace("'", "''"), "{{" + by_value[bare] + "}}") + "'"
+            if bare in known:
+                raise ValueError("hard-coded entity")
+            return m.group(0)
+
+        try:
+            template = SQL_LITERAL_RE.sub(literal, sql)
+        except ValueError:
+            return None
+
+        for slot, value in slots.items():
+            if slot.startswith("year") and re.search(rf"\b{value}\b", template):
+                template = re.sub(rf"\b{value}\b", "{{" + slot + "}}", template)
+                used.add(slot)
+        if "limit" in slots:
+            m = SQL_LIMIT_RE.search(template)
+            if m and m.group(1) == slots["limit"]:
+                template = template[:m.start(1)] + "{{limit}}" + template[m.end(1):]
+                used.add("limit")
+        return template if used == set(slots) else None
+
+    def lookup(self, question: str) -> Optional[str]:
+        """Filled SQL for a cached question shape, or None on a miss."""
+        with self._lock:
+            self._seed_vocab()
+            key, slots = self.extract(question)
+            template = self.templates.get(key)
+            if template is None or set(m.group(1) + m.group(2) for m in SLOT_RE.finditer(template)) != set(slots):
+                self.stats["misses"] += 1
+                return None
+            self.stats["hits"] += 1
+        return self._fill(template, slots)
+
+    @staticmethod
+    def _fill(template: str, slots: Dict[str, str]) -> str:
+        def fill(m):
+            value = slots[m.group(1) + m.group(2)]
+            return str(int(value)) if m.group(1) in ("year", "limit") else sql_literal(value)
+
+        return SLOT_RE.sub(fill, template)
+
+    def render(self, slots: Dict[str, str]) -> List[str]:
+        """Every learned template whose slots are exactly `slots`, filled (used to pre-warm results)."""
+        with self._lock:
+            templates = [
+                t for t in self.templates.values()
+                if set(m.group(1) + m.group(2) for m in SLOT_RE.finditer(t)) == set(slots)
+            ]
+        return [self._fill(t, slots) for t in templates]
+
+    def learn(self, question: str, sql: str) -> bool:
+        """Store the template for a question whose LLM-generated SQL ran successfully."""
+        with self._lock:
+            # Entity values the LLM used teach the vocabulary for future questions
+            for col in self.entity_columns:
+                for m in re.finditer(rf"\b{col}\s*(?:=|ILIKE|LIKE)\s*'((?:[^']|'')*)'", sql, re.IGNORECASE):
+                    value = m.group(1).replace("''", "'").strip("%").strip()
+                    if value and value.lower() in question.lower():
+                        self.vocab[col].setdefault(value.lower(), value)
+            key, slots = self.extract(question)
+            if not key:
+                return False
+            template = self._template_from_sql(sql, slots)
+            if template is None:
+                return False
+            self.templates[key] = template
+            self.stats["stored"] += 1
+            self._save()
+            return True
+
+    def report(self) -> Dict[str, Any]:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            "namespace": self.namespace,
+            "templates": len(self.templates),
+            **self.stats,
+            "hit_rate": round(self.stats["hits"] / lookups, 3) if lookups else 0.0,
+        }
+
+
+_caches: Dict[str, PlanCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_plan_cache(namespace: str, entity_columns: List[str], table: str) -> Optional[PlanCache]:
+    """Process-wide cache for one agent, or None when SQL_PLAN_CACHE_DIR is empty."""
+    if not settings.SQL_PLAN_CACHE_DIR:
+        return None
+    with _caches_lock:
+        if namespace not in _caches:
+            from app.tools.supabase_tool import run_query
+
+            _caches[namespace] = PlanCache(
+                namespace, entity_columns, table, loader=run_query,
+                path=os.path.join(settings.SQL_PLAN_CACHE_DIR, f"{namespace}.json"),
+            )
+        return _caches[namespace]
+
+
+def plan_cache_stats() -> List[Dict[str, Any]]:
+    return [cache.report() for cache in _caches.values()]
@@ -0,0 +1,252 @@
+import hashlib
+import json
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional
+
+import pandas as pd
+
+from app.config.settings import settings
+from app.tools.sql_backends import LOCAL_SCHEMA, DuckDBBackend, SQLBackend
+from app.tools.sql_guard import check_plan_cost
+
+REPLICA_META = """
+CREATE TABLE IF NOT EXISTS replica_meta (
+    table_name TEXT PRIMARY KEY,
+    data_version TEXT,
+    row_count BIGINT,
+    synced_at TIMESTAMP
+)
+"""
+
+
+class ReplicaBackend(SQLBackend):
+    """
+    In-process DuckDB copy of iqvia_sales and patents in front of the remote backend.
+
+    `sync()` streams each table from the remote into a staging table and swaps it in,
+    recording a content checksum as the table's data version. While every table has
+    been synced within `max_age_hours`, queries run locally; stale tables, and
+    statements DuckDB cannot run, go to the remote backend instead. A statement that
+    falls back passes the remote EXPLAIN cost ceiling first, as it would without the
+    replica (explain_cost reports no cost while the replica is fresh).
+    """
+
+    name = "replica"
+
+    def __init__(self, remote: SQLBackend, path: str, max_age_hours: float = 24,
+                 tables: Iterable[str] = tuple(LOCAL_SCHEMA), timeout_ms: Optional[int] = None):
+        self.remote = remote
+        self.local = DuckDBBackend(path, default_timeout_ms=timeout_ms)
+        self.tables = list(tables)
+        self.max_age = timedelta(hours=max_age_hours)
+        self.stats = {"local": 0, "remote": 0, "fallbacks": 0}
+        self._sync_lock = threading.Lock()
+        self.local._db.execute(REPLICA_META)
+        self._meta = self._read_meta()
+
+    # Metadata
+
+    def _read_meta(self) -> Dict[str, Dict[str, Any]]:
+        rows = self.local.fetch("SELECT * FROM replica_meta")
+        return {row["table_name"]: row for row in rows}
+
+    def status(self) -> Dict[str, Any]:
+        now = datetime.now()
+        tables = {}
+        for table in self.tables:
+            meta = self._meta.get(table)
+            synced_at = datetime.fromisoformat(meta["synced_at"]) if meta else None
+            tables[table] = {
+                "data_version": meta["data_version"] if meta else None,
+                "row_count": meta["row_count"] if meta else 0,
+                "synced_at": meta["synced_at"] if meta else None,
+                "fresh": synced_at is not None and now - synced_at < self.max_age,
+            }
+        return {"fresh": self.is_fresh(), "data_version": self.data_version(), "tables": tables, **self.stats}
+
+    def is_fresh(self) -> bool:
+        now = datetime.now()
+        for table in self.tables:
+            meta = self._meta.get(table)
+            if meta is None or now - datetime.fromisoformat(meta["synced_at"]) >= self.max_age:
+                return False
+        return True
+
+    def oldest_sync_age(self) -> Optional[timedelta]:
+        """Age of the least recently synced table, or None if some table was never synced."""
+        if any(t not in self._meta for t in self.tables):
+            return None
+        oldest = min(datetime.fromisoformat(self._meta[t]["synced_at"]) for t in self.tables)
+        return datetime.now() - oldest
+
+    def table_versions(self) -> Dict[str, Optional[str]]:
+        return {t: (self._meta.get(t) or {}).get("data_version") for t in self.tables}
+
+    def data_version(self) -> str:
+        """Combined version of the replicated tables; changes whenever a sync changes any data."""
+        return "|".join(f"{t}@{(self._meta.get(t) or {}).get('data_version') or 'none'}" for t in self.tables)
+
+    # Sync
+
+    def sync_table(self, table: str, batch_size: int = 5000) -> Dict[str, Any]:
+        staging = f"{table}__staging"
+        # Own connection handle: sync runs on the scheduler thread while queries use theirs
+        db = self.local._db.cursor()
+        db.execute(f"DROP TABLE IF EXISTS {staging}")
+        db.execute(LOCAL_SCHEMA[table].replace(f"TABLE IF NOT EXISTS {table}", f"TABLE {staging}"))
+        columns = [row[0] for row in db.execute(f"DESCRIBE {staging}").fetchall()]
+
+        checksum = hashlib.sha256()
+        count = 0
+        for batch in self.remote.iter_rows(f"SELECT * FROM {table}", batch_size=batch_size):
+            df = pd.DataFrame(batch)
+            cols = [c for c in columns if c in df.columns]
+            checksum.update(json.dumps(df[cols].values.tolist(), default=str).encode())
+            db.register("replica_batch", df[cols])
+            db.execute(f"INSERT INTO {staging} ({', '.join(cols)}) SELECT {', '.join(cols)} FROM replica_batch")
+            db.unregister("replica_batch")
+            count += len(df)
+
+        version = checksum.hexdigest()[:16]
+        synced_at = datetime.now().isoformat()
+        db.execute("BEGIN TRANSACTION")
+        try:
+            db.execute(f"DROP TABLE IF EXISTS {table}")
+            db.execute(f"ALTER TABLE {staging} RENAME TO {table}")
+            db.execute(
+                "INSERT OR REPLACE INTO replica_meta (table_name, data_version, row_count, synced_at) VALUES (?, ?, ?, ?)",
+                [table, version, count, synced_at],
+            )
+            db.execute("COMMIT")
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+        finally:
+            db.close()
+        return {"table": table, "rows": count, "data_version": version, "synced_at": synced_at}
+
+    def sync(self, tables: Optional[Iterable[str]] = None) -> List[Dict[str, Any]]:
+        """Copy the given tables (default: all) from the remote backend."""
+        with self._sync_lock:
+            results = []
+            for table in tables or self.tables:
+                started = time.monotonic()
+                result = self.sync_table(table)
+                result["seconds"] = round(time.monotonic() - started, 2)
+                print(f"Replica synced {table}: {result['rows']} rows, version {result['data_version']}")
+                results.append(result)
+            self._meta = self._read_meta()
+            return results
+
+    # Queries
+
+    def _fall_back(self, sql, params, error: Exception) -> None:
+        self.stats["fallbacks"] += 1
+        print(f"Replica could not run query, using remote: {error}")
+        if not params:
+            # Agent SQL is unparameterized; raises SQLGuardError above SQL_MAX_PLAN_COST
+            check_plan_cost(sql, self.remote)
+
+    def fetch(self, sql, params=None, timeout_ms=None):
+        if self.is_fresh():
+            try:
+                rows = self.local.fetch(sql, params, timeout_ms)
+                self.stats["local"] += 1
+                return rows
+            except Exception as e:
+                # Postgres-only syntax or functions DuckDB does not have
+                self._fall_back(sql, params, e)
+        self.stats["remote"] += 1
+        return self.remote.fetch(sql, params, timeout_ms)
+
+    def iter_rows(self, sql, params=None, timeout_ms=None, batch_size=500):
+        if self.is_fresh():
+            batches = self.local.iter_rows(sql, params, timeout_ms, batch_size)
+            try:
+                # Unsupported statements fail on execute, i.e. before the first batch
+                first = next(batches, None)
+            except Exception as e:
+                self._fall_back(sql, params, e)
+            else:
+                self.stats["local"] += 1
+                if first is not None:
+                    yield first
+                    yield from batches
+                return
+        self.stats["remote"] += 1
+        yield from self.remote.iter_rows(sql, params, timeout_ms, batch_size)
+
+    def explain_cost(self, sql):
+        # Local scans are cheap; only queries that go to the remote need the cost check
+        return None if self.is_fresh() else self.remote.explain_cost(sql)
+
+    def close(self):
+        self.local.close()
+        self.remote.close()
+
+
+SCHEDULER_POLL_SECONDS = 600
+
+
+def start_sync_scheduler(replica: ReplicaBackend, interval_hours: float) -> threading.Thread:
+    """
+    Background thread that syncs when the replica is stale and, if `interval_hours` > 0,
+    whenever the last sync is older than that. With interval 0 it only brings a stale
+    replica up to date once at startup; later syncs are on demand.
+    """
+
+    def loop():
+        while True:
+            age = replica.oldest_sync_age()
+            due = age is None or age >= replica.max_age or (
+                interval_hours > 0 and age >= timedelta(hours=interval_hours)
+            )
+            if due:
+                try:
+                    replica.sync()
+                except Exception as e:
+                    print(f"Replica sync failed: {e}")
+            if interval_hours <= 0:
+                return
+            time.sleep(SCHEDULER_POLL_SECONDS)
+
+    thread = threading.Thread(target=loop, name="sql-replica-sync", daemon=True)
+    thread.start()
+    return thread
+
+
+def create_replica(remote: SQLBackend) -> ReplicaBackend:
+    return ReplicaBackend(
+        remote,
+        settings.SQL_REPLICA_PATH,
+        max_age_hours=settings.SQL_REPLICA_MAX_AGE_HOURS,
+        timeout_ms=settings.SQL_STATEMENT_TIMEOUT_MS,
+    )
+
+
+def main():
+    import argparse
+
+    from app.tools.sql_backends import create_sql_backend
+
+    parser = argparse.ArgumentParser(
+        description="Local DuckDB replica of iqvia_sales and patents (stop the server first; "
+                    "while it runs use POST /api/sql-replica/sync)"
+    )
+    parser.add_argument("command", choices=["sync", "status"])
+    parser.add_argument("--table", action="append", choices=sorted(LOCAL_SCHEMA))
+    args = parser.parse_args()
+    if not settings.SQL_REPLICA_PATH:
+        raise SystemExit("SQL_REPLICA_PATH is not set")
+    backend = create_replica(create_sql_backend(settings.SQL_BACKEND))
+    if args.command == "sync":
+        for result in backend.sync(args.table):
+            print(result)
+    else:
+        print(json.dumps(backend.status(), indent=2, default=str))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,308 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+from app.config.settings import settings
+from app.tools.sql_backends import LOCAL_SCHEMA
+
+SQL_TOKEN_RE = re.compile(r"'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"|\s+|[^\s'\"]+")
+# Backend messages for a missing column (Postgres/Supabase, SQLite, DuckDB)
+MISSING_COLUMN_RE = re.compile(
+    r"column .* does not exist|no such column|referenced column .* not found|not found in from clause", re.IGNORECASE
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    key TEXT PRIMARY KEY,
+    sql TEXT,
+    tables TEXT,
+    versions TEXT,
+    payload TEXT,
+    created_at REAL,
+    hits INTEGER DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_results_created ON results(created_at);
+CREATE TABLE IF NOT EXISTS table_versions (
+    table_name TEXT PRIMARY KEY,
+    counter INTEGER
+);
+"""
+
+
+def normalize_sql(sql: str) -> str:
+    """Lowercase everything outside quotes, collapse whitespace and drop a trailing semicolon."""
+    parts = []
+    for token in SQL_TOKEN_RE.findall(sql.strip().rstrip(";").strip()):
+        if token.isspace():
+            parts.append(" ")
+        elif token[0] in ("'", '"'):
+            parts.append(token)
+        else:
+            parts.append(token.lower())
+    return "".join(parts)
+
+
+def is_missing_column(error: Exception) -> bool:
+    return type(error).__name__ == "UndefinedColumnError" or bool(MISSING_COLUMN_RE.search(str(error)))
+
+
+def tables_read(normalized_sql: str, tables: Iterable[str] = tuple(LOCAL_SCHEMA)) -> List[str]:
+    unquoted = re.sub(r"'(?:[^']|'')*'", "''", normalized_sql)
+    return sorted(t for t in tables if re.search(rf"\b{t}\b", unquoted))
+
+
+class SQLResultCache:
+    """
+    Result cache for read queries, keyed on normalized SQL text plus bound parameters.
+
+    Each entry records the data version of every table it reads. A table's version
+    combines a counter that data loaders bump (bump_table_version) with the replica's
+    per-table checksum when the local replica is active, or else a cheap probe query
+    (SQL_CACHE_VERSION_PROBE, count(*) by default; max(updated_at) where tables have it)
+    re-run at most every SQL_CACHE_PROBE_SECONDS. Entries whose versions no longer match
+    are dropped. When the versions cannot be read, the query runs uncached.
+
+    Two tiers: an in-process LRU bounded by entry count and bytes, and a SQLite file
+    shared by all worker processes, bounded by `max_shared_entries` (oldest evicted first).
+    """
+
+    def __init__(self, path: Optional[str], max_entries: int = 512, max_bytes: int = 64 * 1024 * 1024,
+                 max_entry_bytes: int = 2 * 1024 * 1024, probe_seconds: float = 30,
+                 probe: str = "count(*)", max_shared_entries: int = 10000):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_shared_entries = max_shared_entries
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self.probe_seconds = probe_seconds
+        self.probe = probe
+        self.memory: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.memory_bytes = 0
+        self.stats = {"memory_hits": 0, "shared_hits": 0, "misses": 0, "invalidated": 0, "stored": 0,
+                      "bypassed": 0}
+        self._probed: Dict[str, tuple] = {}
+        self._no_probe_column: set = set()
+        self._lock = threading.Lock()
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            with self._connect() as conn:
+                conn.executescript(SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    # Table versions
+
+    def _counter(self, table: str) -> int:
+        if not self.path:
+            return 0
+        with self._connect() as conn:
+            row = conn.execute("SELECT counter FROM table_versions WHERE table_name = ?", (table,)).fetchone()
+        return row[0] if row else 0
+
+    def bump(self, table: str) -> None:
+        """Mark a table's data as changed (called by loaders after writing it)."""
+        if self.path:
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT INTO table_versions (table_name, counter) VALUES (?, 1) "
+                    "ON CONFLICT(table_name) DO UPDATE SET counter = counter + 1",
+                    (table,),
+                )
+        self._probed.pop(table, None)
+
+    def _probe_version(self, table: str, backend: Any) -> str:
+        cached = self._probed.get(table)
+        if cached and time.monotonic() - cached[0] < self.probe_seconds:
+            return cached[1]
+        version = None
+        if table not in self._no_probe_column:
+            try:
+                rows = backend.fetch(f"SELECT {self.probe} AS version FROM {table}")
+                version = str(rows[0]["version"]) if rows else ""
+            except Exception as e:
+                if not is_missing_column(e):
+                    # Timeouts and connection errors are not a reason to give up on the probe;
+                    # the caller runs this query uncached
+                    raise
+                # No such column on this table: fall back to the row count from now on
+                self._no_probe_column.add(table)
+        if version is None:
+            rows = backend.fetch(f"SELECT count(*) AS version FROM {table}")
+            version = f"n={rows[0]['version']}"
+        self._probed[table] = (time.monotonic(), version)
+        return version
+
+    def _versions_or_none(self, tables: Iterable[str]) -> Optional[Dict[str, str]]:
+        try:
+            return self.current_versions(tables)
+        except Exception as e:
+            print(f"SQL result cache bypassed, table versions unavailable: {e}")
+            with self._lock:
+                self.stats["bypassed"] += 1
+            return None
+
+    def current_versions(self, tables: Iterable[str]) -> Dict[str, str]:
+        from app.tools.sql_backends import get_sql_backend
+
+        backend = get_sql_backend()
+        replica_versions = backend.table_versions() if hasattr(backend, "table_versions") else None
+        versions = {}
+        for table in tables:
+            if replica_versions is not None:
+                data = replica_versions.get(table) or "none"
+            else:
+                data = self._probe_version(table, backend)
+            versions[table] = f"{self._counter(table)}:{data}"
+        return versions
+
+    # Entries
+
+    @staticmethod
+    def key(normalized: str, params: Optional[Sequence[Any]]) -> str:
+        material = normalized + "\x00" + json.dumps(list(params or []), default=str)
+        return hashlib.sha256(material.encode()).hexdigest()
+
+    def _remember(self, key: str, entry: Dict[str, Any]) -> None:
+        old = self.memory.pop(key, None)
+        if old:
+            self.memory_bytes -= old["size"]
+        self.memory[key] = entry
+        self.memory_bytes += entry["size"]
+        while self.memory and (len(self.memory) > self.max_entries or self.memory_bytes > self.max_bytes):
+            _, evicted = self.memory.popitem(last=False)
+            self.memory_bytes -= evicted["size"]
+
+    def _forget(self, key: str) -> None:
+        old = self.memory.pop(key, None)
+        if old:
+            self.memory_bytes -= old["size"]
+        if self.path:
+            with self._connect() as conn:
+                conn.execute("DELETE FROM results WHERE key = ?", (key,))
+
+    def get(self, sql: str, params: Optional[Sequence[Any]] = None) -> Optional[Any]:
+        normalized = normalize_sql(sql)
+        tables = tables_read(normalized)
+        if not tables:
+            return None
+        key = self.key(normalized, params)
+        current = self._versions_or_none(tables)
+        if current is None:
+            return None
+
+        with self._lock:
+            entry = self.memory.get(key)
+            if entry is not None:
+                if entry["versions"] == current:
+                    self.memory.move_to_end(key)
+                    self.stats["memory_hits"] += 1
+                    return json.loads(entry["payload"])
+                self.stats["invalidated"] += 1
+                self.stats["misses"] += 1
+                self._forget(key)
+                return None
+
+        if self.path:
+            with self._connect() as conn:
+                row = conn.execute("SELECT versions, payload FROM results WHERE key = ?", (key,)).fetchone()
+                if row is not None and json.loads(row[0]) == current:
+                    conn.execute("UPDATE results SET hits = hits + 1 WHERE key = ?", (key,))
+            if row is not None:
+                with self._lock:
+                    if json.loads(row[0]) != current:
+                        self.stats["invalidated"] += 1
+                        self._forget(key)
+                    else:
+                        self.stats["shared_hits"] += 1
+                        self._remember(key, {"versions": current, "payload": row[1], "size": len(row[1])})
+                        return json.loads(row[1])
+        self.stats["misses"] += 1
+        return None
+
+    def put(self, sql: str, result: Any, params: Optional[Sequence[Any]] = None) -> bool:
+        normalized = normalize_sql(sql)
+        tables = tables_read(normalized)
+        if not tables:
+            return False
+        payload = json.dumps(result, default=str)
+        if len(payload) > self.max_entry_bytes:
+            return False
+        key = self.key(normalized, params)
+        versions = self._versions_or_none(tables)
+        if versions is None:
+            return False
+        with self._lock:
+            self._remember(key, {"versions": versions, "payload": payload, "size": len(payload)})
+            self.stats["stored"] += 1
+        if self.path:
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO results (key, sql, tables, versions, payload, created_at, hits) "
+                    "VALUES (?, ?, ?, ?, ?, ?, 0)",
+                    (key, normalized, ",".join(tables), json.dumps(versions), payload, time.time()),
+                )
+                conn.execute(
+                    "DELETE FROM results WHERE key IN "
+                    "(SELECT key FROM results ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+                    (self.max_shared_entries,),
+                )
+        return True
+
+    def report(self) -> Dict[str, Any]:
+        lookups = self.stats["memory_hits"] + self.stats["shared_hits"] + self.stats["misses"]
+        hits = self.stats["memory_hits"] + self.stats["shared_hits"]
+        shared_entries = 0
+        if self.path:
+            with self._connect() as conn:
+                shared_entries = conn.execute("SELECT count(*) FROM results").fetchone()[0]
+        return {
+            "memory_entries": len(self.memory),
+            "memory_bytes": self.memory_bytes,
+            "shared_entries": shared_entries,
+            **self.stats,
+            "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+        }
+
+
+_cache: Optional[SQLResultCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_result_cache() -> Optional[SQLResultCache]:
+    """Process-wide cache, or None when SQL_CACHE_MAX_ENTRIES is 0."""
+    global _cache
+    if settings.SQL_CACHE_MAX_ENTRIES <= 0:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = SQLResultCache(
+                settings.SQL_CACHE_PATH or None,
+                max_entries=settings.SQL_CACHE_MAX_ENTRIES,
+                max_bytes=settings.SQL_CACHE_MAX_MB * 1024 * 1024,
+                probe_seconds=settings.SQL_CACHE_PROBE_SECONDS,
+                probe=settings.SQL_CACHE_VERSION_PROBE,
+                max_shared_entries=settings.SQL_CACHE_SHARED_MAX_ENTRIES,
+            )
+    return _cache
+
+
+def bump_table_version(table: str) -> None:
+    """Invalidate cached results reading `table`; call after loading new data into it."""
+    cache = get_result_cache()
+    if cache is not None:
+        cache.bump(table)
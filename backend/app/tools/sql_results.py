@@ -0,0 +1,233 @@
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+import pandas as pd
+
+from app.config.settings import settings
+from app.tools.sql_guard import mask_sql
+
+# What to aggregate when a query on each table returns more rows than fit inline
+SUMMARY_PROFILES = {
+    "iqvia_sales": {
+        "group_by": ["molecule", "region"],
+        "top_k_columns": ["sales_value", "sales_volume", "cagr"],
+        # Growth rates are averaged per group; sales figures are summed
+        "mean_columns": ["cagr"],
+        "count_columns": [],
+        "year_columns": {},
+    },
+    "patents": {
+        "group_by": [],
+        "top_k_columns": [],
+        "mean_columns": [],
+        "count_columns": ["status", "jurisdiction"],
+        "year_columns": {"expiry_year": "expiration_date"},
+    },
+}
+TOP_K = 10
+MAX_HANDLES = 256
+HANDLE_TTL_SECONDS = 3600
+ORDER_BY_RE = re.compile(r"\border\s+by\b", re.IGNORECASE)
+ORDER_END_RE = re.compile(r"\b(limit|offset|fetch)\b", re.IGNORECASE)
+ORDER_ITEM_RE = re.compile(
+    r"\s*(?:[a-z_][a-z0-9_$]*\.)?(\"[^\"]+\"|[a-z_][a-z0-9_$]*|\d+)"
+    r"(\s+(?:asc|desc))?(\s+nulls\s+(?:first|last))?\s*$",
+    re.IGNORECASE,
+)
+
+
+def _add_counts(previous: Optional[pd.Series], counts: pd.Series) -> pd.Series:
+    return counts if previous is None else previous.add(counts, fill_value=0)
+
+
+class ResultSummary:
+    """
+    Streaming summary of a large result: keeps the first `sample_size` rows and
+    per-batch vectorized (pandas) partial aggregates, so memory stays bounded by the
+    number of distinct groups rather than the number of rows.
+    """
+
+    def __init__(self, profile: Dict[str, Any], sample_size: int, top_k: int = TOP_K):
+        self.profile = profile
+        self.sample_size = sample_size
+        self.top_k = top_k
+        self.row_count = 0
+        self.sample: List[Dict[str, Any]] = []
+        self.numeric: Dict[str, Dict[str, float]] = {}
+        self.groups: Dict[str, pd.DataFrame] = {}
+        self.counts: Dict[str, pd.Series] = {}
+
+    def add(self, rows: List[Dict[str, Any]]) -> None:
+        if not rows:
+            return
+        self.row_count += len(rows)
+        if len(self.sample) < self.sample_size:
+            self.sample.extend(rows[:self.sample_size - len(self.sample)])
+
+        df = pd.DataFrame(rows)
+        for col in df.select_dtypes("number").columns:
+            values = df[col].dropna()
+            if values.empty:
+                continue
+            stats = self.numeric.setdefault(col, {"count": 0, "sum": 0.0, "min": None, "max": None})
+            stats["count"] += int(values.count())
+            stats["sum"] += float(values.sum())
+            lo, hi = float(values.min()), float(values.max())
+            stats["min"] = lo if stats["min"] is None else min(stats["min"], lo)
+            stats["max"] = hi if stats["max"] is None else max(stats["max"], hi)
+
+        for key in self.profile["group_by"]:
+            columns = [c for c in self.profile["top_k_columns"] if c in df.columns and c in self.numeric]
+            if key not in df.columns or not columns:
+                continue
+            partial = df.groupby(key)[columns].agg(["sum", "count"])
+            previous = self.groups.get(key)
+            self.groups[key] = partial if previous is None else previous.add(partial, fill_value=0)
+
+        for col in self.profile["count_columns"]:
+            if col in df.columns:
+                self.counts[col] = _add_counts(self.counts.get(col), df[col].fillna("unknown").value_counts())
+        for name, col in self.profile["year_columns"].items():
+            if col in df.columns:
+                years = df[col].dropna().astype(str).str[:4]
+                self.counts[name] = _add_counts(self.counts.get(name), years.value_counts())
+
+    def aggregates(self) -> Dict[str, Any]:
+        columns = {
+            col: {
+                "count": s["count"],
+                "sum": s["sum"],
+                "mean": s["sum"] / s["count"] if s["count"] else None,
+                "min": s["min"],
+                "max": s["max"],
+            }
+            for col, s in self.numeric.items()
+        }
+
+        top_groups = {}
+        for key, table in self.groups.items():
+            for col in table.columns.get_level_values(0).unique():
+                means = col in self.profile["mean_columns"]
+                values = table[col]["sum"] / table[col]["count"] if means else table[col]["sum"]
+                top = values.dropna().sort_values(ascending=False).head(self.top_k)
+                top_groups[f"{key}.{col}"] = [
+                    {key: getattr(group, "item", lambda: group)(), ("mean" if means else "sum"): float(v)}
+                    for group, v in top.items()
+                ]
+
+        counts = {
+            name: {str(k): int(v) for k, v in series.sort_values(ascending=False).items()}
+            for name, series in self.counts.items()
+        }
+        return {"columns": columns, "top_groups": top_groups, "counts": counts}
+
+
+def summarize_stream(batches: Iterable[List[Dict[str, Any]]], table: Optional[str],
+                     threshold: Optional[int] = None, sample_size: Optional[int] = None):
+    """
+    Consume a batched row stream. Results with at most `threshold` rows come back as the
+    row list; larger ones as a ResultSummary (the remaining rows are aggregated, not kept).
+    """
+    threshold = settings.SQL_RESULT_ROW_THRESHOLD if threshold is None else threshold
+    sample_size = settings.SQL_RESULT_SAMPLE_SIZE if sample_size is None else sample_size
+    rows: List[Dict[str, Any]] = []
+    summary: Optional[ResultSummary] = None
+    for batch in batches:
+        if summary is not None:
+            summary.add(batch)
+            continue
+        rows.extend(batch)
+        if threshold and len(rows) > threshold:
+            summary = ResultSummary(SUMMARY_PROFILES.get(table, SUMMARY_PROFILES["iqvia_sales"]), sample_size)
+            summary.add(rows)
+            rows = []
+    return rows if summary is None else summary
+
+
+# Paging handles for summarized results
+
+_handles: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+_handles_lock = threading.Lock()
+
+
+def page_order(sql: str, columns: Sequence[str]) -> str:
+    """
+    ORDER BY for paging `sql` as a subquery: the leading items of its own top-level
+    ORDER BY that name an output column (or position), then every column by position,
+    so consecutive pages neither overlap nor skip rows.
+    """
+    masked, depth = mask_sql(sql)
+    items = []
+    starts = [m.end() for m in ORDER_BY_RE.finditer(masked) if depth[m.start()] == 0]
+    if starts:
+        end = next((m.start() for m in ORDER_END_RE.finditer(masked, starts[-1]) if depth[m.start()] == 0),
+                   len(masked))
+        bounds = [starts[-1]] + [k + 1 for k in range(starts[-1], end) if masked[k] == "," and depth[k] == 0]
+        known = {c.lower() for c in columns} | {f'"{c}"' for c in columns}
+        for lo, hi in zip(bounds, bounds[1:] + [end + 1]):
+            m = ORDER_ITEM_RE.match(sql[lo:hi - 1])
+            name = m.group(1) if m else None
+            if name is None or not (name.isdigit() or (name if name.startswith('"') else name.lower()) in known):
+                # An expression or a column the outer query cannot see: keep only the prefix
+                break
+            items.append("".join(g for g in m.groups() if g).strip())
+    items += [str(n) for n in range(1, len(columns) + 1)]
+    return ", ".join(items)
+
+
+def register_result(sql: str, row_count: int, columns: Sequence[str]) -> str:
+    handle = uuid.uuid4().hex[:12]
+    with _handles_lock:
+        _handles[handle] = {"sql": sql, "row_count": row_count, "order": page_order(sql, columns),
+                            "created": time.time()}
+        while len(_handles) > MAX_HANDLES:
+            _handles.popitem(last=False)
+    return handle
+
+
+def fetch_result_page(handle: str, offset: int = 0, limit: int = 100) -> Dict[str, Any]:
+    """Rows [offset, offset + limit) of a summarized result, re-read from the backend."""
+    from app.tools.supabase_tool import run_query
+
+    with _handles_lock:
+        entry = _handles.get(handle)
+    if entry is None or time.time() - entry["created"] > HANDLE_TTL_SECONDS:
+        return {"error": f"Unknown or expired result handle: {handle}", "code": "unknown_handle"}
+    offset = max(0, int(offset))
+    limit = max(1, min(int(limit), settings.SQL_RESULT_ROW_THRESHOLD or 1000))
+    order = f" ORDER BY {entry['order']}" if entry["order"] else ""
+    rows = run_query(f"SELECT * FROM ({entry['sql']}) AS page{order} LIMIT {limit} OFFSET {offset}")
+    if isinstance(rows, dict):
+        return rows
+    return {"handle": handle, "offset": offset, "limit": limit, "row_count": entry["row_count"], "rows": rows}
+
+
+def summary_payload(summary: ResultSummary, sql: str, max_rows: Optional[int]) -> Dict[str, Any]:
+    return {
+        "rows": summary.sample,
+        "row_count": summary.row_count,
+        # The guard's LIMIT was reached, so the database may hold more matching rows
+        "truncated": bool(max_rows) and summary.row_count >= max_rows,
+        "aggregates": summary.aggregates(),
+        "page_handle": register_result(sql, summary.row_count, list(summary.sample[0]) if summary.sample else []),
+        "note": f"Showing {len(summary.sample)} of {summary.row_count} rows; aggregates cover all of them.",
+    }
+
+
+def split_result(result: Any):
+    """
+    (rows, summary) for a tool result: dicts carrying `rows` (summarized results, expiry
+    timelines) give those rows and the remaining fields; plain row lists and errors give
+    (result, None).
+    """
+    if isinstance(result, dict) and "rows" in result:
+        return result["rows"], {k: v for k, v in result.items() if k != "rows"}
+    return result, None
+
+
+def is_error(result: Any) -> bool:
+    return isinstance(result, dict) and "error" in result
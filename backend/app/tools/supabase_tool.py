@@ -1,13 +1,64 @@
-from supabase import create_client
+from typing import Any, Iterable, Optional, Sequence
+
+from app.tools.sql_backends import get_sql_backend
 from app.config.settings import settings
+from app.tools.sql_guard import SQLGuardError, check_plan_cost, guard_sql
+from app.tools.sql_result_cache import get_result_cache
+from app.tools.sql_results import register_result, summarize_stream, summary_payload
 
-url = settings.SUPABASE_URL
-key = settings.SUPABASE_KEY
-supabase = create_client(url, key)
 
-def run_query(sql: str):
+def run_query(sql: str, params: Optional[Sequence[Any]] = None, timeout_ms: Optional[int] = None):
+    """
+    Execute an agent query on the configured SQL backend (SQL_BACKEND: supabase RPC,
+    pooled Postgres, or a local SQLite/DuckDB copy). Results are served from the
+    versioned result cache while the tables they read are unchanged. Errors are
+    returned, not raised.
+    """
     try:
-        result = supabase.rpc("exec_sql", {"query": sql}).execute()
-        return result.data
+        cache = get_result_cache()
+        cached = cache.get(sql, params) if cache else None
+        if cached is not None:
+            return cached
+        rows = get_sql_backend().fetch(sql, params, timeout_ms)
+        if cache:
+            cache.put(sql, rows, params)
+        return rows
     except Exception as e:
         return {"error": str(e)}
+
+
+def run_guarded_query(sql: str, tables: Iterable[str], max_rows: Optional[int] = None):
+    """
+    Execute LLM-written SQL after the guard: single read-only SELECT over `tables`,
+    row LIMIT enforced, plans above SQL_MAX_PLAN_COST rejected. Violations and
+    database errors come back as {"error", "code", "hint"} dicts the agent can retry on.
+
+    Rows are streamed from the backend. Up to SQL_RESULT_ROW_THRESHOLD rows are returned
+    as a list; beyond that a dict with sample `rows`, `aggregates` over every row and a
+    `page_handle` for fetch_result_page.
+    """
+    tables = list(tables)
+    max_rows = settings.SQL_MAX_ROWS if max_rows is None else max_rows
+    try:
+        backend = get_sql_backend()
+        safe_sql = guard_sql(sql, tables, max_rows)
+        cache = get_result_cache()
+        cached = cache.get(safe_sql) if cache else None
+        if cached is not None:
+            if isinstance(cached, dict) and "page_handle" in cached:
+                # Handles live in process memory; the entry may come from another worker
+                columns = list(cached["rows"][0]) if cached.get("rows") else []
+                cached["page_handle"] = register_result(safe_sql, cached["row_count"], columns)
+            return cached
+        check_plan_cost(safe_sql, backend)
+        result = summarize_stream(backend.iter_rows(safe_sql, batch_size=settings.SQL_FETCH_BATCH_SIZE), tables[0])
+        if not isinstance(result, list):
+            result = summary_payload(result, safe_sql, max_rows)
+        if cache:
+            cache.put(safe_sql, result)
+        return result
+    except SQLGuardError as e:
+        print(f"SQL rejected ({e.code}): {e.message}")
+        return e.to_dict()
+    except Exception as e:
+        return {"error": str(e), "code": "execution_error"}
@@ -0,0 +1,98 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeout
+from typing import Any, Callable, Dict, List, Sequence
+
+from app.utils.tool_encoding import encode_payload
+
+DEFAULT_TOOL_TIMEOUT = 60
+MAX_TOOL_WORKERS = 8
+
+
+def execute_tool_calls(
+    tool_calls: Sequence[Any],
+    execute: Callable[[Any], Any],
+    timeout: float = DEFAULT_TOOL_TIMEOUT,
+    max_workers: int = MAX_TOOL_WORKERS,
+) -> List[Any]:
+    """
+    Run every tool call from one assistant turn concurrently and return the results
+    in the same order as `tool_calls`.
+
+    `execute(tool_call)` is called in a worker thread. A call that raises or does not
+    finish within `timeout` seconds (measured from dispatch) yields an {"error": ...}
+    dict instead of its result; the other calls are unaffected.
+
+    Threads cannot be interrupted: a call that overruns keeps running in its worker
+    until it returns on its own (its result is discarded), still holding whatever
+    requests it has in flight. Tools bound their own I/O (HTTP timeouts, the SQL
+    statement timeout) or, like scan_sourcing_risk, stop early within a time budget.
+    """
+    if not tool_calls:
+        return []
+
+    pool = ThreadPoolExecutor(max_workers=min(max_workers, len(tool_calls)))
+    try:
+        futures = [pool.submit(execute, tc) for tc in tool_calls]
+        deadline = time.monotonic() + timeout
+        results = []
+        for tc, future in zip(tool_calls, futures):
+            try:
+                results.append(future.result(timeout=max(0.0, deadline - time.monotonic())))
+            except FuturesTimeout:
+                future.cancel()
+                results.append({"error": f"Tool call {tc.function.name} timed out after {timeout}s"})
+            except Exception as e:
+                results.append({"error": f"Tool call failed: {str(e)}"})
+        return results
+    finally:
+        # Do not block on calls that overran their timeout
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def assistant_tool_call_message(message: Any) -> Dict[str, Any]:
+    """The assistant turn (with its tool_calls) as a plain dict for the next request."""
+    return {
+        "role": "assistant",
+        "content": message.content,
+        "tool_calls": [
+            {
+                "id": tc.id,
+                "type": "function",
+                "function": {
+                    "name": tc.function.name,
+                    "arguments": tc.function.arguments
+                }
+            } for tc in message.tool_calls
+        ]
+    }
+
+
+def tool_result_messages(tool_calls: Sequence[Any], results: Sequence[Any]) -> List[Dict[str, Any]]:
+    """One `tool` message per call, in call order. Non-string results use the compact encoding."""
+    return [
+        {
+            "role": "tool",
+            "tool_call_id": tc.id,
+            "content": encode_payload(result),
+            "name": tc.function.name
+        }
+        for tc, result in zip(tool_calls, results)
+    ]
+
+
+def joined_sql(sqls: Sequence[str]) -> str:
+    """The statements of a multi-call turn as one SQL string, so `sql` stays a string."""
+    return ";\n\n".join(s for s in sqls if s)
+
+
+def merge_row_results(results: Sequence[Any]) -> Any:
+    """
+    Concatenate row lists returned by several SQL tool calls (the sample rows of
+    summarized results). Error results are skipped; if every call failed, the first
+    error is returned.
+    """
+    rows = [r["rows"] if isinstance(r, dict) and "rows" in r else r for r in results]
+    rows = [r for r in rows if isinstance(r, list)]
+    if not rows:
+        return results[0] if results else []
+    return [row for r in rows for row in r]
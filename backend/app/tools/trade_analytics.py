@@ -0,0 +1,125 @@
+from typing import Any, Dict, List, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+GROUP_KEYS = ["commodity_code", "reporter_code"]
+# Partner labels Comtrade uses for the all-partners total
+WORLD_PARTNERS = {"0", "w00", "world"}
+# Above this Herfindahl-Hirschman index (0-10000) supply is considered highly concentrated
+HIGH_CONCENTRATION_HHI = 2500
+TOP_K = 5
+
+
+def _world_mask(df: pd.DataFrame) -> pd.Series:
+    if "partner" not in df.columns:
+        return pd.Series(True, index=df.index)
+    return df["partner"].astype(str).str.strip().str.lower().isin(WORLD_PARTNERS)
+
+
+def yearly_totals(df: pd.DataFrame, keys: Sequence[str] = GROUP_KEYS) -> pd.DataFrame:
+    """
+    Export/import totals per group and year. World rows are used where a group has
+    them; otherwise the partner rows are summed.
+    """
+    keys = list(keys)
+    df = df.assign(is_world=_world_mask(df))
+    df["world_value"] = df["trade_value"].where(df["is_world"], 0.0)
+    df["partner_value"] = df["trade_value"].where(~df["is_world"], 0.0)
+    sums = df.groupby(keys + ["year", "flow"], as_index=False).agg(
+        world_value=("world_value", "sum"), partner_value=("partner_value", "sum"), has_world=("is_world", "any"),
+    )
+    sums["trade_value"] = np.where(sums["has_world"], sums["world_value"], sums["partner_value"])
+    yearly = sums.pivot_table(index=keys + ["year"], columns="flow", values="trade_value", aggfunc="sum", fill_value=0.0)
+    yearly = yearly.reindex(columns=["Export", "Import"], fill_value=0.0).rename(columns={"Export": "export", "Import": "import"})
+    yearly.columns.name = None
+    return yearly.reset_index().sort_values(keys + ["year"])
+
+
+def _growth(yearly: pd.DataFrame, keys: List[str], column: str) -> pd.DataFrame:
+    """CAGR between the first and last year with a positive value, and the latest YoY change."""
+    positive = yearly[yearly[column] > 0]
+    first = positive.groupby(keys).head(1).set_index(keys)
+    last = positive.groupby(keys).tail(1).set_index(keys).reindex(first.index)
+    span = (last["year"] - first["year"]).astype(float)
+    # where() after the power: 1 ** NaN is 1, which would report a single year as 0% growth
+    cagr = (((last[column] / first[column]) ** (1 / span.where(span > 0)) - 1) * 100).where(span > 0)
+
+    previous = yearly.groupby(keys)[column].shift(1)
+    yoy = ((yearly[column] / previous.where(previous > 0)) - 1) * 100
+    latest_yoy = yearly.assign(yoy=yoy).groupby(keys).tail(1).set_index(keys)["yoy"]
+    return pd.DataFrame({f"{column}_cagr": cagr, f"{column}_yoy": latest_yoy})
+
+
+def supplier_concentration(df: pd.DataFrame, keys: Sequence[str] = GROUP_KEYS,
+                           top_k: int = TOP_K) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Import partner concentration per group over the whole period: (HHI frame with
+    supplier counts, long frame of the top-k suppliers with their shares).
+    """
+    keys = list(keys)
+    if "partner" not in df.columns:
+        return pd.DataFrame(columns=keys + ["hhi", "suppliers"]), pd.DataFrame(columns=keys + ["partner", "trade_value", "share"])
+    imports = df[(df["flow"] == "Import") & ~_world_mask(df)]
+    by_partner = imports.groupby(keys + ["partner"], as_index=False)["trade_value"].sum()
+    by_partner = by_partner[by_partner["trade_value"] > 0]
+    by_partner["share"] = by_partner["trade_value"] / by_partner.groupby(keys)["trade_value"].transform("sum")
+
+    hhi = by_partner.assign(sq=by_partner["share"] ** 2).groupby(keys).agg(
+        hhi=("sq", "sum"), suppliers=("partner", "size"),
+    )
+    hhi["hhi"] = (hhi["hhi"] * 10000).round(0)
+    top = by_partner.sort_values(keys + ["trade_value"], ascending=[True] * len(keys) + [False])
+    return hhi.reset_index(), top.groupby(keys).head(top_k).reset_index(drop=True)
+
+
+def batch_trade_metrics(df: pd.DataFrame, keys: Sequence[str] = GROUP_KEYS,
+                        top_k: int = TOP_K) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Trade metrics for every group of a long-format frame (columns: `keys`, year, flow
+    "Export"/"Import", trade_value, optionally partner), in vectorized groupby passes:
+    totals, CAGR and latest YoY per flow, trade balance, import dependency ratio and
+    import-partner HHI. Returns (one row per group, top-k suppliers per group).
+    """
+    keys = list(keys)
+    if df.empty:
+        return pd.DataFrame(columns=keys), pd.DataFrame(columns=keys)
+    df = df.assign(trade_value=pd.to_numeric(df["trade_value"], errors="coerce").fillna(0.0))
+    yearly = yearly_totals(df, keys)
+
+    metrics = yearly.groupby(keys).agg(
+        start_year=("year", "min"), end_year=("year", "max"),
+        total_export_value=("export", "sum"), total_import_value=("import", "sum"),
+    )
+    metrics = metrics.join(_growth(yearly, keys, "export")).join(_growth(yearly, keys, "import"))
+    total = metrics["total_export_value"] + metrics["total_import_value"]
+    metrics["trade_balance"] = metrics["total_export_value"] - metrics["total_import_value"]
+    metrics["import_dependency_ratio"] = (metrics["total_import_value"] / total.where(total > 0) * 100)
+    metrics["is_net_importer"] = metrics["total_import_value"] > metrics["total_export_value"]
+
+    hhi, suppliers = supplier_concentration(df, keys, top_k)
+    metrics = metrics.reset_index().merge(hhi, on=keys, how="left")
+    metrics["high_concentration"] = metrics["hhi"] >= HIGH_CONCENTRATION_HHI
+    for col in ("export_cagr", "import_cagr", "export_yoy", "import_yoy", "import_dependency_ratio"):
+        metrics[col] = metrics[col].round(2)
+    return metrics, suppliers
+
+
+def risk_records(metrics: pd.DataFrame, suppliers: pd.DataFrame,
+                 keys: Sequence[str] = GROUP_KEYS) -> List[Dict[str, Any]]:
+    """JSON-ready rows, most import-dependent and concentrated first, with their top suppliers."""
+    keys = list(keys)
+    if metrics.empty:
+        return []
+    ranked = metrics.sort_values(["import_dependency_ratio", "hhi"], ascending=False, na_position="last")
+    top = {}
+    if not suppliers.empty:
+        nested = suppliers.assign(share=suppliers["share"].round(4))[keys + ["partner", "trade_value", "share"]]
+        top = {
+            key if isinstance(key, tuple) else (key,): part.drop(columns=keys).to_dict(orient="records")
+            for key, part in nested.groupby(keys)
+        }
+    records = ranked.astype(object).where(ranked.notna(), None).to_dict(orient="records")
+    for record in records:
+        record["top_suppliers"] = top.get(tuple(record[k] for k in keys), [])
+    return records
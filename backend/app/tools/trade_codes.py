@@ -0,0 +1,219 @@
+import bisect
+import csv
+import os
+import re
+import threading
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+
+RESOURCES_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "resources")
+COUNTRIES_FILE = os.path.join(RESOURCES_DIR, "countries_m49.csv")
+HS_FILE = os.path.join(RESOURCES_DIR, "hs_codes.csv")
+FUZZY_THRESHOLD = 0.45
+# Codes the EXIM tools accept besides countries: "all" means no partner filter
+SPECIAL_PARTNERS = {"all"}
+
+
+class TradeCodeError(ValueError):
+    """A country or commodity that cannot be resolved; carries close matches for the LLM."""
+
+    def __init__(self, kind: str, value: str, suggestions: List[Dict[str, Any]]):
+        self.kind = kind
+        self.value = value
+        self.suggestions = suggestions
+        hint = ", ".join(f"{s['name']} ({s['code']})" for s in suggestions)
+        super().__init__(f"Unknown {kind} {value!r}" + (f"; did you mean {hint}?" if hint else ""))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"status": "error", "message": str(self), "suggestions": self.suggestions}
+
+
+def normalize(text: str) -> str:
+    return " ".join(re.sub(r"[^a-z0-9]+", " ", (text or "").lower()).split())
+
+
+def trigrams(text: str) -> set:
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class NameIndex:
+    """
+    Name lookup for one code list: exact names, aliases, prefixes (bisect over the
+    sorted names) and trigram similarity (Dice coefficient) for typos.
+    """
+
+    def __init__(self):
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self.names: Dict[str, str] = {}
+        self.aliases: Dict[str, str] = {}
+        self.sorted_keys: List[str] = []
+        self.trigram_postings: Dict[str, set] = defaultdict(set)
+        self._grams: Dict[str, set] = {}
+
+    def add(self, code: str, name: str, aliases: List[str], **extra: Any) -> None:
+        self.entries[code] = {"code": code, "name": name, **extra}
+        self.names[normalize(name)] = code
+        for alias in aliases:
+            self.aliases.setdefault(normalize(alias), code)
+
+    def build(self) -> None:
+        keys = set(self.names) | {a for a in self.aliases if len(a) > 3}
+        self.sorted_keys = sorted(keys)
+        for key in keys:
+            grams = trigrams(key)
+            self._grams[key] = grams
+            for gram in grams:
+                self.trigram_postings[gram].add(key)
+
+    def _code_for(self, key: str) -> str:
+        return self.names.get(key) or self.aliases[key]
+
+    def _match(self, key: str, how: str, score: float) -> Dict[str, Any]:
+        return {**self.entries[self._code_for(key)], "match": how, "score": round(score, 3)}
+
+    def candidates(self, text: str, limit: int = 5) -> List[Dict[str, Any]]:
+        """Best matches for free text, exact first, then prefix, then fuzzy."""
+        key = normalize(text)
+        if not key:
+            return []
+        if key in self.names:
+            return [self._match(key, "exact", 1.0)]
+        if key in self.aliases:
+            return [self._match(key, "alias", 1.0)]
+
+        i = bisect.bisect_left(self.sorted_keys, key)
+        prefixed = []
+        while i < len(self.sorted_keys) and self.sorted_keys[i].startswith(key) and len(prefixed) < limit:
+            prefixed.append(self.sorted_keys[i])
+            i += 1
+        if len(key) >= 3 and len({self._code_for(k) for k in prefixed}) == 1:
+            return [self._match(prefixed[0], "prefix", len(key) / len(prefixed[0]))]
+
+        grams = trigrams(key)
+        overlap: Dict[str, int] = defaultdict(int)
+        for gram in grams:
+            for candidate in self.trigram_postings.get(gram, ()):
+                overlap[candidate] += 1
+        scored = sorted(
+            ((2 * n / (len(grams) + len(self._grams[c])), c) for c, n in overlap.items()),
+            reverse=True,
+        )
+        results, seen = [], set()
+        for score, candidate in scored:
+            code = self._code_for(candidate)
+            if code in seen:
+                continue
+            seen.add(code)
+            results.append(self._match(candidate, "fuzzy", score))
+            if len(results) >= limit:
+                break
+        return results
+
+    def resolve(self, text: str) -> Optional[Dict[str, Any]]:
+        found = self.candidates(text, limit=2)
+        if not found:
+            return None
+        best = found[0]
+        if best["match"] == "fuzzy":
+            runner_up = found[1]["score"] if len(found) > 1 else 0.0
+            # Accept a typo match only when it is clearly better than the alternatives
+            if best["score"] < FUZZY_THRESHOLD or best["score"] - runner_up < 0.1:
+                return None
+        return best
+
+
+class TradeCodes:
+    """
+    Country (M49, with the codes Comtrade uses where they differ) and HS-code resolver
+    loaded from app/resources. The HS file lists all chapters and the pharmaceutical
+    headings and subheadings (chapters 29 and 30); other valid 4/6-digit codes are
+    accepted by format when their chapter exists.
+    """
+
+    def __init__(self, countries_file: str = COUNTRIES_FILE, hs_file: str = HS_FILE):
+        self.countries = NameIndex()
+        with open(countries_file, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                aliases = [a for a in row["aliases"].split("|") if a]
+                self.countries.add(row["code"], row["name"], aliases, iso2=row["iso2"], iso3=row["iso3"])
+        self.countries.build()
+
+        self.hs = NameIndex()
+        self.children: Dict[str, List[str]] = defaultdict(list)
+        with open(hs_file, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                code = row["code"]
+                aliases = [a for a in row["aliases"].split("|") if a]
+                self.hs.add(code, row["description"], aliases, level=len(code))
+                if len(code) > 2:
+                    self.children[code[:len(code) - 2]].append(code)
+        self.hs.build()
+
+    # Countries
+
+    def country(self, value: str) -> Dict[str, Any]:
+        text = str(value).strip()
+        if text.isdigit():
+            code = str(int(text))
+            if code in self.countries.entries:
+                return {**self.countries.entries[code], "match": "code", "score": 1.0}
+            if code in self.countries.aliases:
+                # ISO numeric code of a country Comtrade reports under another code (840 -> 842)
+                return {**self.countries.entries[self.countries.aliases[code]], "match": "alias", "score": 1.0}
+            raise TradeCodeError("country code", text, [])
+        match = self.countries.resolve(text)
+        if match is None:
+            raise TradeCodeError("country", text, self.countries.candidates(text, limit=3))
+        return match
+
+    def country_code(self, value: str) -> str:
+        if str(value).strip().lower() in SPECIAL_PARTNERS:
+            return str(value).strip().lower()
+        return self.country(value)["code"]
+
+    # HS codes
+
+    def commodity(self, value: str) -> Dict[str, Any]:
+        text = str(value).strip()
+        if re.fullmatch(r"[\d.\s]+", text):
+            # "3004.90" / "30 04" style codes
+            text = re.sub(r"[.\s]", "", text)
+        if text.isdigit():
+            if len(text) not in (2, 4, 6):
+                raise TradeCodeError("HS code", text, [])
+            if text in self.hs.entries:
+                return {**self.hs.entries[text], "match": "code", "score": 1.0}
+            chapter = self.hs.entries.get(text[:2])
+            if chapter is None:
+                raise TradeCodeError("HS code", text, [])
+            # Not listed in the bundled nomenclature; the chapter is valid
+            return {"code": text, "name": f"{chapter['name']} (heading {text})", "level": len(text),
+                    "match": "chapter", "score": 0.5}
+        match = self.hs.resolve(text)
+        if match is None:
+            raise TradeCodeError("commodity", text, self.hs.candidates(text, limit=3))
+        return match
+
+    def commodity_code(self, value: str) -> str:
+        return self.commodity(value)["code"]
+
+    def expand(self, code: str, depth: int = 1) -> List[Dict[str, Any]]:
+        """Listed child codes of an HS chapter/heading, `depth` levels down (chapter -> heading -> subheading)."""
+        level = [code]
+        for _ in range(depth):
+            level = [child for parent in level for child in self.children.get(parent, [])]
+        return [self.hs.entries[c] for c in level]
+
+
+_codes: Optional[TradeCodes] = None
+_codes_lock = threading.Lock()
+
+
+def get_trade_codes() -> TradeCodes:
+    """Loaded on first use; later calls are in-memory lookups."""
+    global _codes
+    with _codes_lock:
+        if _codes is None:
+            _codes = TradeCodes()
+    return _codes
@@ -0,0 +1,293 @@
+import json
+import os
+import sqlite3
+import zipfile
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional
+
+from app.config.settings import settings
+
+STUDY_COLUMNS = [
+    "nct_id", "brief_title", "overall_status", "phase", "lead_sponsor_name", "sponsor_class",
+    "conditions", "interventions", "enrollment", "start_date", "completion_date", "study_type",
+    "primary_outcome", "locations_count", "last_update_date",
+]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS studies (
+    nct_id TEXT PRIMARY KEY,
+    brief_title TEXT,
+    overall_status TEXT,
+    phase TEXT,
+    lead_sponsor_name TEXT,
+    sponsor_class TEXT,
+    conditions TEXT,
+    interventions TEXT,
+    enrollment INTEGER,
+    start_date TEXT,
+    completion_date TEXT,
+    study_type TEXT,
+    primary_outcome TEXT,
+    locations_count INTEGER,
+    last_update_date TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_studies_status ON studies(overall_status);
+CREATE INDEX IF NOT EXISTS idx_studies_phase ON studies(phase);
+CREATE INDEX IF NOT EXISTS idx_studies_sponsor ON studies(lead_sponsor_name);
+CREATE INDEX IF NOT EXISTS idx_studies_updated ON studies(last_update_date);
+
+-- One row per (study, listed condition), lowercased, for local condition lookups
+CREATE TABLE IF NOT EXISTS study_conditions (
+    condition TEXT NOT NULL,
+    nct_id TEXT NOT NULL,
+    PRIMARY KEY (condition, nct_id)
+);
+CREATE INDEX IF NOT EXISTS idx_study_conditions_nct ON study_conditions(nct_id);
+
+-- Live API queries answered so far (ClinicalTrials.gov expands condition synonyms,
+-- so its result membership is remembered rather than re-derived locally)
+CREATE TABLE IF NOT EXISTS condition_queries (
+    query_key TEXT PRIMARY KEY,
+    condition TEXT,
+    status TEXT,
+    phase TEXT,
+    total_count INTEGER,
+    refreshed_at TEXT
+);
+CREATE TABLE IF NOT EXISTS query_results (
+    query_key TEXT NOT NULL,
+    nct_id TEXT NOT NULL,
+    PRIMARY KEY (query_key, nct_id)
+);
+
+CREATE TABLE IF NOT EXISTS store_meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+def query_key(args: Dict[str, Any]) -> str:
+    condition = (args.get("condition") or "").strip().lower()
+    status = (args.get("status") or "RECRUITING").upper()
+    phase = (args.get("phase") or "").replace("_", "").upper()
+    return f"{condition}|{status}|{phase}"
+
+
+class TrialStore:
+    """
+    SQLite store of compact ClinicalTrials.gov study records (the dicts produced by
+    compact_study), indexed by condition, status, phase, sponsor and NCT ID.
+    """
+
+    def __init__(self, path: str, ttl_hours: float = 24):
+        self.path = path
+        self.ttl = timedelta(hours=ttl_hours)
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    # Writes
+
+    def upsert_studies(self, conn: sqlite3.Connection, studies: Iterable[Dict[str, Any]]) -> List[str]:
+        ids = []
+        placeholders = ", ".join("?" for _ in STUDY_COLUMNS)
+        for study in studies:
+            nct_id = study.get("nct_id")
+            if not nct_id:
+                continue
+            conn.execute(
+                f"INSERT OR REPLACE INTO studies ({', '.join(STUDY_COLUMNS)}) VALUES ({placeholders})",
+                [study.get(c) for c in STUDY_COLUMNS],
+            )
+            conn.execute("DELETE FROM study_conditions WHERE nct_id = ?", (nct_id,))
+            conditions = [c.strip().lower() for c in (study.get("conditions") or "").split(",") if c.strip()]
+            conn.executemany(
+                "INSERT OR IGNORE INTO study_conditions (condition, nct_id) VALUES (?, ?)",
+                [(c, nct_id) for c in conditions],
+            )
+            ids.append(nct_id)
+        return ids
+
+    def record_query(self, args: Dict[str, Any], studies: List[Dict[str, Any]], total_count: int,
+                     replace: bool = True) -> None:
+        """Store the result of a live fetch. replace=False merges an incremental refresh."""
+        key = query_key(args)
+        with self._connect() as conn:
+            ids = self.upsert_studies(conn, studies)
+            if replace:
+                conn.execute("DELETE FROM query_results WHERE query_key = ?", (key,))
+            conn.executemany(
+                "INSERT OR IGNORE INTO query_results (query_key, nct_id) VALUES (?, ?)",
+                [(key, i) for i in ids],
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO condition_queries (query_key, condition, status, phase, total_count, refreshed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, args.get("condition"), args.get("status", "RECRUITING"), args.get("phase"),
+                 total_count, datetime.now().isoformat()),
+            )
+
+    @staticmethod
+    def matches_filters(args: Dict[str, Any], study: Dict[str, Any]) -> bool:
+        """Whether a study passes the status and phase filters of a tool call."""
+        status = (args.get("status") or "RECRUITING").upper()
+        phase = (args.get("phase") or "").replace("_", "").upper()
+        return (study.get("overall_status") or "").upper() == status and \
+            phase in (study.get("phase") or "").replace("_", "").upper()
+
+    def merge_updates(self, args: Dict[str, Any], studies: List[Dict[str, Any]]) -> int:
+        """
+        Merge an incremental pull made without the status/phase filters: every updated
+        study is upserted, studies that now pass the filters join the query and studies
+        that no longer do leave it. Only valid when the store held every member of the
+        query; returns the recomputed member count as the query's total.
+        """
+        key = query_key(args)
+        with self._connect() as conn:
+            self.upsert_studies(conn, studies)
+            ids = [s["nct_id"] for s in studies if s.get("nct_id")]
+            matching = [s["nct_id"] for s in studies if s.get("nct_id") and self.matches_filters(args, s)]
+            conn.executemany("DELETE FROM query_results WHERE query_key = ? AND nct_id = ?",
+                             [(key, i) for i in ids])
+            conn.executemany("INSERT OR IGNORE INTO query_results (query_key, nct_id) VALUES (?, ?)",
+                             [(key, i) for i in matching])
+            total = conn.execute("SELECT count(*) FROM query_results WHERE query_key = ?", (key,)).fetchone()[0]
+            conn.execute(
+                "UPDATE condition_queries SET total_count = ?, refreshed_at = ? WHERE query_key = ?",
+                (total, datetime.now().isoformat(), key),
+            )
+        return total
+
+    def bulk_load(self, path: str) -> int:
+        """
+        Load a ClinicalTrials.gov JSON export: a .json file holding a list of studies
+        (or {"studies": [...]}), a .zip of per-study JSON files, or a directory of them.
+        """
+        from app.tools.fetch_clinical_trial_data import compact_study
+
+        def raw_studies():
+            if os.path.isdir(path):
+                for name in sorted(os.listdir(path)):
+                    if name.endswith(".json"):
+                        with open(os.path.join(path, name)) as f:
+                            yield json.load(f)
+            elif zipfile.is_zipfile(path):
+                with zipfile.ZipFile(path) as zf:
+                    for name in zf.namelist():
+                        if name.endswith(".json"):
+                            yield json.loads(zf.read(name))
+            else:
+                with open(path) as f:
+                    data = json.load(f)
+                yield from (data.get("studies", []) if isinstance(data, dict) else data)
+
+        count = 0
+        with self._connect() as conn:
+            batch = []
+            for raw in raw_studies():
+                batch.append(compact_study(raw))
+                if len(batch) >= 1000:
+                    count += len(self.upsert_studies(conn, batch))
+                    batch = []
+            count += len(self.upsert_studies(conn, batch))
+            conn.execute("INSERT OR REPLACE INTO store_meta (key, value) VALUES ('bulk_loaded_at', ?)",
+                         (datetime.now().isoformat(),))
+        return count
+
+    # Reads
+
+    def query_state(self, args: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Freshness and coverage of a previously fetched live query, or None if never fetched."""
+        key = query_key(args)
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM condition_queries WHERE query_key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            stored = conn.execute("SELECT count(*) FROM query_results WHERE query_key = ?", (key,)).fetchone()[0]
+            latest = conn.execute(
+                "SELECT max(s.last_update_date) FROM studies s JOIN query_results q ON q.nct_id = s.nct_id "
+                "WHERE q.query_key = ?", (key,)
+            ).fetchone()[0]
+        refreshed_at = datetime.fromisoformat(row["refreshed_at"])
+        return {
+            "total_count": row["total_count"],
+            "stored_count": stored,
+            "refreshed_at": row["refreshed_at"],
+            "fresh": datetime.now() - refreshed_at < self.ttl,
+            "latest_update": latest,
+        }
+
+    def bulk_fresh(self) -> bool:
+        with self._connect() as conn:
+            row = conn.execute("SELECT value FROM store_meta WHERE key = 'bulk_loaded_at'").fetchone()
+        return row is not None and datetime.now() - datetime.fromisoformat(row[0]) < self.ttl
+
+    def _match_clause(self, args: Dict[str, Any]):
+        condition = (args.get("condition") or "").strip().lower()
+        sql = (
+            "FROM studies s WHERE s.overall_status = ? "
+            "AND (s.nct_id IN (SELECT nct_id FROM query_results WHERE query_key = ?) "
+            "OR s.nct_id IN (SELECT nct_id FROM study_conditions WHERE condition LIKE ?))"
+        )
+        params: List[Any] = [(args.get("status") or "RECRUITING").upper(), query_key(args), f"%{condition}%"]
+        if args.get("phase"):
+            sql += " AND s.phase LIKE ?"
+            params.append(f"%{args['phase'].replace('_', '').upper()}%")
+        return sql, params
+
+    def lookup(self, args: Dict[str, Any], limit: int) -> List[Dict[str, Any]]:
+        """
+        Studies for a tool call: members of the remembered live query plus any locally
+        loaded study listing a matching condition, filtered by status and phase.
+        """
+        clause, params = self._match_clause(args)
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT * {clause} ORDER BY s.last_update_date DESC LIMIT ?", params + [limit]
+            ).fetchall()
+        return [dict(r) for r in rows]
+
+    def count(self, args: Dict[str, Any]) -> int:
+        clause, params = self._match_clause(args)
+        with self._connect() as conn:
+            return conn.execute(f"SELECT count(*) {clause}", params).fetchone()[0]
+
+
+_store: Optional[TrialStore] = None
+
+
+def get_trial_store() -> Optional[TrialStore]:
+    """Process-wide store, or None when TRIALS_STORE_PATH is empty."""
+    global _store
+    if _store is None and settings.TRIALS_STORE_PATH:
+        _store = TrialStore(settings.TRIALS_STORE_PATH, settings.TRIALS_STORE_TTL_HOURS)
+    return _store
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Local ClinicalTrials.gov study store")
+    parser.add_argument("export", help="JSON export file, zip of per-study JSON files, or directory")
+    args = parser.parse_args()
+    store = get_trial_store()
+    if store is None:
+        raise SystemExit("TRIALS_STORE_PATH is not set")
+    print(f"Loaded {store.bulk_load(args.export)} studies into {store.path}")
+
+
+if __name__ == "__main__":
+    main()
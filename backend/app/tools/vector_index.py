@@ -0,0 +1,334 @@
+import json
+import math
+import os
+import threading
+import zlib
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.config.settings import settings
+from app.utils.text_ranking import estimate_tokens, tokenize
+
+SEARCH_BLOCK_ROWS = 65536
+KMEANS_ITERATIONS = 10
+# Reciprocal-rank-fusion constant for merging vector and BM25 rankings
+RRF_K = 60
+
+
+class HashingEmbedder:
+    """
+    Offline embedder: unigrams and bigrams hashed (crc32, signed) into `dim` buckets
+    with sublinear term frequency, L2-normalized. Deterministic across processes.
+    """
+
+    def __init__(self, dim: int = 512):
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            tokens = tokenize(text)
+            features = Counter(tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])])
+            for feature, tf in features.items():
+                h = zlib.crc32(feature.encode())
+                matrix[row, h % self.dim] += (1.0 if h & 0x80000000 else -1.0) * (1 + math.log(tf))
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return matrix / np.where(norms > 0, norms, 1.0)
+
+
+class APIEmbedder:
+    """Embeddings from the Gemini OpenAI-compatible endpoint (DOC_EMBEDDER=gemini)."""
+
+    def __init__(self, model: str = "text-embedding-004", batch_size: int = 100):
+        from openai import OpenAI
+
+        self.client = OpenAI(api_key=settings.GOOGLE_API_KEY,
+                             base_url="https://generativelanguage.googleapis.com/v1beta/openai/")
+        self.model = model
+        self.name = f"gemini-{model}"
+        self.batch_size = batch_size
+        self.dim = None
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        rows = []
+        for i in range(0, len(texts), self.batch_size):
+            response = self.client.embeddings.create(model=self.model, input=list(texts[i:i + self.batch_size]))
+            rows.extend(item.embedding for item in response.data)
+        matrix = np.asarray(rows, dtype=np.float32)
+        self.dim = matrix.shape[1] if len(matrix) else self.dim
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return matrix / np.where(norms > 0, norms, 1.0)
+
+
+def create_embedder(name: str):
+    if name == "hashing":
+        return HashingEmbedder(settings.DOC_EMBEDDING_DIM)
+    if name == "gemini":
+        return APIEmbedder()
+    raise ValueError(f"Unknown DOC_EMBEDDER: {name}")
+
+
+def _kmeans(matrix: np.ndarray, k: int, seed: int = 0) -> np.ndarray:
+    """Spherical k-means centroids (rows are unit vectors, similarity is the dot product)."""
+    rng = np.random.default_rng(seed)
+    centroids = np.array(matrix[rng.choice(len(matrix), size=k, replace=False)], dtype=np.float32)
+    for _ in range(KMEANS_ITERATIONS):
+        assign = np.argmax(matrix @ centroids.T, axis=1)
+        for c in range(k):
+            members = matrix[assign == c]
+            if len(members):
+                centroid = members.sum(axis=0)
+                centroids[c] = centroid / (np.linalg.norm(centroid) or 1.0)
+    return centroids
+
+
+class VectorIndex:
+    """
+    Chunk embeddings in a memory-mapped float32 matrix (vectors.npy) with an ID sidecar
+    (index.json: (file_name, chunk_id) per row, plus per-file content hashes). Opening the
+    index maps the file instead of reading it, so startup cost does not grow with the
+    corpus.
+
+    Search is a blocked matrix product against a batch of query vectors. Past
+    `ivf_min_rows` rows, an IVF partition (spherical k-means, ~sqrt(n) lists) restricts
+    each query to the rows of its `nprobe` nearest lists.
+
+    `upsert_file` replaces one file's rows: the kept rows are copied block-wise into a
+    new matrix with the new rows appended and swapped in; other files are not re-embedded.
+    Readers work on one immutable snapshot (matrix, ids, centroids, lists), which
+    writers replace in a single assignment, so a search never mixes two versions.
+    """
+
+    def __init__(self, directory: str, embedder, ivf_min_rows: int = 20000, nprobe: int = 8):
+        self.directory = directory
+        self.embedder = embedder
+        self.ivf_min_rows = ivf_min_rows
+        self.nprobe = nprobe
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    # Storage
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _load(self) -> None:
+        meta_path = self._path("index.json")
+        self.meta: Dict[str, Any] = {"embedder": self.embedder.name, "ids": [], "files": {}, "ivf_rows": 0}
+        # (matrix, ids, centroids, lists); replaced as a whole, never mutated
+        self._snapshot: Tuple[Optional[np.ndarray], List[List[Any]], Optional[np.ndarray], Optional[np.ndarray]] = \
+            (None, [], None, None)
+        if not os.path.exists(meta_path):
+            return
+        with open(meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("embedder") != self.embedder.name:
+            # Vectors from another embedder are not comparable; rebuild from scratch
+            return
+        self.meta = meta
+        matrix = np.load(self._path("vectors.npy"), mmap_mode="r") if meta["ids"] else None
+        centroids = lists = None
+        if meta.get("ivf_rows"):
+            centroids = np.load(self._path("centroids.npy"))
+            lists = np.load(self._path("lists.npy"), mmap_mode="r")
+        self._snapshot = (matrix, meta["ids"], centroids, lists)
+
+    def _save_meta(self) -> None:
+        tmp = self._path("index.json.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.meta, f)
+        os.replace(tmp, self._path("index.json"))
+
+    def _save_array(self, name: str, array: np.ndarray) -> None:
+        """Write via a temp file and rename: readers may still have the old file mapped."""
+        tmp = self._path(f"{name}.tmp.npy")
+        np.save(tmp, array)
+        os.replace(tmp, self._path(f"{name}.npy"))
+
+    def _swap_matrix(self, old: Optional[np.ndarray], keep: np.ndarray, new_rows: np.ndarray) -> Optional[np.ndarray]:
+        """Write the kept rows of `old` plus `new_rows` as the new vectors.npy and map it."""
+        rows = int(keep.sum()) + len(new_rows)
+        dim = new_rows.shape[1] if len(new_rows) else old.shape[1]
+        tmp = self._path("vectors.tmp.npy")
+        out = np.lib.format.open_memmap(tmp, mode="w+", dtype=np.float32, shape=(rows, dim))
+        pos = 0
+        if old is not None:
+            for start in range(0, len(old), SEARCH_BLOCK_ROWS):
+                block = old[start:start + SEARCH_BLOCK_ROWS][keep[start:start + SEARCH_BLOCK_ROWS]]
+                out[pos:pos + len(block)] = block
+                pos += len(block)
+        out[pos:] = new_rows
+        out.flush()
+        del out
+        # Open mappings of the old file stay valid after the rename
+        os.replace(tmp, self._path("vectors.npy"))
+        return np.load(self._path("vectors.npy"), mmap_mode="r") if rows else None
+
+    def _build_ivf(self, matrix: Optional[np.ndarray], centroids: Optional[np.ndarray]):
+        """(centroids, lists) for `matrix`, or (None, None) below ivf_min_rows."""
+        n = 0 if matrix is None else len(matrix)
+        if n < self.ivf_min_rows:
+            self.meta["ivf_rows"] = 0
+            return None, None
+        if centroids is None or n > 2 * self.meta["ivf_rows"]:
+            # (Re)train once the corpus has doubled since the last training
+            sample = matrix[np.random.default_rng(0).choice(n, size=min(n, 50000), replace=False)]
+            centroids = _kmeans(np.asarray(sample), max(2, int(math.sqrt(n))))
+            self._save_array("centroids", centroids)
+            self.meta["ivf_rows"] = n
+        lists = np.concatenate([
+            np.argmax(matrix[s:s + SEARCH_BLOCK_ROWS] @ centroids.T, axis=1)
+            for s in range(0, n, SEARCH_BLOCK_ROWS)
+        ]).astype(np.int32)
+        self._save_array("lists", lists)
+        return centroids, np.load(self._path("lists.npy"), mmap_mode="r")
+
+    def _replace_rows(self, file_name: str, new_rows: np.ndarray, new_ids: List[List[Any]]) -> None:
+        """Drop `file_name`'s rows, append `new_rows`, and publish the new snapshot. Caller holds _lock."""
+        matrix, ids, centroids, _ = self._snapshot
+        keep = np.fromiter((f != file_name for f, _ in ids), dtype=bool, count=len(ids))
+        if keep.all() and not len(new_rows):
+            return
+        if not len(new_rows):
+            new_rows = np.zeros((0, matrix.shape[1]), np.float32)
+        matrix = self._swap_matrix(matrix, keep, new_rows)
+        ids = [i for i, k in zip(ids, keep) if k] + new_ids
+        centroids, lists = self._build_ivf(matrix, centroids)
+        self._snapshot = (matrix, ids, centroids, lists)
+        self.meta["ids"] = ids
+
+    # Updates
+
+    def upsert_file(self, file_name: str, sha256: str, chunks: List[Tuple[int, str]]) -> int:
+        """Replace the rows of `file_name` with embeddings of `chunks` [(chunk_id, text)]."""
+        vectors = self.embedder.embed([text for _, text in chunks]) if chunks else np.zeros((0, 0), np.float32)
+        with self._lock:
+            self._replace_rows(file_name, vectors, [[file_name, cid] for cid, _ in chunks])
+            self.meta["files"][file_name] = sha256
+            self._save_meta()
+        return len(chunks)
+
+    def remove_file(self, file_name: str) -> None:
+        with self._lock:
+            self._replace_rows(file_name, np.zeros((0, 0), np.float32), [])
+            self.meta["files"].pop(file_name, None)
+            self._save_meta()
+
+    def sync(self, doc_index) -> Dict[str, Any]:
+        """Embed files the document index changed since the last sync and drop deleted ones."""
+        documents = {d["file_name"]: d["sha256"] for d in doc_index.documents()}
+        changed = [f for f, v in documents.items() if self.meta["files"].get(f) != v]
+        removed = [f for f in self.meta["files"] if f not in documents]
+        for file_name in removed:
+            self.remove_file(file_name)
+        for file_name in changed:
+            chunks = [(c["chunk_id"], c["text"]) for c in doc_index.file_chunks(file_name)]
+            self.upsert_file(file_name, documents[file_name], chunks)
+        return {"embedded": len(changed), "removed": len(removed), "rows": len(self.meta["ids"])}
+
+    # Search
+
+    def search(self, queries: Sequence[str], top_k: int = 20,
+               files: Optional[Iterable[str]] = None) -> List[List[Tuple[Tuple[str, int], float]]]:
+        """For each query, the top_k ((file_name, chunk_id), cosine similarity) pairs."""
+        matrix, ids, centroids, lists = self._snapshot
+        if matrix is None or not len(ids) or not queries:
+            return [[] for _ in queries]
+        q = self.embedder.embed(list(queries))
+        allowed = None
+        if files is not None:
+            wanted = set(files)
+            allowed = np.fromiter((f in wanted for f, _ in ids), dtype=bool, count=len(ids))
+
+        results = []
+        probes = None
+        if centroids is not None and lists is not None:
+            probes = np.argsort(-(q @ centroids.T), axis=1)[:, :self.nprobe]
+        for qi in range(len(q)):
+            if probes is not None:
+                rows = np.flatnonzero(np.isin(lists, probes[qi]))
+            else:
+                rows = None
+            if allowed is not None:
+                rows = np.flatnonzero(allowed) if rows is None else rows[allowed[rows]]
+            results.append(self._top(matrix, q[qi], rows, top_k))
+        return [[(tuple(ids[r]), float(s)) for r, s in found] for found in results]
+
+    @staticmethod
+    def _top(matrix: np.ndarray, query: np.ndarray, rows: Optional[np.ndarray], top_k: int) -> List[Tuple[int, float]]:
+        best_rows, best_scores = np.zeros(0, np.int64), np.zeros(0, np.float32)
+        n = len(matrix) if rows is None else len(rows)
+        for start in range(0, n, SEARCH_BLOCK_ROWS):
+            index = np.arange(start, min(n, start + SEARCH_BLOCK_ROWS)) if rows is None else rows[start:start + SEARCH_BLOCK_ROWS]
+            block = matrix[start:start + SEARCH_BLOCK_ROWS] if rows is None else matrix[index]
+            scores = block @ query
+            best_rows = np.concatenate([best_rows, index])
+            best_scores = np.concatenate([best_scores, scores])
+            if len(best_scores) > top_k:
+                keep = np.argpartition(-best_scores, top_k)[:top_k]
+                best_rows, best_scores = best_rows[keep], best_scores[keep]
+        order = np.argsort(-best_scores)
+        return [(int(best_rows[i]), float(best_scores[i])) for i in order if best_scores[i] > 0]
+
+    def report(self) -> Dict[str, Any]:
+        matrix, ids, centroids, _ = self._snapshot
+        return {
+            "embedder": self.embedder.name,
+            "rows": len(ids),
+            "files": len(self.meta["files"]),
+            "dim": None if matrix is None else int(matrix.shape[1]),
+            "ivf_lists": 0 if centroids is None else len(centroids),
+        }
+
+
+_index: Optional[VectorIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_vector_index() -> VectorIndex:
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = VectorIndex(
+                settings.DOC_VECTOR_DIR, create_embedder(settings.DOC_EMBEDDER),
+                ivf_min_rows=settings.DOC_IVF_MIN_ROWS, nprobe=settings.DOC_IVF_NPROBE,
+            )
+    return _index
+
+
+def search_documents(query: str, token_budget: int, files: Optional[Iterable[str]] = None,
+                     top_k: int = 50) -> List[Dict[str, Any]]:
+    """
+    Hybrid retrieval for the Internal Knowledge agent: semantic (vector) and keyword
+    (BM25) chunk rankings merged by reciprocal rank fusion, filled up to `token_budget`.
+    """
+    from app.tools.doc_index import get_document_index
+
+    doc_index = get_document_index()
+    vectors = get_vector_index()
+    files = list(files) if files is not None else None
+    semantic = vectors.search([query], top_k=top_k, files=files)[0]
+    keyword = doc_index.search(query, token_budget=10 ** 9, files=files, max_chunks=top_k)
+
+    fused: Dict[int, float] = {}
+    for rank, ((_, chunk_id), _) in enumerate(semantic):
+        fused[chunk_id] = fused.get(chunk_id, 0.0) + 1 / (RRF_K + rank)
+    for rank, chunk in enumerate(keyword):
+        fused[chunk["chunk_id"]] = fused.get(chunk["chunk_id"], 0.0) + 1 / (RRF_K + rank)
+
+    chunks = doc_index.chunks_by_id(list(fused))
+    selected, used = [], 0
+    for chunk_id, score in sorted(fused.items(), key=lambda kv: kv[1], reverse=True):
+        chunk = chunks.get(chunk_id)
+        if chunk is None:
+            continue
+        cost = estimate_tokens(chunk["text"])
+        if used + cost > token_budget:
+            continue
+        used += cost
+        selected.append({**chunk, "score": round(score, 5)})
+    return selected
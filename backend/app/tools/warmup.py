@@ -0,0 +1,361 @@
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from app.config.settings import settings
+
+WARMUP_JOBS = ["market", "patents", "trials", "exim"]
+SCHEDULER_POLL_SECONDS = 600
+# A window run counts for the day; the next one is due after this many hours
+MIN_HOURS_BETWEEN_RUNS = 20
+TRADE_FLOWS = ["M", "X"]
+
+
+class RateLimiter:
+    """Spaces calls so that at most `per_minute` start in any minute (0 = unlimited)."""
+
+    def __init__(self, per_minute: float):
+        self.interval = 60.0 / per_minute if per_minute > 0 else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self) -> None:
+        with self._lock:
+            now = time.monotonic()
+            delay = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if delay > 0:
+            time.sleep(delay)
+
+
+def load_watchlist(path: str) -> Dict[str, Any]:
+    """
+    Watchlist JSON: {"molecules": [...], "conditions": [...], "hs_codes": [...],
+    "reporters": [...], "partners": ["0"], "years": 5, "trial_statuses": ["RECRUITING"]}.
+    """
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    return {
+        "molecules": data.get("molecules", []),
+        "conditions": data.get("conditions", []),
+        "hs_codes": data.get("hs_codes", []),
+        "reporters": data.get("reporters", []),
+        "partners": data.get("partners") or ["0"],
+        "years": int(data.get("years", 5)),
+        "trial_statuses": data.get("trial_statuses") or ["RECRUITING"],
+    }
+
+
+class WarmupRunner:
+    """
+    Prefetches watchlist data into the agents' caches so the first query of the day is
+    a cache hit:
+
+    - market: IQVIA rollups, plus every learned IQVIA SQL template rendered for each
+      watchlist molecule (fills the SQL result cache with the queries agents re-run);
+    - patents: the patent text/expiry index, plus learned patent SQL templates per molecule;
+    - trials: ClinicalTrials.gov queries per condition and status into the trial store;
+    - exim: Comtrade imports/exports per HS code, reporter and partner into the Parquet cache.
+
+    Upstream calls are paced per source. Item results are persisted to a JSON status
+    file shared by the server and the CLI, from which coverage and staleness are reported.
+    """
+
+    def __init__(self, watchlist_path: str, status_path: str, stale_hours: float = 24,
+                 comtrade_per_minute: float = 30, trials_per_minute: float = 50, trial_studies: int = 100):
+        self.watchlist_path = watchlist_path
+        self.status_path = status_path
+        self.stale = timedelta(hours=stale_hours)
+        self.comtrade_limiter = RateLimiter(comtrade_per_minute)
+        self.trials_limiter = RateLimiter(trials_per_minute)
+        self.trial_studies = trial_studies
+        self.running = False
+        self._lock = threading.Lock()
+        self.status = self._read_status()
+
+    # Status
+
+    def _read_status(self) -> Dict[str, Any]:
+        if self.status_path and os.path.exists(self.status_path):
+            with open(self.status_path, encoding="utf-8") as f:
+                return json.load(f)
+        return {"items": {}, "runs": []}
+
+    def _save_status(self) -> None:
+        if not self.status_path:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.status_path)), exist_ok=True)
+        tmp = f"{self.status_path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.status, f, indent=2)
+        os.replace(tmp, self.status_path)
+
+    def _record(self, job: str, key: str, started: float, error: Optional[str], detail: Any = None) -> None:
+        with self._lock:
+            self.status["items"][f"{job}:{key}"] = {
+                "job": job,
+                "key": key,
+                "ok": error is None,
+                "error": error,
+                "detail": detail,
+                "warmed_at": datetime.now().isoformat(timespec="seconds"),
+                "seconds": round(time.monotonic() - started, 2),
+            }
+            self._save_status()
+
+    # Jobs
+
+    def _sql_templates(self, namespace: str, columns: List[str], table: str, molecule: str) -> int:
+        from app.tools.sql_plan_cache import get_plan_cache
+        from app.tools.sql_results import is_error
+        from app.tools.supabase_tool import run_guarded_query
+
+        plan_cache = get_plan_cache(namespace, columns, table)
+        if plan_cache is None:
+            return 0
+        # Slots hold the canonical spelling the templates were learned with ("Metformin", not "metformin")
+        canonical = plan_cache.vocab.get("molecule", {}).get(molecule.strip().lower(), molecule)
+        warmed = 0
+        for sql in plan_cache.render({"molecule0": canonical}):
+            result = run_guarded_query(sql, [table])
+            if is_error(result):
+                raise RuntimeError(result.get("message") or result.get("error"))
+            warmed += 1
+        return warmed
+
+    def _market_items(self, watchlist: Dict[str, Any]) -> List[Tuple[str, Callable[[], Any]]]:
+        from app.tools.iqvia_rollups import get_iqvia_rollups
+
+        items = [("rollups", lambda: get_iqvia_rollups().ensure_fresh())]
+        for molecule in watchlist["molecules"]:
+            items.append((molecule, lambda m=molecule: {
+                "templates": self._sql_templates("iqvia", ["molecule", "region"], "iqvia_sales", m)
+            }))
+        return items
+
+    def _patent_items(self, watchlist: Dict[str, Any]) -> List[Tuple[str, Callable[[], Any]]]:
+        from app.tools.patent_index import get_patent_index
+
+        items = [("index", lambda: get_patent_index().ensure_fresh())]
+        for molecule in watchlist["molecules"]:
+            items.append((molecule, lambda m=molecule: {
+                "templates": self._sql_templates("patents", ["molecule", "jurisdiction"], "patents", m)
+            }))
+        return items
+
+    def _trial_items(self, watchlist: Dict[str, Any]) -> List[Tuple[str, Callable[[], Any]]]:
+        from app.tools.fetch_clinical_trial_data import fetch_clinical_trials
+
+        def warm(condition: str, status: str) -> Dict[str, Any]:
+            self.trials_limiter.wait()
+            payload = fetch_clinical_trials({"condition": condition, "status": status, "page_size": self.trial_studies})
+            if "error" in payload:
+                raise RuntimeError(payload["error"])
+            return {"source": payload["source"], "studies": payload["fetched_count"], "total": payload["total_studies"]}
+
+        return [
+            (f"{condition}|{status}", lambda c=condition, s=status: warm(c, s))
+            for condition in watchlist["conditions"] for status in watchlist["trial_statuses"]
+        ]
+
+    def _exim_items(self, watchlist: Dict[str, Any]) -> List[Tuple[str, Callable[[], Any]]]:
+        from app.tools.comtrade_cache import get_comtrade_cache
+
+        this_year = datetime.now().year
+        years = list(range(this_year - watchlist["years"], this_year + 1))
+
+        def warm(hs_name: str, reporter_name: str) -> Dict[str, Any]:
+            from app.agents.exim_agent import fetch_trade_frames, resolve_commodity, resolve_country
+
+            cache = get_comtrade_cache()
+            if cache is None:
+                raise RuntimeError("COMTRADE_CACHE_DIR is not set")
+            hs, reporter = resolve_commodity(hs_name), resolve_country(reporter_name)
+            requested, failed = 0, []
+            for partner in [resolve_country(p) for p in watchlist["partners"]]:
+                for flow in TRADE_FLOWS:
+                    if not cache.missing_years(hs, reporter, partner, flow, years):
+                        continue
+                    self.comtrade_limiter.wait()
+                    requested += 1
+                    failed += fetch_trade_frames([(reporter, partner, hs, flow)], years)[1]
+            if failed:
+                raise RuntimeError(failed[0]["error"])
+            return {"requests": requested}
+
+        return [
+            (f"{hs}|{reporter}", lambda h=hs, r=reporter: warm(h, r))
+            for hs in watchlist["hs_codes"] for reporter in watchlist["reporters"]
+        ]
+
+    def items(self, jobs: Optional[Iterable[str]] = None) -> List[Tuple[str, str, Callable[[], Any]]]:
+        watchlist = load_watchlist(self.watchlist_path)
+        builders = {
+            "market": self._market_items,
+            "patents": self._patent_items,
+            "trials": self._trial_items,
+            "exim": self._exim_items,
+        }
+        return [(job, key, fn) for job in (jobs or WARMUP_JOBS) for key, fn in builders[job](watchlist)]
+
+    # Running
+
+    def run(self, jobs: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+        with self._lock:
+            if self.running:
+                return {"error": "A warm-up run is already in progress"}
+            self.running = True
+        started_at = datetime.now().isoformat(timespec="seconds")
+        started = time.monotonic()
+        ok = failed = 0
+        try:
+            for job, key, fn in self.items(jobs):
+                item_started = time.monotonic()
+                try:
+                    detail = fn()
+                except Exception as e:
+                    print(f"Warm-up {job}:{key} failed: {e}")
+                    self._record(job, key, item_started, str(e))
+                    failed += 1
+                else:
+                    self._record(job, key, item_started, None, detail)
+                    ok += 1
+        finally:
+            run = {"started_at": started_at, "seconds": round(time.monotonic() - started, 1),
+                   "jobs": list(jobs or WARMUP_JOBS), "ok": ok, "failed": failed}
+            with self._lock:
+                self.running = False
+                self.status["runs"] = (self.status["runs"] + [run])[-10:]
+                self._save_status()
+        print(f"Warm-up finished: {ok} items warmed, {failed} failed in {run['seconds']}s")
+        return run
+
+    def run_in_background(self, jobs: Optional[Iterable[str]] = None) -> bool:
+        if self.running:
+            return False
+        threading.Thread(target=self.run, args=(jobs,), name="warmup-run", daemon=True).start()
+        return True
+
+    def last_run_started(self) -> Optional[datetime]:
+        runs = self.status.get("runs") or []
+        return datetime.fromisoformat(runs[-1]["started_at"]) if runs else None
+
+    def report(self) -> Dict[str, Any]:
+        """Per-job coverage (items warmed successfully within the staleness window) and stale/failed items."""
+        now = datetime.now()
+        if not self.running:
+            # Pick up runs made by the CLI in another process
+            self.status = self._read_status()
+        try:
+            expected = [(job, key) for job, key, _ in self.items()]
+        except (OSError, ValueError) as e:
+            return {"error": f"Cannot read watchlist {self.watchlist_path}: {e}"}
+        jobs: Dict[str, Dict[str, Any]] = {}
+        for job, key in expected:
+            entry = self.status["items"].get(f"{job}:{key}")
+            summary = jobs.setdefault(job, {"items": 0, "fresh": 0, "stale": [], "failed": [], "never": [],
+                                            "oldest_warmed_at": None})
+            summary["items"] += 1
+            if entry is None:
+                summary["never"].append(key)
+            elif not entry["ok"]:
+                summary["failed"].append({"key": key, "error": entry["error"]})
+            elif now - datetime.fromisoformat(entry["warmed_at"]) > self.stale:
+                summary["stale"].append(key)
+            else:
+                summary["fresh"] += 1
+            if entry and entry["ok"] and (summary["oldest_warmed_at"] is None or entry["warmed_at"] < summary["oldest_warmed_at"]):
+                summary["oldest_warmed_at"] = entry["warmed_at"]
+        for summary in jobs.values():
+            summary["coverage"] = round(summary["fresh"] / summary["items"], 3) if summary["items"] else 1.0
+        total = sum(s["items"] for s in jobs.values())
+        return {
+            "running": self.running,
+            "coverage": round(sum(s["fresh"] for s in jobs.values()) / total, 3) if total else 1.0,
+            "stale_after_hours": self.stale.total_seconds() / 3600,
+            "jobs": jobs,
+            "runs": self.status.get("runs", []),
+        }
+
+
+def in_window(window: str, now: Optional[datetime] = None) -> bool:
+    """Whether `now` falls inside an "HH:MM-HH:MM" window (which may wrap past midnight)."""
+    start, end = (datetime.strptime(t.strip(), "%H:%M").time() for t in window.split("-"))
+    current = (now or datetime.now()).time()
+    return start <= current < end if start <= end else current >= start or current < end
+
+
+def start_warmup_scheduler(runner: WarmupRunner, window: str) -> threading.Thread:
+    """Background thread that runs the full warm-up once per day inside the off-peak window."""
+
+    def loop():
+        while True:
+            last = runner.last_run_started()
+            due = last is None or datetime.now() - last >= timedelta(hours=MIN_HOURS_BETWEEN_RUNS)
+            if due and in_window(window) and not runner.running:
+                try:
+                    runner.run()
+                except Exception as e:
+                    print(f"Warm-up run failed: {e}")
+            time.sleep(SCHEDULER_POLL_SECONDS)
+
+    thread = threading.Thread(target=loop, name="warmup-scheduler", daemon=True)
+    thread.start()
+    return thread
+
+
+_runner: Optional[WarmupRunner] = None
+_runner_lock = threading.Lock()
+
+
+def get_warmup_runner() -> Optional[WarmupRunner]:
+    """Process-wide runner, or None when WARMUP_WATCHLIST is empty."""
+    global _runner
+    if not settings.WARMUP_WATCHLIST:
+        return None
+    with _runner_lock:
+        if _runner is None:
+            _runner = WarmupRunner(
+                settings.WARMUP_WATCHLIST,
+                settings.WARMUP_STATUS_PATH,
+                stale_hours=settings.WARMUP_STALE_HOURS,
+                comtrade_per_minute=settings.WARMUP_COMTRADE_PER_MINUTE,
+                trials_per_minute=settings.WARMUP_TRIALS_PER_MINUTE,
+                trial_studies=settings.WARMUP_TRIAL_STUDIES,
+            )
+    return _runner
+
+
+def start_background_warmup() -> None:
+    """Called at server startup: schedules warm-ups when a watchlist and window are configured."""
+    runner = get_warmup_runner()
+    if runner is not None and settings.WARMUP_WINDOW:
+        start_warmup_scheduler(runner, settings.WARMUP_WINDOW)
+        print(f"Warm-up scheduler started (window {settings.WARMUP_WINDOW})")
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Prefetch watchlist data into the agents' local caches. From the CLI only the persistent "
+                    "caches (SQL result cache, trial store, Comtrade Parquet cache) are warmed; the in-memory "
+                    "rollups and patent index warm inside the server (POST /api/warmup/run)."
+    )
+    parser.add_argument("command", choices=["run", "status"])
+    parser.add_argument("--job", action="append", choices=WARMUP_JOBS, help="Limit the run to these jobs")
+    args = parser.parse_args()
+    runner = get_warmup_runner()
+    if runner is None:
+        raise SystemExit("WARMUP_WATCHLIST is not set")
+    if args.command == "run":
+        print(json.dumps(runner.run(args.job), indent=2))
+    else:
+        print(json.dumps(runner.report(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
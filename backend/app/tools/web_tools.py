@@ -1,50 +1,120 @@
 import requests
 from bs4 import BeautifulSoup
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Callable, Iterator, Optional
 
 EUROPE_PMC_BASE = "https://www.ebi.ac.uk/europepmc/webservices/rest/search"
+EUROPE_PMC_MAX_PAGE_SIZE = 1000
 HEADERS = {"User-Agent": "WebIntelAgent/1.0"}
 
 
-def search_europepmc(query: str, limit: int = 6) -> List[Dict[str, Any]]:
+def _normalize_europepmc_record(rec: Dict[str, Any]) -> Dict[str, Any]:
     """
-    Query Europe PMC and produce normalized records with robust snippet selection.
+    Map a raw Europe PMC result onto the normalized record shape used by the web agent.
     """
-    params = {"query": query, "format": "json", "pageSize": limit}
-    try:
+    title = rec.get("title") or rec.get("sourceTitle") or ""
+    # Europe PMC sometimes exposes abstract in different keys
+    abstract = rec.get("abstractText") or rec.get("abstract") or rec.get("title")
+    doi = rec.get("doi") or rec.get("doiText") or None
+    pmid = rec.get("pmid") or rec.get("id")
+    url = None
+    if doi:
+        url = f"https://doi.org/{doi}"
+    else:
+        src = rec.get("source", "")
+        uid = rec.get("id")
+        url = f"https://europepmc.org/article/{src}/{uid}" if src and uid else None
+
+    return {
+        "id": doi or pmid or url,
+        "doi": doi,
+        "pmid": pmid,
+        "title": title,
+        "snippet": (abstract or "")[:1000] if abstract else None,
+        "url": url,
+        "date": rec.get("firstPublicationDate") or rec.get("pubYear"),
+        "source": "europepmc",
+        "type": "paper",
+        "raw": rec,
+        "full_text": ""  # to be filled later in search_all
+    }
+
+
+def iter_europepmc_pages(
+    query: str,
+    page_size: int = 100,
+    max_results: Optional[int] = None,
+    stop: Optional[Callable[[Dict[str, Any], int], bool]] = None,
+    result_type: str = "lite",
+) -> Iterator[List[Dict[str, Any]]]:
+    """
+    Walk a Europe PMC result set with cursorMark, yielding one page of normalized records at a time.
+
+    Pages are only requested when the caller asks for the next one, so a slow consumer
+    (e.g. an incremental ranker) naturally throttles the sweep. Iteration ends when the
+    result set is exhausted, `max_results` records have been yielded, or `stop(record, count)`
+    returns True for a record (that record is still included in the final page).
+    Europe PMC returns hits in relevance order, so `stop` can also act as a relevance cut-off.
+    Use result_type="core" when abstracts are needed for downstream ranking.
+    """
+    cursor = "*"
+    yielded = 0
+    page_size = max(1, min(page_size, EUROPE_PMC_MAX_PAGE_SIZE))
+    while True:
+        if max_results is not None:
+            page_size = min(page_size, max_results - yielded)
+            if page_size <= 0:
+                return
+        params = {
+            "query": query,
+            "format": "json",
+            "resultType": result_type,
+            "pageSize": page_size,
+            "cursorMark": cursor,
+        }
         r = requests.get(EUROPE_PMC_BASE, params=params, headers=HEADERS, timeout=15)
         r.raise_for_status()
         j = r.json()
-        hits = []
-        for rec in j.get("resultList", {}).get("result", []):
-            title = rec.get("title") or rec.get("sourceTitle") or ""
-            # Europe PMC sometimes exposes abstract in different keys
-            abstract = rec.get("abstractText") or rec.get("abstract") or rec.get("title")
-            doi = rec.get("doi") or rec.get("doiText") or None
-            pmid = rec.get("pmid") or rec.get("id")
-            url = None
-            if doi:
-                url = f"https://doi.org/{doi}"
-            else:
-                src = rec.get("source", "")
-                uid = rec.get("id")
-                url = f"https://europepmc.org/article/{src}/{uid}" if src and uid else None
-
-            rec_norm = {
-                "id": doi or pmid or url,
-                "doi": doi,
-                "pmid": pmid,
-                "title": title,
-                "snippet": (abstract or "")[:1000] if abstract else None,
-                "url": url,
-                "date": rec.get("firstPublicationDate") or rec.get("pubYear"),
-                "source": "europepmc",
-                "type": "paper",
-                "raw": rec,
-                "full_text": ""  # to be filled later in search_all
-            }
-            hits.append(rec_norm)
-        return hits
+        results = j.get("resultList", {}).get("result", [])
+        if not results:
+            return
+
+        page = []
+        done = False
+        for rec in results:
+            page.append(_normalize_europepmc_record(rec))
+            yielded += 1
+            if stop is not None and stop(page[-1], yielded):
+                done = True
+                break
+        yield page
+
+        next_cursor = j.get("nextCursorMark")
+        if done or not next_cursor or next_cursor == cursor:
+            return
+        cursor = next_cursor
+
+
+def iter_europepmc(
+    query: str,
+    page_size: int = 100,
+    max_results: Optional[int] = None,
+    stop: Optional[Callable[[Dict[str, Any], int], bool]] = None,
+    result_type: str = "lite",
+) -> Iterator[Dict[str, Any]]:
+    """
+    Record-level view over `iter_europepmc_pages` for consumers that rank one document at a time.
+    """
+    for page in iter_europepmc_pages(query, page_size=page_size, max_results=max_results,
+                                     stop=stop, result_type=result_type):
+        yield from page
+
+
+def search_europepmc(query: str, limit: int = 6) -> List[Dict[str, Any]]:
+    """
+    Query Europe PMC and produce normalized records with robust snippet selection.
+    """
+    try:
+        return list(iter_europepmc(query, page_size=limit, max_results=limit))
     except Exception as e:
         print("EuropePMC error:", e)
         return []
@@ -0,0 +1,182 @@
+import math
+import re
+from collections import defaultdict
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Tuple
+
+TOKEN_RE = re.compile(r"[a-z0-9]+(?:[-'][a-z0-9]+)*")
+SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "has", "have",
+    "in", "into", "is", "it", "its", "of", "on", "or", "that", "the", "their", "this",
+    "to", "was", "were", "which", "with", "we", "our", "these", "those", "than", "been",
+    "show", "me", "give", "find", "what", "about", "please", "list",
+}
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens with stopwords removed."""
+    if not text:
+        return []
+    return [t for t in TOKEN_RE.findall(text.lower()) if t not in STOPWORDS]
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap LLM token estimate (~4 characters per token) used for prompt budgeting."""
+    return max(1, len(text) // 4) if text else 0
+
+
+def split_sentences(text: str) -> List[str]:
+    return [s.strip() for s in SENTENCE_RE.split(text or "") if s.strip()]
+
+
+def split_passages(text: str, max_words: int = 80) -> List[str]:
+    """
+    Split text into passages of whole sentences, each at most ~max_words long.
+    Sentences longer than max_words are cut into word windows.
+    """
+    passages: List[str] = []
+    current: List[str] = []
+    count = 0
+    for sent in split_sentences(text):
+        words = sent.split()
+        while len(words) > max_words:
+            if current:
+                passages.append(" ".join(current))
+                current, count = [], 0
+            passages.append(" ".join(words[:max_words]))
+            words = words[max_words:]
+        if count + len(words) > max_words and current:
+            passages.append(" ".join(current))
+            current, count = [], 0
+        if words:
+            current.append(" ".join(words))
+            count += len(words)
+    if current:
+        passages.append(" ".join(current))
+    return passages
+
+
+class BM25Index:
+    """
+    Small in-memory BM25 index over an inverted posting list.
+
+    Keys can be any hashable (passage ids, (doc, page, chunk) tuples, ...).
+    Documents can be added and removed incrementally; statistics are kept up to date.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, Dict[Hashable, int]] = defaultdict(dict)
+        self.doc_len: Dict[Hashable, int] = {}
+        self.doc_terms: Dict[Hashable, List[str]] = {}
+        self.total_len = 0
+
+    def __len__(self) -> int:
+        return len(self.doc_len)
+
+    def add(self, key: Hashable, text: str) -> None:
+        if key in self.doc_len:
+            self.remove(key)
+        tokens = tokenize(text)
+        tf: Dict[str, int] = defaultdict(int)
+        for t in tokens:
+            tf[t] += 1
+        for term, freq in tf.items():
+            self.postings[term][key] = freq
+        self.doc_len[key] = len(tokens)
+        self.doc_terms[key] = list(tf)
+        self.total_len += len(tokens)
+
+    def remove(self, key: Hashable) -> None:
+        length = self.doc_len.pop(key, None)
+        if length is None:
+            return
+        self.total_len -= length
+        for term in self.doc_terms.pop(key, []):
+            plist = self.postings.get(term)
+            if plist is not None:
+                plist.pop(key, None)
+                if not plist:
+                    del self.postings[term]
+
+    def score(self, query: str) -> Dict[Hashable, float]:
+        n = len(self.doc_len)
+        if n == 0:
+            return {}
+        avgdl = self.total_len / n or 1.0
+        scores: Dict[Hashable, float] = defaultdict(float)
+        for term in set(tokenize(query)):
+            plist = self.postings.get(term)
+            if not plist:
+                continue
+            df = len(plist)
+            idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+            for key, freq in plist.items():
+                norm = self.k1 * (1 - self.b + self.b * self.doc_len[key] / avgdl)
+                scores[key] += idf * freq * (self.k1 + 1) / (freq + norm)
+        return scores
+
+    def search(self, query: str, top_k: Optional[int] = None) -> List[Tuple[Hashable, float]]:
+        ranked = sorted(self.score(query).items(), key=lambda kv: kv[1], reverse=True)
+        return ranked[:top_k] if top_k else ranked
+
+
+def rank_passages(
+    query: str,
+    documents: List[Dict[str, Any]],
+    token_budget: int = 1500,
+    fields: Iterable[str] = ("title", "snippet", "full_text"),
+    max_words: int = 80,
+    fallback_fields: Iterable[str] = (),
+) -> List[Dict[str, Any]]:
+    """
+    Split each document's text fields into passages, score them against `query` with BM25,
+    and return the best passages that fit within `token_budget`.
+
+    Each returned passage carries the index of its source document, so callers can
+    rebuild per-document payloads. Passages come back in descending score order.
+    With `fallback_fields`, a document left without a passage (no query term in common)
+    gets the first passage of the first non-empty fallback field, with score 0, while
+    the budget allows.
+    """
+    fields = list(fields)
+    index = BM25Index()
+    passages: Dict[Tuple[int, int], Dict[str, Any]] = {}
+    first: Dict[Tuple[int, str], Tuple[int, int]] = {}
+    for doc_idx, doc in enumerate(documents):
+        seen: Dict[str, Tuple[int, int]] = {}
+        n = 0
+        for field in list(dict.fromkeys(fields + list(fallback_fields))):
+            for text in split_passages(doc.get(field) or "", max_words=max_words):
+                if text in seen:
+                    first.setdefault((doc_idx, field), seen[text])
+                    continue
+                key = seen[text] = (doc_idx, n)
+                first.setdefault((doc_idx, field), key)
+                passages[key] = {"doc_index": doc_idx, "field": field, "text": text}
+                if field in fields:
+                    index.add(key, text)
+                n += 1
+
+    selected: List[Dict[str, Any]] = []
+    used = 0
+    for key, score in index.search(query):
+        cost = estimate_tokens(passages[key]["text"])
+        if used + cost > token_budget:
+            continue
+        used += cost
+        selected.append({**passages[key], "score": round(score, 4)})
+
+    covered = {p["doc_index"] for p in selected}
+    for doc_idx in range(len(documents)):
+        key = next((first[(doc_idx, f)] for f in fallback_fields if (doc_idx, f) in first), None)
+        if doc_idx in covered or key is None:
+            continue
+        cost = estimate_tokens(passages[key]["text"])
+        if used + cost > token_budget:
+            continue
+        used += cost
+        selected.append({**passages[key], "score": 0.0})
+    return selected
@@ -0,0 +1,87 @@
+import json
+from typing import Any, Dict, List, Optional, Sequence
+
+DELIMITER = "|"
+
+
+def _cell(value: Any) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, float):
+        return f"{value:.6g}"
+    if isinstance(value, list) and all(_is_flat(v) for v in value):
+        value = ",".join(_cell(v) for v in value)
+    elif isinstance(value, (dict, list)):
+        value = json.dumps(value, separators=(",", ":"), default=str)
+    text = str(value).replace("\n", " ").replace("\r", " ")
+    return text.replace(DELIMITER, "\\" + DELIMITER)
+
+
+def _is_flat(value: Any) -> bool:
+    return not isinstance(value, (dict, list)) or (
+        isinstance(value, list) and all(not isinstance(v, (dict, list)) for v in value)
+    )
+
+
+def _is_row_set(value: Any) -> bool:
+    """A non-empty list of dicts whose values are all scalars (or lists of scalars)."""
+    return (
+        isinstance(value, list) and bool(value)
+        and all(isinstance(v, dict) and all(_is_flat(x) for x in v.values()) for v in value)
+    )
+
+
+def encode_rows(name: str, rows: List[Dict[str, Any]], columns: Optional[Sequence[str]] = None) -> str:
+    """
+    Encode a list of dicts as one header line plus one delimited line per row:
+
+        studies[3]{nct_id|phase|enrollment}
+        NCT01|PHASE3|120
+        ...
+
+    Keys appear once in the header. Columns holding the same value in every row are
+    hoisted out as `name.column=value` lines instead of being repeated per row.
+    """
+    if columns is None:
+        columns = list(dict.fromkeys(k for row in rows for k in row))
+    columns = list(columns)
+
+    constant = []
+    if len(rows) > 1:
+        for col in columns:
+            first = rows[0].get(col)
+            if all(row.get(col) == first for row in rows[1:]):
+                constant.append(col)
+    varying = [c for c in columns if c not in constant]
+
+    lines = [f"{name}.{col}={_cell(rows[0].get(col))}" for col in constant]
+    lines.append(f"{name}[{len(rows)}]{{{DELIMITER.join(varying)}}}")
+    lines.extend(DELIMITER.join(_cell(row.get(c)) for c in varying) for row in rows)
+    return "\n".join(lines)
+
+
+def encode_payload(payload: Any, name: Optional[str] = None) -> str:
+    """
+    Compact, indentation-free encoding of a tool result for LLM messages.
+    Scalars become `key=value` lines, row sets (lists of flat dicts) become encode_rows
+    tables, nested dicts and lists of nested values are flattened with dotted/indexed keys.
+    """
+    if _is_row_set(payload):
+        return encode_rows(name or "rows", payload)
+    if isinstance(payload, list) and payload and not all(_is_flat(v) for v in payload):
+        return "\n".join(encode_payload(v, f"{name or 'rows'}[{i}]") for i, v in enumerate(payload))
+    if not isinstance(payload, dict):
+        return payload if isinstance(payload, str) else _cell(payload)
+
+    lines = []
+    for key, value in payload.items():
+        path = f"{name}.{key}" if name else key
+        if _is_row_set(value):
+            lines.append(encode_rows(path, value))
+        elif (isinstance(value, dict) and value) or not _is_flat(value):
+            lines.append(encode_payload(value, path))
+        else:
+            lines.append(f"{path}={_cell(value)}")
+    return "\n".join(lines)
@@ -19,6 +19,15 @@ import os
 os.makedirs("generated_reports", exist_ok=True)
 app.mount("/reports", StaticFiles(directory="generated_reports"), name="reports")
 
+@app.on_event("startup")
+async def start_background_jobs():
+    from app.config.settings import settings
+    from app.tools.doc_catalog import start_catalog_scanner
+    from app.tools.warmup import start_background_warmup
+
+    start_background_warmup()
+    start_catalog_scanner(settings.DOC_SCAN_INTERVAL_SECONDS)
+
 class ChatRequest(BaseModel):
     query: str
 
@@ -50,6 +59,103 @@ async def chat_endpoint(request: ChatRequest):
         print(f"Error processing query: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/sql-plan-cache")
+async def sql_plan_cache_endpoint():
+    from app.tools.sql_plan_cache import plan_cache_stats
+
+    return {"caches": plan_cache_stats()}
+
+@app.get("/api/sql-result-cache")
+async def sql_result_cache_endpoint():
+    from app.tools.sql_result_cache import get_result_cache
+
+    cache = get_result_cache()
+    return {"enabled": cache is not None, **(cache.report() if cache else {})}
+
+@app.get("/api/comtrade-cache")
+async def comtrade_cache_endpoint():
+    from starlette.concurrency import run_in_threadpool
+    from app.tools.comtrade_cache import get_comtrade_cache
+
+    cache = get_comtrade_cache()
+    # report() walks the Parquet cache directory
+    return {"enabled": cache is not None, **(await run_in_threadpool(cache.report) if cache else {})}
+
+@app.get("/api/sql-results/{handle}")
+async def sql_result_page_endpoint(handle: str, offset: int = 0, limit: int = 100):
+    from starlette.concurrency import run_in_threadpool
+    from app.tools.sql_results import fetch_result_page
+
+    page = await run_in_threadpool(fetch_result_page, handle, offset, limit)
+    if "error" in page:
+        raise HTTPException(status_code=404, detail=page["error"])
+    return page
+
+@app.get("/api/sql-replica")
+async def sql_replica_status_endpoint():
+    from app.tools.sql_backends import get_sql_backend
+    from app.tools.sql_replica import ReplicaBackend
+
+    backend = get_sql_backend()
+    if not isinstance(backend, ReplicaBackend):
+        return {"enabled": False}
+    return {"enabled": True, **backend.status()}
+
+@app.post("/api/sql-replica/sync")
+async def sql_replica_sync_endpoint():
+    from starlette.concurrency import run_in_threadpool
+    from app.tools.sql_backends import get_sql_backend
+    from app.tools.sql_replica import ReplicaBackend
+
+    backend = get_sql_backend()
+    if not isinstance(backend, ReplicaBackend):
+        raise HTTPException(status_code=400, detail="SQL_REPLICA_PATH is not set")
+    return {"synced": await run_in_threadpool(backend.sync)}
+
+@app.get("/api/warmup")
+async def warmup_status_endpoint():
+    from starlette.concurrency import run_in_threadpool
+    from app.tools.warmup import get_warmup_runner
+
+    runner = get_warmup_runner()
+    if runner is None:
+        return {"enabled": False}
+    return {"enabled": True, **await run_in_threadpool(runner.report)}
+
+@app.post("/api/warmup/run")
+async def warmup_run_endpoint():
+    from app.tools.warmup import get_warmup_runner
+
+    runner = get_warmup_runner()
+    if runner is None:
+        raise HTTPException(status_code=400, detail="WARMUP_WATCHLIST is not set")
+    return {"started": runner.run_in_background()}
+
+@app.get("/api/documents")
+async def documents_endpoint():
+    from starlette.concurrency import run_in_threadpool
+    from app.tools.doc_catalog import get_document_catalog
+
+    catalog = get_document_catalog()
+    return {**await run_in_threadpool(catalog.report), "documents": await run_in_threadpool(catalog.documents)}
+
+@app.get("/api/analysis-cache")
+async def analysis_cache_endpoint():
+    from starlette.concurrency import run_in_threadpool
+    from app.tools.analysis_cache import get_analysis_cache
+
+    cache = get_analysis_cache()
+    if cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **await run_in_threadpool(cache.report)}
+
+@app.post("/api/documents/scan")
+async def documents_scan_endpoint():
+    from starlette.concurrency import run_in_threadpool
+    from app.tools.doc_catalog import refresh_documents
+
+    return await run_in_threadpool(refresh_documents)
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
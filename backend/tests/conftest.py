@@ -0,0 +1,6 @@
+import os
+import sys
+
+# Tests import the backend as the app does (`from app...`) and never reach the LLM APIs
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("GOOGLE_API_KEY", "test")
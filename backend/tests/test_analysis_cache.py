@@ -0,0 +1,56 @@
+import os
+
+import pytest
+
+from app.tools.analysis_cache import AnalysisCache, normalize_query
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return AnalysisCache(str(tmp_path / "analysis"), max_entries=2)
+
+
+def store(cache, hashes, query, analysis="analysis"):
+    key = cache.key(hashes, query, "model")
+    with open(cache.briefing_path(key), "wb") as f:
+        f.write(b"%PDF")
+    cache.put(key, query, "model", hashes, analysis, {"summary": analysis})
+    return key
+
+
+def test_rephrasings_share_a_key(cache):
+    assert normalize_query("Show me the Metformin sales?") == "metformin sales"
+    assert cache.key(["b", "a"], "Show me metformin sales", "m") == cache.key(["a", "b"], "metformin sales?", "m")
+    assert cache.key(["a"], "metformin sales", "m") != cache.key(["a"], "metformin sales", "other-model")
+
+
+def test_hit_returns_the_stored_briefing(cache):
+    key = store(cache, ["h1"], "metformin sales", "text")
+    hit = cache.get(key)
+    assert hit == {"analysis": "text", "briefing_args": {"summary": "text"}, "pdf_path": cache.briefing_path(key)}
+    assert cache.report()["hits"] == 1
+
+
+def test_changed_document_invalidates_its_entries(cache):
+    kept = store(cache, ["h1"], "metformin sales")
+    dropped = store(cache, ["h1", "h2"], "metformin patents")
+    assert cache.invalidate(["h1", "h3"]) == 1
+    assert cache.get(dropped) is None
+    assert cache.get(kept) is not None
+
+
+def test_least_recently_used_entry_is_evicted_with_its_pdf(cache):
+    first = store(cache, ["h1"], "first question")
+    second = store(cache, ["h1"], "second question")
+    cache.get(first)
+    store(cache, ["h1"], "third question")
+    assert cache.get(second) is None and not os.path.exists(cache.briefing_path(second))
+    assert cache.get(first) is not None
+    assert cache.report()["evicted"] == 1
+
+
+def test_missing_pdf_is_a_miss(cache):
+    key = store(cache, ["h1"], "metformin sales")
+    os.remove(cache.briefing_path(key))
+    assert cache.get(key) is None
+    assert cache.report()["entries"] == 0
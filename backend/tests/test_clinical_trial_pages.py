@@ -0,0 +1,64 @@
+import asyncio
+
+import httpx
+
+from app.tools.fetch_clinical_trial_data import CT_API_URL, aiter_clinical_trials, build_study_params
+
+
+def raw_study(n):
+    return {"protocolSection": {
+        "identificationModule": {"nctId": f"NCT{n:08d}", "briefTitle": f"Study {n}"},
+        "statusModule": {"overallStatus": "RECRUITING", "lastUpdatePostDateStruct": {"date": "2024-01-01"}},
+    }}
+
+
+def api(total, page_size_seen):
+    """Fake /studies endpoint serving `total` studies, recording the requested page sizes."""
+
+    def handler(request):
+        assert str(request.url).startswith(CT_API_URL)
+        size = int(request.url.params["pageSize"])
+        page_size_seen.append(size)
+        start = int(request.url.params.get("pageToken", 0))
+        end = min(start + size, total)
+        body = {"studies": [raw_study(n) for n in range(start, end)]}
+        if "countTotal" in request.url.params:
+            body["totalCount"] = total
+        if end < total:
+            body["nextPageToken"] = str(end)
+        return httpx.Response(200, json=body)
+
+    return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+
+def collect(args, max_studies, client):
+    async def run():
+        return [page async for page in aiter_clinical_trials(args, max_studies, client=client)]
+
+    return asyncio.run(run())
+
+
+def test_pages_follow_the_token_up_to_the_cap():
+    sizes = []
+    pages = collect({"condition": "asthma"}, 1500, api(2500, sizes))
+    assert sizes == [1000, 500]
+    assert [len(p["studies"]) for p in pages] == [1000, 500]
+    assert pages[0]["total_count"] == 2500 and pages[1]["total_count"] is None
+    assert pages[0]["studies"][0]["nct_id"] == "NCT00000000"
+
+
+def test_pages_stop_when_results_run_out():
+    sizes = []
+    pages = collect({"condition": "asthma"}, 1000, api(30, sizes))
+    assert sizes == [1000]
+    assert len(pages) == 1 and pages[0]["next_page_token"] is None
+
+
+def test_study_params_project_fields_and_filters():
+    params = build_study_params({"condition": "asthma", "phase": "PHASE_3", "updated_since": "2024-01-01"}, 50)
+    assert params["pageSize"] == 50
+    assert "NCTId" in params["fields"].split(",")
+    assert params["filter.overallStatus"] == "RECRUITING"
+    assert params["filter.advanced"] == "AREA[Phase]PHASE3 AND AREA[LastUpdatePostDate]RANGE[2024-01-01,MAX]"
+    assert "filter.overallStatus" not in build_study_params({"condition": "asthma", "status": None}, 5)
+    assert "countTotal" not in build_study_params({"condition": "asthma"}, 5, page_token="abc")
@@ -0,0 +1,55 @@
+import json
+from types import SimpleNamespace
+
+from app.agents.clinical_trials_agent import ClinicalTrialsReport, _collect_fetch_result, total_found
+from app.tools.clinical_trials_analytics import build_trials_report
+
+
+def tool_call(args):
+    return SimpleNamespace(function=SimpleNamespace(arguments=json.dumps(args)))
+
+
+def payload(ids, total):
+    studies = [{"nct_id": i, "brief_title": i, "overall_status": "RECRUITING", "phase": "PHASE3",
+                "lead_sponsor_name": "Acme", "sponsor_class": "INDUSTRY", "enrollment": 100} for i in ids]
+    return {"studies": studies, "total_studies": total, "search_condition": "asthma"}
+
+
+def collect(calls):
+    fetched = {"condition": None, "totals": {}, "studies": {}}
+    for args, result in calls:
+        _collect_fetch_result(tool_call(args), result, fetched)
+    return fetched
+
+
+def test_repeated_query_is_counted_once():
+    fetched = collect([({"condition": "asthma"}, payload(["A", "B"], 2)),
+                       ({"condition": "Asthma", "status": "RECRUITING"}, payload(["A", "B"], 2))])
+    assert total_found(fetched) == 2
+
+
+def test_overlapping_status_and_phase_queries_are_deduplicated():
+    fetched = collect([({"condition": "asthma"}, payload(["A", "B", "C"], 3)),
+                       ({"condition": "asthma", "phase": "PHASE3"}, payload(["B", "C"], 2)),
+                       ({"condition": "asthma", "status": "COMPLETED"}, payload(["D"], 1))])
+    assert total_found(fetched) == 4
+
+
+def test_partially_fetched_query_keeps_its_total():
+    fetched = collect([({"condition": "asthma"}, payload(["A", "B"], 250)),
+                       ({"condition": "asthma", "phase": "PHASE3"}, payload(["B", "E"], 40))])
+    assert total_found(fetched) == 250
+
+
+def test_errors_are_ignored():
+    fetched = collect([({"condition": "asthma"}, {"error": "API request failed"})])
+    assert total_found(fetched) == 0 and fetched["condition"] is None
+
+
+def test_report_validates():
+    fetched = collect([({"condition": "asthma"}, payload(["A", "B"], 2))])
+    report = build_trials_report(list(fetched["studies"].values()), "asthma", "asthma trials",
+                                 total_found=total_found(fetched))
+    report["narrative"] = None
+    parsed = ClinicalTrialsReport.model_validate(report)
+    assert parsed.active_trials.total_found == 2
@@ -0,0 +1,67 @@
+import os
+
+import pytest
+
+from app.tools.doc_catalog import DocumentCatalog
+from app.tools.doc_index import DocumentIndex
+
+
+@pytest.fixture
+def folder(tmp_path):
+    path = tmp_path / "data"
+    path.mkdir()
+    (path / "trials.txt").write_text("Phase 3 metformin trial results.\nEnrollment was 400 patients.")
+    (path / "market.md").write_text("# Market notes\nSemaglutide sales grew in Europe.")
+    (path / "ignored.csv").write_text("a,b")
+    return path
+
+
+@pytest.fixture
+def catalog(tmp_path, folder):
+    return DocumentCatalog(str(folder), str(tmp_path / "catalog.db"))
+
+
+def counts(result):
+    return {k: result[k] for k in ("new", "changed", "touched", "removed", "failed")}
+
+
+def test_scan_is_incremental(catalog, folder):
+    assert counts(catalog.scan()) == {"new": 2, "changed": 0, "touched": 0, "removed": 0, "failed": 0}
+    assert counts(catalog.scan()) == {"new": 0, "changed": 0, "touched": 0, "removed": 0, "failed": 0}
+    titles = {d["file_name"]: d["title"] for d in catalog.documents()}
+    assert titles == {"market.md": "# Market notes", "trials.txt": "Phase 3 metformin trial results."}
+
+    trials = folder / "trials.txt"
+    os.utime(trials, (1, 1))
+    assert catalog.scan()["touched"] == 1
+    before = catalog.hashes(["trials.txt"])["trials.txt"]
+    trials.write_text("Phase 3 metformin trial stopped early.")
+    assert catalog.scan()["changed"] == 1
+    after = catalog.hashes(["trials.txt"])["trials.txt"]
+    assert after != before
+    assert catalog.pages(after) == ["Phase 3 metformin trial stopped early."]
+    assert catalog.pages(before) == []
+
+    (folder / "market.md").unlink()
+    assert catalog.scan()["removed"] == 1
+    assert [d["file_name"] for d in catalog.documents()] == ["trials.txt"]
+
+
+def test_generated_briefing_is_not_cataloged(catalog, folder):
+    (folder / "briefing_report.pdf").write_bytes(b"%PDF-1.4")
+    catalog.scan()
+    assert "briefing_report.pdf" not in {d["file_name"] for d in catalog.documents()}
+
+
+def test_index_follows_the_catalog(tmp_path, catalog, folder):
+    index = DocumentIndex(str(tmp_path / "index.db"), chunk_words=50)
+    catalog.scan()
+    assert index.ingest(catalog)["indexed"] == 2
+    assert index.ingest(catalog)["indexed"] == 0
+    assert [c["file_name"] for c in index.search("semaglutide sales")] == ["market.md"]
+    assert index.search("semaglutide", files=["trials.txt"]) == []
+
+    (folder / "market.md").unlink()
+    catalog.scan()
+    assert index.ingest(catalog)["removed"] == 1
+    assert index.search("semaglutide sales") == []
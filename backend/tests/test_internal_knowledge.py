@@ -0,0 +1,30 @@
+from app.agents.internal_knowledge_agent import select_documents
+
+
+def chunk(file_name, score):
+    return {"file_name": file_name, "score": score}
+
+
+def test_single_strong_document_is_analyzed_alone():
+    chunks = [chunk("a.pdf", 0.033 - n * 0.001) for n in range(8)]
+    # One weak hit each in other documents, as the hashing embedder produces
+    chunks += [chunk("b.pdf", 0.012), chunk("c.pdf", 0.011), chunk("d.pdf", 0.010)]
+    assert select_documents(chunks, limit=5, min_ratio=0.5, min_top_chunks=3) == ["a.pdf"]
+
+
+def test_comparable_documents_are_all_selected():
+    chunks = [chunk("a.pdf", 0.03), chunk("b.pdf", 0.029), chunk("a.pdf", 0.02), chunk("b.pdf", 0.018),
+              chunk("c.pdf", 0.005)]
+    assert select_documents(chunks, limit=5, min_ratio=0.5, min_top_chunks=3) == ["a.pdf", "b.pdf"]
+
+
+def test_document_with_several_top_chunks_qualifies():
+    chunks = [chunk("a.pdf", 0.033 - n * 0.001) for n in range(12)]
+    chunks += [chunk("b.pdf", 0.03), chunk("b.pdf", 0.029), chunk("b.pdf", 0.028)]
+    assert select_documents(chunks, limit=5, min_ratio=0.9, min_top_chunks=3) == ["a.pdf", "b.pdf"]
+
+
+def test_limit_and_empty_input():
+    chunks = [chunk(f"{n}.pdf", 0.03) for n in range(8)]
+    assert len(select_documents(chunks, limit=5, min_ratio=0.5, min_top_chunks=3)) == 5
+    assert select_documents([], limit=5) == []
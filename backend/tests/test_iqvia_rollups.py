@@ -0,0 +1,101 @@
+import sqlite3
+
+import pytest
+
+from app.tools.iqvia_rollups import IQVIARollups
+from app.tools.sql_backends import SQLiteBackend
+
+
+def sale(molecule, region, year, value, competitors=None):
+    return {"molecule": molecule, "region": region, "year": year, "sales_value": value,
+            "sales_volume": value / 10, "cagr": 5.0, "competitors": competitors}
+
+
+SALES = [
+    sale("Metformin", "EU", 2021, 100.0, "Sitagliptin, Empagliflozin"),
+    sale("Metformin", "EU", 2023, 144.0),
+    sale("Metformin", "US", 2023, 50.0),
+    sale("Sitagliptin", "EU", 2023, 80.0),
+    sale("Sitagliptin", "US", 2023, 120.0),
+]
+
+
+@pytest.fixture
+def backend(tmp_path):
+    backend = SQLiteBackend(str(tmp_path / "data.db"))
+    backend.load_rows("iqvia_sales", SALES)
+    return backend
+
+
+@pytest.fixture
+def rollups(backend):
+    queries = []
+
+    def loader(sql):
+        queries.append(sql)
+        return backend.fetch(sql)
+
+    rollups = IQVIARollups(loader)
+    rollups.queries = queries
+    rollups.refresh()
+    return rollups
+
+
+def test_top_molecules_per_region_and_year(rollups):
+    overall = rollups.query("top_molecules")
+    assert [(r["molecule"], r["sales_value"]) for r in overall] == [("Metformin", 294.0), ("Sitagliptin", 200.0)]
+    us = rollups.query("top_molecules", region="us", year=2023)
+    assert [r["molecule"] for r in us] == ["Sitagliptin", "Metformin"]
+    assert rollups.query("top_molecules", region="APAC") == []
+
+
+def test_region_breakdown_defaults_to_latest_year(rollups):
+    rows = rollups.query("region_breakdown", molecule="metformin")
+    assert [(r["region"], r["year"], r["sales_value"]) for r in rows] == [("EU", 2023, 144.0), ("US", 2023, 50.0)]
+
+
+def test_yearly_trend_and_computed_cagr(rollups):
+    trend = rollups.query("yearly_trend", molecule="Metformin", region="EU")
+    assert [(r["year"], r["sales_value"]) for r in trend] == [(2021, 100.0), (2023, 144.0)]
+    assert trend[1]["yoy_growth"] == pytest.approx(0.44)
+
+    (eu,) = rollups.query("cagr", molecule="Metformin", region="EU")
+    assert eu["computed_cagr"] == pytest.approx(0.2)
+    assert eu["cagr"] == 5.0
+    (us,) = rollups.query("cagr", molecule="Metformin", region="US")
+    assert us["computed_cagr"] is None
+
+
+def test_competitors_lists_missing_ones(rollups):
+    rows = rollups.query("competitors", molecule="Metformin", region="EU")
+    assert [(r["molecule"], r["is_competitor"]) for r in rows] == [
+        ("Metformin", False), ("Sitagliptin", True), ("Empagliflozin", True),
+    ]
+    assert rows[-1]["note"] == "no sales data"
+
+
+def test_bad_arguments(rollups):
+    assert "error" in rollups.query("market_share")
+    assert "error" in rollups.query("yearly_trend", molecule="Unknown")
+
+
+def test_refresh_rereads_only_changed_molecules(rollups, backend):
+    assert rollups.refresh()["changed"] == 0
+
+    backend.load_rows("iqvia_sales", [sale("Sitagliptin", "EU", 2024, 90.0)])
+    del rollups.queries[:]
+    result = rollups.refresh()
+    assert result["changed"] == 1
+    (raw,) = rollups.queries[1:]
+    assert "'Sitagliptin'" in raw and "'Metformin'" not in raw
+    assert rollups.query("top_molecules", year=2024)[0]["sales_value"] == 90.0
+
+    with sqlite3.connect(backend.path) as conn:
+        conn.execute("DELETE FROM iqvia_sales WHERE molecule = 'Metformin'")
+    assert rollups.refresh()["removed"] == 1
+    assert [r["molecule"] for r in rollups.query("top_molecules")] == ["Sitagliptin"]
+
+
+def test_loader_errors_raise(backend):
+    with pytest.raises(RuntimeError, match="no connection"):
+        IQVIARollups(lambda sql: {"error": "no connection"}).refresh()
@@ -0,0 +1,105 @@
+import pytest
+
+from app.tools.sql_guard import SQLGuardError, check_plan_cost, guard_sql
+
+TABLES = ["iqvia_sales", "patents"]
+
+
+def rejected(sql, code):
+    with pytest.raises(SQLGuardError) as e:
+        guard_sql(sql, TABLES, max_rows=100)
+    assert e.value.code == code
+
+
+def test_bare_from_gets_a_limit():
+    assert guard_sql("SELECT * FROM iqvia_sales", TABLES, max_rows=100) == "SELECT * FROM iqvia_sales\nLIMIT 100"
+
+
+def test_trailing_semicolon_is_dropped():
+    assert guard_sql("SELECT molecule FROM iqvia_sales;", TABLES, max_rows=100) == \
+        "SELECT molecule FROM iqvia_sales\nLIMIT 100"
+
+
+def test_extract_from_is_not_a_table():
+    sql = "SELECT EXTRACT(year FROM expiration_date) AS y FROM patents"
+    assert guard_sql(sql, TABLES, max_rows=100) == sql + "\nLIMIT 100"
+
+
+def test_cte_ending_with_the_relation():
+    sql = "WITH s AS (SELECT * FROM iqvia_sales) SELECT * FROM s"
+    assert guard_sql(sql, TABLES, max_rows=100) == sql + "\nLIMIT 100"
+
+
+def test_comma_join_of_allowed_tables():
+    sql = "SELECT * FROM iqvia_sales s, patents p WHERE s.molecule = p.molecule"
+    assert guard_sql(sql, TABLES, max_rows=100).endswith("LIMIT 100")
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT * FROM iqvia_sales, pg_catalog.pg_authid",
+    "SELECT * FROM iqvia_sales s, users u WHERE s.molecule = u.name",
+    "SELECT * FROM (SELECT * FROM patents, secrets) x",
+    "SELECT * FROM users",
+])
+def test_unknown_tables_are_rejected(sql):
+    rejected(sql, "unknown_table")
+
+
+def test_function_sources_are_allowed():
+    sql = "SELECT * FROM iqvia_sales s, unnest(string_to_array(s.competitors, ',')) c"
+    assert guard_sql(sql, TABLES, max_rows=100).endswith("LIMIT 100")
+
+
+@pytest.mark.parametrize("sql", [
+    "DELETE FROM iqvia_sales",
+    "SELECT * INTO copy FROM iqvia_sales",
+    "SELECT set_config('statement_timeout', '0', false) FROM iqvia_sales",
+    "SELECT current_setting('statement_timeout')",
+    "SELECT pg_sleep(10)",
+    "SELECT * FROM patents FOR UPDATE",
+])
+def test_writes_and_session_changes_are_rejected(sql):
+    with pytest.raises(SQLGuardError):
+        guard_sql(sql, TABLES, max_rows=100)
+
+
+def test_multiple_statements_are_rejected():
+    rejected("SELECT 1 FROM patents; SELECT 2 FROM patents", "multiple_statements")
+
+
+def test_keywords_inside_literals_are_ignored():
+    sql = "SELECT * FROM patents WHERE title = 'delete; drop from users'"
+    assert guard_sql(sql, TABLES, max_rows=100) == sql + "\nLIMIT 100"
+
+
+def test_limit_is_lowered_to_the_cap():
+    assert guard_sql("SELECT * FROM patents LIMIT 5000", TABLES, max_rows=100) == "SELECT * FROM patents LIMIT 100"
+    assert guard_sql("SELECT * FROM patents LIMIT 10", TABLES, max_rows=100) == "SELECT * FROM patents LIMIT 10"
+
+
+def test_subquery_limit_does_not_count_as_the_cap():
+    sql = "SELECT * FROM (SELECT * FROM patents LIMIT 5) p"
+    assert guard_sql(sql, TABLES, max_rows=100) == sql + "\nLIMIT 100"
+
+
+def test_fetch_first_is_the_row_cap():
+    assert guard_sql("SELECT * FROM patents FETCH FIRST 500 ROWS ONLY", TABLES, max_rows=100) == \
+        "SELECT * FROM patents FETCH FIRST 100 ROWS ONLY"
+    sql = "SELECT * FROM patents FETCH FIRST 5 ROWS ONLY"
+    assert guard_sql(sql, TABLES, max_rows=100) == sql
+
+
+class FakeBackend:
+    def __init__(self, cost):
+        self.cost = cost
+
+    def explain_cost(self, sql):
+        return self.cost
+
+
+def test_plan_cost_ceiling():
+    assert check_plan_cost("SELECT 1", FakeBackend(10.0), max_cost=100) == 10.0
+    assert check_plan_cost("SELECT 1", FakeBackend(None), max_cost=100) is None
+    with pytest.raises(SQLGuardError) as e:
+        check_plan_cost("SELECT 1", FakeBackend(1e9), max_cost=100)
+    assert e.value.code == "too_expensive"
@@ -0,0 +1,61 @@
+import pytest
+
+from app.tools.sql_plan_cache import PlanCache
+
+VALUES = {"molecule": ["Metformin", "Insulin Glargine", "Insulin"], "region": ["Europe", "North America"]}
+
+
+def loader(sql):
+    col = sql.split()[2]
+    return [{col: v} for v in VALUES[col]]
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return PlanCache("iqvia", ["molecule", "region"], "iqvia_sales", loader=loader,
+                     path=str(tmp_path / "iqvia.json"))
+
+
+SQL = "SELECT year, sales_value FROM iqvia_sales WHERE molecule ILIKE '%metformin%' AND region = 'Europe' " \
+      "AND year >= 2020 ORDER BY year LIMIT 5"
+
+
+def test_extract_replaces_entities_with_slots(cache):
+    cache.lookup("warm up the vocabulary")
+    key, slots = cache.extract("Top 5 insulin glargine sales in Europe since 2020")
+    assert slots == {"molecule0": "Insulin Glargine", "region0": "Europe", "year0": "2020", "limit": "5"}
+    assert "glargine" not in key and "molecule0" in key
+
+
+def test_learned_template_answers_the_same_shape(cache):
+    question = "Top 5 metformin sales in Europe since 2020"
+    assert cache.lookup(question) is None
+    assert cache.learn(question, SQL)
+    assert cache.lookup("top 10 Insulin sales in North America since 2018") == (
+        "SELECT year, sales_value FROM iqvia_sales WHERE molecule ILIKE '%Insulin%' AND region = 'North America' "
+        "AND year >= 2018 ORDER BY year LIMIT 10"
+    )
+    # Different slots (no year) is a different shape
+    assert cache.lookup("top 10 Insulin sales in North America") is None
+    assert cache.report()["hits"] == 1
+
+
+def test_sql_with_unrelated_entities_is_not_learned(cache):
+    cache.lookup("warm up the vocabulary")
+    sql = "SELECT * FROM iqvia_sales WHERE molecule = 'Insulin' AND region = 'Europe'"
+    assert not cache.learn("metformin sales in Europe", sql)
+
+
+def test_templates_persist_and_render(cache, tmp_path):
+    cache.learn("Top 5 metformin sales in Europe since 2020", SQL)
+    reopened = PlanCache("iqvia", ["molecule", "region"], "iqvia_sales", path=str(tmp_path / "iqvia.json"))
+    assert reopened.templates == cache.templates
+    assert "metformin" in reopened.vocab["molecule"]
+    rendered = reopened.render({"molecule0": "Insulin", "region0": "Europe", "year0": "2021", "limit": "3"})
+    assert rendered == [SQL.replace("metformin", "Insulin").replace("2020", "2021").replace("LIMIT 5", "LIMIT 3")]
+
+
+def test_literals_are_escaped(cache):
+    cache.learn("Top 5 metformin sales in Europe since 2020", SQL)
+    filled = cache.render({"molecule0": "x' OR '1'='1", "region0": "Europe", "year0": "2020", "limit": "5"})[0]
+    assert "'%x'' OR ''1''=''1%'" in filled
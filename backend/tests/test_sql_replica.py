@@ -0,0 +1,69 @@
+import pytest
+
+from app.tools.sql_backends import SQLiteBackend
+from app.tools.sql_guard import SQLGuardError
+from app.tools.sql_replica import ReplicaBackend
+from app.tools.supabase_tool import run_guarded_query
+
+ROWS = [{"molecule": "Metformin", "region": "EU", "sales_value": 10.0, "year": 2023},
+        {"molecule": "Insulin", "region": "US", "sales_value": 20.0, "year": 2023}]
+# Runs on SQLite (the stand-in remote) but not on DuckDB, so the replica falls back
+SQLITE_ONLY = "SELECT molecule, changes() AS c FROM iqvia_sales"
+
+
+class Remote(SQLiteBackend):
+    cost = 10.0
+
+    def explain_cost(self, sql):
+        return self.cost
+
+
+@pytest.fixture
+def replica(tmp_path):
+    remote = Remote(str(tmp_path / "remote.db"))
+    remote.load_rows("iqvia_sales", ROWS)
+    replica = ReplicaBackend(remote, str(tmp_path / "replica.duckdb"))
+    yield replica
+    replica.local.close()
+
+
+def test_sync_makes_the_replica_fresh_and_versioned(replica):
+    assert not replica.is_fresh()
+    replica.sync()
+    assert replica.is_fresh()
+    assert replica.status()["tables"]["iqvia_sales"]["row_count"] == 2
+    version = replica.table_versions()["iqvia_sales"]
+    replica.remote.load_rows("iqvia_sales", [{**ROWS[0], "year": 2024}])
+    replica.sync(["iqvia_sales"])
+    assert replica.table_versions()["iqvia_sales"] != version
+
+
+def test_fresh_replica_answers_locally(replica):
+    replica.sync()
+    rows = replica.fetch("SELECT sum(sales_value) AS total FROM iqvia_sales")
+    assert rows == [{"total": 30.0}]
+    assert (replica.stats["local"], replica.stats["remote"]) == (1, 0)
+    assert replica.explain_cost("SELECT * FROM iqvia_sales") is None
+
+
+def test_fallback_to_remote_within_the_cost_ceiling(replica):
+    replica.sync()
+    assert len(list(replica.fetch(SQLITE_ONLY))) == 2
+    assert [len(b) for b in replica.iter_rows(SQLITE_ONLY)] == [2]
+    assert replica.stats["fallbacks"] == 2 and replica.stats["remote"] == 2
+
+
+def test_fallback_to_remote_is_cost_checked(replica, monkeypatch):
+    replica.sync()
+    replica.remote.cost = 1e12
+    with pytest.raises(SQLGuardError):
+        replica.fetch(SQLITE_ONLY)
+    with pytest.raises(SQLGuardError):
+        list(replica.iter_rows(SQLITE_ONLY))
+    assert replica.stats["remote"] == 0
+
+    # Through the agent path the rejection comes back as a tool error the model can act on
+    from app.tools import supabase_tool
+    monkeypatch.setattr(supabase_tool, "get_sql_backend", lambda: replica)
+    monkeypatch.setattr(supabase_tool, "get_result_cache", lambda: None)
+    assert run_guarded_query(SQLITE_ONLY, ["iqvia_sales"])["code"] == "too_expensive"
@@ -0,0 +1,85 @@
+import sqlite3
+
+import pytest
+
+from app.tools import sql_backends
+from app.tools.sql_backends import SQLiteBackend
+from app.tools.sql_result_cache import SQLResultCache, normalize_sql, tables_read
+
+ROW = {"molecule": "Metformin", "region": "EU", "sales_value": 10.0, "year": 2023}
+
+
+@pytest.fixture
+def backend(tmp_path, monkeypatch):
+    backend = SQLiteBackend(str(tmp_path / "data.db"))
+    backend.load_rows("iqvia_sales", [ROW])
+    monkeypatch.setattr(sql_backends, "get_sql_backend", lambda: backend)
+    return backend
+
+
+def make_cache(tmp_path, **kwargs):
+    return SQLResultCache(str(tmp_path / "cache.db"), probe_seconds=0, **kwargs)
+
+
+def test_normalize_and_tables():
+    sql = normalize_sql("SELECT  *\nFROM IQVIA_SALES WHERE molecule = 'Patents';")
+    assert sql == "select * from iqvia_sales where molecule = 'Patents'"
+    assert tables_read(sql) == ["iqvia_sales"]
+
+
+def test_hit_until_the_table_changes(tmp_path, backend):
+    cache = make_cache(tmp_path)
+    sql = "SELECT * FROM iqvia_sales"
+    assert cache.get(sql) is None
+    assert cache.put(sql, [ROW])
+    assert cache.get("select * from iqvia_sales;") == [ROW]
+
+    backend.load_rows("iqvia_sales", [{**ROW, "region": "US"}])
+    assert cache.get(sql) is None
+    assert cache.stats["invalidated"] == 1
+
+
+def test_bump_invalidates_across_processes(tmp_path, backend):
+    cache = make_cache(tmp_path)
+    cache.put("SELECT * FROM patents", [])
+    other = make_cache(tmp_path)
+    assert other.get("SELECT * FROM patents") == []
+    other.bump("patents")
+    assert cache.get("SELECT * FROM patents") is None
+
+
+def test_probe_on_a_missing_column_falls_back_to_count(tmp_path, backend):
+    cache = make_cache(tmp_path, probe="max(updated_at)")
+    assert cache.put("SELECT * FROM iqvia_sales", [ROW])
+    assert cache.current_versions(["iqvia_sales"]) == {"iqvia_sales": "0:n=1"}
+    assert cache.get("SELECT * FROM iqvia_sales") == [ROW]
+
+
+def test_failing_probe_runs_uncached(tmp_path, backend, monkeypatch):
+    cache = make_cache(tmp_path)
+
+    def broken(sql, params=None, timeout_ms=None):
+        raise sqlite3.OperationalError("database is locked")
+
+    monkeypatch.setattr(backend, "fetch", broken)
+    assert cache.put("SELECT * FROM iqvia_sales", [ROW]) is False
+    assert cache.get("SELECT * FROM iqvia_sales") is None
+    assert cache.stats["bypassed"] == 2
+
+
+def test_shared_tier_is_bounded(tmp_path, backend):
+    cache = make_cache(tmp_path, max_shared_entries=3)
+    for n in range(6):
+        cache.put(f"SELECT * FROM iqvia_sales LIMIT {n + 1}", [ROW])
+    assert cache.report()["shared_entries"] == 3
+    fresh = make_cache(tmp_path)
+    assert fresh.get("SELECT * FROM iqvia_sales LIMIT 6") == [ROW]
+    assert fresh.get("SELECT * FROM iqvia_sales LIMIT 1") is None
+
+
+def test_memory_tier_is_bounded(tmp_path, backend):
+    cache = SQLResultCache(None, max_entries=2, probe_seconds=0)
+    for n in range(3):
+        cache.put(f"SELECT * FROM iqvia_sales LIMIT {n + 1}", [ROW])
+    assert len(cache.memory) == 2
+    assert cache.get("SELECT * FROM iqvia_sales LIMIT 1") is None
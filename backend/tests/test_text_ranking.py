@@ -0,0 +1,53 @@
+from app.utils.text_ranking import BM25Index, estimate_tokens, rank_passages, split_passages, tokenize
+
+
+def test_tokenize_drops_stopwords():
+    assert tokenize("Show me the Phase-3 trials of Metformin") == ["phase-3", "trials", "metformin"]
+
+
+def test_split_passages_respects_max_words():
+    text = "One two three. Four five six seven. " + " ".join(f"w{n}" for n in range(10)) + "."
+    passages = split_passages(text, max_words=5)
+    assert all(len(p.split()) <= 5 for p in passages)
+    assert passages[0] == "One two three."
+
+
+def test_bm25_ranks_by_term_weight_and_supports_removal():
+    index = BM25Index()
+    index.add("a", "metformin lowers glucose in type 2 diabetes")
+    index.add("b", "insulin for type 1 diabetes")
+    index.add("c", "metformin metformin dosing")
+    assert [k for k, _ in index.search("metformin")] == ["c", "a"]
+    index.remove("c")
+    assert [k for k, _ in index.search("metformin")] == ["a"]
+    assert len(index) == 2 and "dosing" not in index.postings
+
+
+DOCS = [
+    {"title": "Metformin outcomes", "snippet": "Metformin reduced HbA1c in adults."},
+    {"title": "Unrelated", "snippet": "Weather patterns over the Atlantic this season.", "full_text": "More text."},
+    {"title": "Empty"},
+]
+
+
+def test_rank_passages_only_returns_scored_passages_by_default():
+    passages = rank_passages("metformin", DOCS, token_budget=1000)
+    assert {p["doc_index"] for p in passages} == {0}
+    assert passages == sorted(passages, key=lambda p: p["score"], reverse=True)
+
+
+def test_fallback_passage_for_documents_without_overlap():
+    passages = rank_passages("metformin", DOCS, token_budget=1000, fallback_fields=("snippet", "full_text"))
+    fallback = [p for p in passages if p["doc_index"] == 1]
+    assert fallback == [{"doc_index": 1, "field": "snippet", "text": DOCS[1]["snippet"], "score": 0.0}]
+    assert not any(p["doc_index"] == 2 for p in passages)
+
+
+def test_fallback_passages_count_against_the_budget():
+    scored = rank_passages("metformin", DOCS, token_budget=1000)
+    budget = sum(estimate_tokens(p["text"]) for p in scored)
+    passages = rank_passages("metformin", DOCS, token_budget=budget, fallback_fields=("snippet",))
+    assert passages == scored
+    total = sum(estimate_tokens(p["text"]) for p in
+                rank_passages("metformin", DOCS, token_budget=budget + 5, fallback_fields=("snippet",)))
+    assert total <= budget + 5
@@ -0,0 +1,64 @@
+from app.utils.tool_encoding import encode_payload, encode_rows
+
+
+def test_encode_rows_header_once_and_constant_columns_hoisted():
+    rows = [
+        {"nct_id": "NCT01", "phase": "PHASE3", "status": "RECRUITING"},
+        {"nct_id": "NCT02", "phase": "PHASE2", "status": "RECRUITING"},
+    ]
+    assert encode_rows("studies", rows).splitlines() == [
+        "studies.status=RECRUITING",
+        "studies[2]{nct_id|phase}",
+        "NCT01|PHASE3",
+        "NCT02|PHASE2",
+    ]
+
+
+def test_encode_rows_cells():
+    rows = [
+        {"name": "a|b", "value": 1.23456789, "flag": True, "tags": ["x", "y"], "note": "two\nlines"},
+        {"name": "c", "value": None, "flag": False, "tags": [], "note": "ok"},
+    ]
+    lines = encode_rows("rows", rows).splitlines()
+    assert lines[0] == "rows[2]{name|value|flag|tags|note}"
+    assert lines[1] == "a\\|b|1.23457|true|x,y|two lines"
+    assert lines[2] == "c||false||ok"
+
+
+def test_encode_rows_keeps_columns_of_a_single_row():
+    assert encode_rows("rows", [{"a": 1, "b": 2}]) == "rows[1]{a|b}\n1|2"
+
+
+def test_encode_payload_flattens_nested_values():
+    payload = {
+        "total": 2,
+        "query": {"condition": "asthma", "phase": None},
+        "studies": [{"id": "A", "n": 10}, {"id": "B", "n": 20}],
+        "errors": [],
+    }
+    assert encode_payload(payload).splitlines() == [
+        "total=2",
+        "query.condition=asthma",
+        "query.phase=",
+        "studies[2]{id|n}",
+        "A|10",
+        "B|20",
+        "errors=",
+    ]
+
+
+def test_encode_payload_indexes_lists_of_nested_values():
+    payload = [{"name": "x", "rows": [{"a": 1}]}, {"name": "y", "rows": [{"a": 2}]}]
+    assert encode_payload(payload, "results").splitlines() == [
+        "results[0].name=x",
+        "results[0].rows[1]{a}",
+        "1",
+        "results[1].name=y",
+        "results[1].rows[1]{a}",
+        "2",
+    ]
+
+
+def test_encode_payload_passes_strings_through():
+    assert encode_payload("already encoded") == "already encoded"
+    assert encode_payload(3.0) == "3"
@@ -0,0 +1,59 @@
+import threading
+import time
+from types import SimpleNamespace
+
+from app.tools.tool_runtime import execute_tool_calls, joined_sql, merge_row_results, tool_result_messages
+
+
+def call(name, arguments="{}", call_id=None):
+    return SimpleNamespace(id=call_id or name, function=SimpleNamespace(name=name, arguments=arguments))
+
+
+def test_results_keep_call_order_and_run_concurrently():
+    started = threading.Barrier(3, timeout=5)
+
+    def execute(tc):
+        started.wait()  # only passes if all three calls run at once
+        time.sleep(0.05 if tc.function.name == "a" else 0)
+        return tc.function.name
+
+    assert execute_tool_calls([call("a"), call("b"), call("c")], execute) == ["a", "b", "c"]
+
+
+def test_failures_and_timeouts_become_error_results():
+    release = threading.Event()
+
+    def execute(tc):
+        if tc.function.name == "boom":
+            raise ValueError("bad args")
+        if tc.function.name == "slow":
+            release.wait(5)
+        return "ok"
+
+    started = time.monotonic()
+    results = execute_tool_calls([call("ok"), call("boom"), call("slow")], execute, timeout=0.2)
+    release.set()
+    assert time.monotonic() - started < 2
+    assert results[0] == "ok"
+    assert results[1] == {"error": "Tool call failed: bad args"}
+    assert "timed out" in results[2]["error"]
+
+
+def test_empty_turn():
+    assert execute_tool_calls([], lambda tc: None) == []
+
+
+def test_multi_call_sql_stays_a_string():
+    assert joined_sql(["SELECT 1", "SELECT 2"]) == "SELECT 1;\n\nSELECT 2"
+    assert joined_sql(["SELECT 1", None]) == "SELECT 1"
+
+
+def test_merge_row_results():
+    assert merge_row_results([[{"a": 1}], {"rows": [{"a": 2}], "row_count": 9}, {"error": "x"}]) == [{"a": 1}, {"a": 2}]
+    assert merge_row_results([{"error": "x"}, {"error": "y"}]) == {"error": "x"}
+
+
+def test_tool_result_messages():
+    messages = tool_result_messages([call("q", call_id="1")], [{"error": "x"}])
+    assert messages[0]["role"] == "tool" and messages[0]["tool_call_id"] == "1" and messages[0]["name"] == "q"
+    assert isinstance(messages[0]["content"], str)
@@ -0,0 +1,66 @@
+import pandas as pd
+import pytest
+
+from app.tools.trade_analytics import batch_trade_metrics, risk_records, supplier_concentration, yearly_totals
+
+
+def row(code, year, flow, value, partner="World", reporter="356"):
+    return {"commodity_code": code, "reporter_code": reporter, "year": year, "flow": flow,
+            "partner": partner, "trade_value": value}
+
+
+TRADE = pd.DataFrame([
+    # 300490: world totals plus partner rows, which must not be double counted
+    row("300490", 2020, "Import", 100.0), row("300490", 2022, "Import", 144.0),
+    row("300490", 2020, "Export", 50.0), row("300490", 2022, "Export", 50.0),
+    row("300490", 2022, "Import", 120.0, "China"), row("300490", 2022, "Import", 24.0, "Germany"),
+    # 293339: partner rows only
+    row("293339", 2021, "Import", 30.0, "China"), row("293339", 2021, "Import", 10.0, "India"),
+    row("293339", 2021, "Export", 60.0, "USA"),
+])
+
+
+def test_yearly_totals_prefers_world_rows():
+    yearly = yearly_totals(TRADE).set_index(["commodity_code", "year"])
+    assert yearly.loc[("300490", 2022), "import"] == 144.0
+    assert yearly.loc[("293339", 2021), "import"] == 40.0
+    assert yearly.loc[("293339", 2021), "export"] == 60.0
+
+
+def test_supplier_concentration():
+    hhi, top = supplier_concentration(TRADE, top_k=1)
+    hhi = hhi.set_index("commodity_code")
+    # shares 0.75 and 0.25 -> 5625 + 625
+    assert hhi.loc["293339", "hhi"] == 6250
+    assert hhi.loc["293339", "suppliers"] == 2
+    assert top.set_index("commodity_code").loc["300490", "partner"] == "China"
+    assert len(top) == 2
+
+
+def test_batch_trade_metrics():
+    metrics, suppliers = batch_trade_metrics(TRADE)
+    m = metrics.set_index("commodity_code").loc["300490"]
+    assert m["total_import_value"] == 244.0
+    assert m["import_cagr"] == pytest.approx(20.0)
+    assert m["trade_balance"] == -144.0
+    assert m["is_net_importer"] and m["high_concentration"]
+
+    other = metrics.set_index("commodity_code").loc["293339"]
+    assert other["import_dependency_ratio"] == 40.0
+    assert pd.isna(other["import_cagr"])
+
+
+def test_batch_trade_metrics_empty():
+    metrics, suppliers = batch_trade_metrics(TRADE.iloc[:0])
+    assert metrics.empty and suppliers.empty
+    assert risk_records(metrics, suppliers) == []
+
+
+def test_risk_records_rank_and_nest_suppliers():
+    records = risk_records(*batch_trade_metrics(TRADE))
+    assert [r["commodity_code"] for r in records] == ["300490", "293339"]
+    assert records[1]["import_cagr"] is None
+    assert records[0]["top_suppliers"] == [
+        {"partner": "China", "trade_value": 120.0, "share": 0.8333},
+        {"partner": "Germany", "trade_value": 24.0, "share": 0.1667},
+    ]
@@ -0,0 +1,64 @@
+import pytest
+
+from app.tools.trade_codes import NameIndex, TradeCodeError, TradeCodes
+
+
+@pytest.fixture(scope="module")
+def codes():
+    return TradeCodes()
+
+
+def test_country_by_name_alias_and_code(codes):
+    assert codes.country("india")["code"] == "699"
+    assert codes.country("DEU")["code"] == "276"
+    assert codes.country("276")["name"] == "Germany"
+    # ISO numeric codes Comtrade reports under another M49 code
+    assert codes.country("840")["code"] == "842"
+    assert codes.country("356")["code"] == "699"
+    assert codes.country_code("All") == "all"
+
+
+def test_country_prefix_and_typo(codes):
+    assert codes.country("ger")["match"] == "prefix"
+    match = codes.country("Germny")
+    assert (match["code"], match["match"]) == ("276", "fuzzy")
+
+
+def test_ambiguous_or_unknown_country_carries_suggestions(codes):
+    with pytest.raises(TradeCodeError) as err:
+        codes.country("united")
+    assert {s["code"] for s in err.value.suggestions} >= {"826", "842"}
+    payload = err.value.to_dict()
+    assert payload["status"] == "error" and "did you mean" in payload["message"]
+
+    with pytest.raises(TradeCodeError):
+        codes.country("9999")
+
+
+def test_commodity_codes(codes):
+    assert codes.commodity_code("3004.90") == "300490"
+    assert codes.commodity_code("30 04") == "3004"
+    assert codes.commodity("insulin")["code"] == "300431"
+    unlisted = codes.commodity("300499")
+    assert (unlisted["match"], unlisted["level"]) == ("chapter", 6)
+    for bad in ("9999", "30049", "insulinx-unknown-thing"):
+        with pytest.raises(TradeCodeError):
+            codes.commodity(bad)
+
+
+def test_expand_hs_levels(codes):
+    headings = [e["code"] for e in codes.expand("30")]
+    assert "3004" in headings and all(len(c) == 4 and c.startswith("30") for c in headings)
+    assert all(e["code"].startswith("3004") and e["level"] == 6 for e in codes.expand("3004"))
+    assert {e["code"] for e in codes.expand("30", depth=2)} >= {"300431", "300490"}
+
+
+def test_name_index_rejects_close_fuzzy_ties():
+    index = NameIndex()
+    index.add("1", "Austria", [])
+    index.add("2", "Australia", [])
+    index.build()
+    assert index.resolve("austria")["code"] == "1"
+    assert index.resolve("Austrailia")["code"] == "2"
+    assert index.resolve("aust") is None
+    assert index.candidates("") == []
@@ -0,0 +1,97 @@
+import pytest
+
+from app.tools import fetch_clinical_trial_data as ct
+from app.tools.trial_store import TrialStore
+
+ARGS = {"condition": "Asthma", "status": "RECRUITING"}
+
+
+def study(nct_id, status="RECRUITING", phase="PHASE3", updated="2024-01-01"):
+    return {"nct_id": nct_id, "brief_title": f"Study {nct_id}", "overall_status": status, "phase": phase,
+            "conditions": "Asthma", "last_update_date": updated}
+
+
+@pytest.fixture
+def store(tmp_path):
+    return TrialStore(str(tmp_path / "trials.db"), ttl_hours=0)
+
+
+def test_record_and_lookup(store):
+    store.record_query(ARGS, [study("NCT1"), study("NCT2")], 2)
+    state = store.query_state(ARGS)
+    assert (state["total_count"], state["stored_count"], state["latest_update"]) == (2, 2, "2024-01-01")
+    assert {s["nct_id"] for s in store.lookup(ARGS, 10)} == {"NCT1", "NCT2"}
+
+
+def test_merge_updates_moves_studies_in_and_out_of_the_query(store):
+    store.record_query(ARGS, [study("NCT1"), study("NCT2")], 2)
+    total = store.merge_updates(ARGS, [
+        study("NCT1", status="COMPLETED", updated="2024-02-01"),  # left the query
+        study("NCT3", updated="2024-02-01"),                      # joined it
+        study("NCT4", status="COMPLETED", updated="2024-02-01"),  # never matched
+    ])
+    assert total == 2
+    state = store.query_state(ARGS)
+    assert (state["total_count"], state["stored_count"]) == (2, 2)
+    assert {s["nct_id"] for s in store.lookup(ARGS, 10)} == {"NCT2", "NCT3"}
+    completed = store.lookup({"condition": "asthma", "status": "COMPLETED"}, 10)
+    assert {s["nct_id"] for s in completed} == {"NCT1", "NCT4"}
+
+
+def test_merge_updates_is_idempotent(store):
+    store.record_query(ARGS, [study("NCT1")], 1)
+    updates = [study("NCT2", updated="2024-02-01")]
+    assert store.merge_updates(ARGS, updates) == 2
+    assert store.merge_updates(ARGS, updates) == 2
+
+
+def test_phase_filter(store):
+    args = {**ARGS, "phase": "PHASE_3"}
+    assert store.matches_filters(args, study("NCT1", phase="PHASE2, PHASE3"))
+    assert not store.matches_filters(args, study("NCT1", phase="PHASE2"))
+
+
+@pytest.fixture
+def live(monkeypatch, store):
+    calls = []
+    responses = {}
+
+    def fake_fetch_live(args, max_studies):
+        kind = "updates" if args.get("updated_since") else "full"
+        calls.append((kind, max_studies))
+        return responses[kind]
+
+    monkeypatch.setattr(ct, "get_trial_store", lambda: store)
+    monkeypatch.setattr(ct, "_fetch_live", fake_fetch_live)
+    return calls, responses
+
+
+def test_incremental_refresh_merges_complete_updates(store, live):
+    calls, responses = live
+    store.record_query(ARGS, [study("NCT1"), study("NCT2")], 2)
+    responses["updates"] = ([study("NCT2", status="COMPLETED", updated="2024-03-01")], 1)
+    payload = ct.fetch_clinical_trials({**ARGS, "page_size": 10})
+    assert [c[0] for c in calls] == ["updates"]
+    assert payload["source"] == "local_store"
+    assert payload["total_studies"] == 1
+    assert [s["nct_id"] for s in payload["studies"]] == ["NCT1"]
+
+
+def test_truncated_update_pull_refetches_the_query(store, live):
+    calls, responses = live
+    store.record_query(ARGS, [study("NCT1"), study("NCT2")], 2)
+    responses["updates"] = ([study("NCT2", updated="2024-03-01")], 7000)
+    responses["full"] = ([study("NCT2"), study("NCT5")], 2)
+    payload = ct.fetch_clinical_trials({**ARGS, "page_size": 10})
+    assert [c[0] for c in calls] == ["updates", "full"]
+    assert payload["source"] == "live"
+    state = store.query_state(ARGS)
+    assert (state["total_count"], state["stored_count"]) == (2, 2)
+
+
+def test_partially_stored_query_is_refetched(store, live):
+    calls, responses = live
+    store.record_query(ARGS, [study("NCT1")], 50)
+    responses["full"] = ([study("NCT1"), study("NCT2")], 50)
+    ct.fetch_clinical_trials({**ARGS, "page_size": 2})
+    assert [c[0] for c in calls] == ["full"]
@@ -0,0 +1,112 @@
+import threading
+
+import pytest
+
+from app.tools.vector_index import HashingEmbedder, VectorIndex
+
+TRIALS = [(1, "metformin lowers blood glucose in type 2 diabetes"), (2, "metformin dosing and renal function")]
+PATENTS = [(1, "patent expiry for semaglutide formulations"), (2, "semaglutide injection device patent")]
+
+
+@pytest.fixture
+def index(tmp_path):
+    return VectorIndex(str(tmp_path / "vectors"), HashingEmbedder(dim=256))
+
+
+def top_files(index, query, **kwargs):
+    return [key[0] for key, _ in index.search([query], **kwargs)[0]]
+
+
+def test_upsert_and_search(index):
+    index.upsert_file("trials.pdf", "h1", TRIALS)
+    index.upsert_file("patents.pdf", "h2", PATENTS)
+    assert index.report()["rows"] == 4
+    assert top_files(index, "metformin glucose")[0] == "trials.pdf"
+    assert top_files(index, "semaglutide patent expiry")[0] == "patents.pdf"
+    assert set(top_files(index, "metformin semaglutide", files=["patents.pdf"])) == {"patents.pdf"}
+
+
+def test_upsert_replaces_a_files_rows(index):
+    index.upsert_file("trials.pdf", "h1", TRIALS)
+    index.upsert_file("patents.pdf", "h2", PATENTS)
+    index.upsert_file("trials.pdf", "h3", [(7, "insulin pricing in europe")])
+    assert index.report()["rows"] == 3
+    assert index.meta["files"]["trials.pdf"] == "h3"
+    assert "trials.pdf" not in top_files(index, "metformin glucose")
+    assert index.search(["insulin pricing"])[0][0][0] == ("trials.pdf", 7)
+
+
+def test_remove_file(index):
+    index.upsert_file("trials.pdf", "h1", TRIALS)
+    index.upsert_file("patents.pdf", "h2", PATENTS)
+    index.remove_file("trials.pdf")
+    assert index.report()["rows"] == 2 and "trials.pdf" not in index.meta["files"]
+    assert "trials.pdf" not in top_files(index, "metformin glucose")
+    index.remove_file("patents.pdf")
+    assert index.report()["rows"] == 0
+    assert index.search(["semaglutide"]) == [[]]
+
+
+def test_reopen_maps_the_saved_index(tmp_path, index):
+    index.upsert_file("trials.pdf", "h1", TRIALS)
+    reopened = VectorIndex(index.directory, HashingEmbedder(dim=256))
+    assert reopened.search(["metformin"]) == index.search(["metformin"])
+    # Vectors from a different embedder are not reused
+    assert VectorIndex(index.directory, HashingEmbedder(dim=128)).report()["rows"] == 0
+
+
+def test_ivf_with_every_list_probed_matches_exact_search(tmp_path):
+    chunks = [(n, f"document {n} about molecule m{n % 7} in region r{n % 5}") for n in range(60)]
+    exact = VectorIndex(str(tmp_path / "exact"), HashingEmbedder(dim=128))
+    ivf = VectorIndex(str(tmp_path / "ivf"), HashingEmbedder(dim=128), ivf_min_rows=10, nprobe=1000)
+    for idx in (exact, ivf):
+        idx.upsert_file("a.txt", "h", chunks)
+    assert ivf.report()["ivf_lists"] > 1
+    assert ivf.search(["molecule m3 region r2"], top_k=5) == exact.search(["molecule m3 region r2"], top_k=5)
+    ivf.remove_file("a.txt")
+    assert (ivf.report()["rows"], ivf.report()["ivf_lists"]) == (0, 0)
+
+
+class FakeDocIndex:
+    def __init__(self, files):
+        self.files = files
+
+    def documents(self):
+        return [{"file_name": f, "sha256": h} for f, (h, _) in self.files.items()]
+
+    def file_chunks(self, file_name):
+        return [{"chunk_id": cid, "text": text} for cid, text in self.files[file_name][1]]
+
+
+def test_sync_embeds_changed_files_only(index):
+    docs = FakeDocIndex({"trials.pdf": ("h1", TRIALS), "patents.pdf": ("h2", PATENTS)})
+    assert index.sync(docs) == {"embedded": 2, "removed": 0, "rows": 4}
+    assert index.sync(docs) == {"embedded": 0, "removed": 0, "rows": 4}
+    del docs.files["patents.pdf"]
+    docs.files["trials.pdf"] = ("h9", TRIALS[:1])
+    assert index.sync(docs) == {"embedded": 1, "removed": 1, "rows": 1}
+
+
+def test_searches_during_updates_see_whole_snapshots(index):
+    index.upsert_file("trials.pdf", "h1", TRIALS)
+    errors = []
+    stop = threading.Event()
+
+    def reader():
+        while not stop.is_set():
+            try:
+                for key, _ in index.search(["metformin semaglutide"], top_k=10)[0]:
+                    assert key[0] in ("trials.pdf", "patents.pdf")
+            except Exception as e:
+                errors.append(e)
+
+    threads = [threading.Thread(target=reader) for _ in range(3)]
+    for t in threads:
+        t.start()
+    for n in range(20):
+        index.upsert_file("patents.pdf", f"h{n}", PATENTS[: 1 + n % 2])
+        index.remove_file("patents.pdf")
+    stop.set()
+    for t in threads:
+        t.join()
+    assert errors == []